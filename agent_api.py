@@ -0,0 +1,125 @@
+'''
+AGENT API
+
+Agents can be written in two styles:
+
+    - a module with a function agent(state, done, bombs, turn, player) that
+      returns (action, name) and is called every turn (the original contract;
+      if it takes a `danger` argument it also gets the environment's danger map)
+    - a subclass of Agent. setup(rows, cols, player_number) is called once at
+      the start of every game and act(observation) every turn, so anything
+      built in setup or kept on self persists between turns. A module exposes
+      its class as AGENT_CLASS. Runners call close() when they are done
+      with an agent, so it can release what it holds (processes, files).
+    - a subclass of BatchAgent, whose act_batch decides for a list of
+      observations at once. batch_runner.play_batched plays many games in
+      lock step and calls it once per turn for every game and seat it plays,
+      so a policy network runs one forward pass on the whole batch.
+
+load_agent turns either style into an Agent, so runners only deal with one
+interface, and agent_function gives a class-based agent the original
+function interface.
+'''
+
+import importlib
+import inspect
+from collections import namedtuple
+
+# what an agent sees each turn
+Observation = namedtuple('Observation', ['state', 'done', 'bombs', 'turn', 'player', 'danger'])
+
+class Agent():
+
+    name = 'agent'
+
+    def setup(self, rows, cols, player_number):
+        '''
+        called at the start of every game, before the first act
+        '''
+
+        self.rows = rows
+        self.cols = cols
+        self.player_number = player_number
+
+    def act(self, observation):
+        '''
+        return this turn's action for an Observation
+        '''
+        raise NotImplementedError
+
+    def close(self):
+        '''
+        called when the runner is done with the agent
+        '''
+
+class BatchAgent(Agent):
+    '''
+    an agent that decides for many games at once. A single instance plays
+    every seat of every game it is given, so it shouldn't keep per-game state
+    on self (observation.player.number tells the seat).
+    '''
+
+    def act_batch(self, observations):
+        '''
+        return one action for each Observation in a list
+        '''
+        raise NotImplementedError
+
+    def act(self, observation):
+        return self.act_batch([observation])[0]
+
+def takes_danger_map(function):
+    '''
+    whether an agent function accepts the environment's danger map
+    '''
+    return 'danger' in inspect.signature(function).parameters
+
+class FunctionAgent(Agent):
+    '''
+    adapts a module with an agent(state, done, bombs, turn, player) function
+    '''
+
+    def __init__(self, module):
+        self.module = module
+        self.function = module.agent
+        self.name = module.__name__
+        self.takes_danger = takes_danger_map(module.agent)
+
+    def act(self, observation):
+        kwargs = {'danger': observation.danger} if self.takes_danger else {}
+        action, self.name = self.function(observation.state, observation.done, observation.bombs,
+            observation.turn, player=observation.player, **kwargs)
+        return action
+
+def load_agent(agent):
+    '''
+    an Agent from a module name, a module, an Agent subclass or an Agent instance
+    '''
+
+    if isinstance(agent, Agent):
+        return agent
+    if inspect.isclass(agent) and issubclass(agent, Agent):
+        return agent()
+    if isinstance(agent, str):
+        agent = importlib.import_module(agent)
+    if hasattr(agent, 'AGENT_CLASS'):
+        return agent.AGENT_CLASS()
+    return FunctionAgent(agent)
+
+def agent_function(agent_class):
+    '''
+    the original agent(state, done, bombs, turn, player) interface for an Agent class,
+    keeping one instance per player and board size
+    '''
+
+    agents = {}
+
+    def agent(state, done, bombs, turn, player, danger=None):
+        key = (player.number, state.shape)
+        if key not in agents:
+            agents[key] = agent_class()
+            agents[key].setup(state.shape[0], state.shape[1], player.number)
+        action = agents[key].act(Observation(state, done, bombs, turn, player, danger))
+        return action, agents[key].name
+
+    return agent
@@ -0,0 +1,296 @@
+'''
+AGENT WORKER PROCESSES
+
+Runs an agent in its own long-lived process, so a crash, a hang or a stray
+write inside the agent can't take down the runner or touch its Game.
+
+Each turn the runner copies the board, the danger map and the Game's small
+entity buffer (players and bombs, see Game.init_arrays) into one
+multiprocessing.shared_memory block. It then sends the turn number over a
+Pipe. The worker rebuilds its Observation from that shared block, with the
+same Player and Bomb views the agent would get in-process, and sends back
+the action. A turn costs one small message each way.
+
+An agent that raises plays actions.NONE for the turn. A worker that dies
+plays NONE until the next game, which starts a new one. With a deadline,
+the runner waits at most that long for an answer (see latency.TimedAgent).
+
+This is process isolation only: the worker can still use the file system
+and network like any other process of the user running it.
+
+usage:
+    agent = AgentProcess('lookahead_agent')
+    scores, turns, names = play_match(Game(), [agent, AgentProcess('flee_agent')])
+    agent.close()
+'''
+
+import multiprocessing
+import traceback
+import numpy as np
+from multiprocessing import shared_memory
+
+from agent_api import Agent, Observation, load_agent
+from bm_multi_env import Game, actions
+
+START_METHOD = 'spawn' # workers start from a fresh interpreter
+CLOSE_TIMEOUT = 1 # seconds a worker is given to exit before it is killed
+
+def get_layout(rows, cols, dtype, num_players, max_bombs=Game.MAX_BOMBS):
+    '''
+    byte offsets of the entity state, board and danger map in the shared block
+    '''
+
+    state_size = np.zeros(0, dtype=np.int64).itemsize * num_players * (
+        len(Game.PLAYER_FIELDS) + max_bombs * len(Game.BOMB_FIELDS))
+    board_size = np.dtype(dtype).itemsize * rows * cols
+    return {'state': 0, 'board': state_size, 'danger': state_size + board_size,
+        'size': state_size + board_size + rows * cols}
+
+def get_views(buffer, rows, cols, dtype, num_players, max_bombs=Game.MAX_BOMBS):
+    '''
+    (state, board, danger) arrays over a shared block
+    '''
+
+    layout = get_layout(rows, cols, dtype, num_players, max_bombs)
+    state = np.ndarray(layout['board'] // 8, dtype=np.int64, buffer=buffer, offset=layout['state'])
+    board = np.ndarray((rows, cols), dtype=dtype, buffer=buffer, offset=layout['board'])
+    danger = np.ndarray((rows, cols), dtype=np.int8, buffer=buffer, offset=layout['danger'])
+    return state, board, danger
+
+########################
+###  WORKER PROCESS  ###
+########################
+
+def worker_main(agent, connection):
+    '''
+    serve one agent over a connection until told to close
+    messages: ('setup', rows, cols, number), ('attach', name, rows, cols, dtype, num_players, rules),
+    ('act', sequence, turn, done, number, bomb_slots, has_danger) and ('close',)
+    '''
+
+    agent = load_agent(agent)
+    memory = None
+    game = None
+    connection.send(agent.name)
+
+    while True:
+        try:
+            message = connection.recv()
+        except EOFError:
+            break
+        command = message[0]
+
+        if command == 'act':
+            _, sequence, turn, done, number, bomb_slots, has_danger = message
+            game.state[:] = shared_state
+            observation = Observation(game.board, done, [game.bomb_views[slot] for slot in bomb_slots],
+                turn, game.players[number], shared_danger if has_danger else None)
+            try:
+                action = agent.act(observation)
+                error = None
+            except Exception:
+                action = actions.NONE
+                error = traceback.format_exc()
+            connection.send((sequence, action, agent.name, error))
+
+        elif command == 'setup':
+            _, rows, cols, number = message
+            agent.setup(rows, cols, number)
+
+        elif command == 'attach':
+            _, name, rows, cols, dtype, num_players, rules = message
+            if memory is not None:
+                memory.close()
+            memory = shared_memory.SharedMemory(name=name)
+            shared_state, shared_board, shared_danger = get_views(memory.buf, rows, cols, dtype, num_players, rules['max_bombs'])
+            # a game shell whose Player and Bomb views read the copied entity state
+            game = Game(rows, cols, dtype, **rules)
+            game.board = shared_board
+            game.init_arrays(num_players)
+
+        elif command == 'close':
+            break
+
+    agent.close()
+    if memory is not None:
+        del shared_state, shared_board, shared_danger, game
+        memory.close()
+    connection.close()
+
+########################
+###   RUNNER SIDE    ###
+########################
+
+class AgentProcess(Agent):
+    '''
+    an Agent that runs another agent (anything load_agent accepts that can be
+    pickled: a module name or an Agent class) in a worker process
+    '''
+
+    def __init__(self, agent, start_method=START_METHOD):
+        self.agent = agent
+        self.context = multiprocessing.get_context(start_method)
+        self.name = agent if isinstance(agent, str) else getattr(agent, '__name__', 'agent')
+        self.process = None
+        self.connection = None
+        self.memory = None
+        self.layout_key = None
+        self.sequence = 0
+        self.pending = False # a reply from a turn that ran out of time is still due
+        self.errors = [] # tracebacks of exceptions raised by the agent
+        self.crashes = 0 # workers that died mid-game
+        self.hangs = 0 # workers replaced because a turn was still running when the next game started
+
+    @property
+    def alive(self):
+        return self.connection is not None and self.process.is_alive()
+
+    def start(self):
+        self.connection, child_connection = self.context.Pipe()
+        self.process = self.context.Process(target=worker_main, args=(self.agent, child_connection), daemon=True)
+        self.process.start()
+        child_connection.close()
+        self.name = self.connection.recv()
+        self.layout_key = None
+        self.pending = False
+
+    def setup(self, rows, cols, player_number):
+        # a worker still stuck in a turn that ran out of time would make the agent
+        # play NONE for the rest of the batch, so it only costs this one game
+        if self.pending and self.alive and self.receive(0) is None:
+            self.hangs += 1
+            self.process.kill()
+            self.process.join()
+            self.connection.close()
+            self.connection = None
+        if self.connection is None or not self.alive:
+            if self.process is not None:
+                self.stop()
+            self.start()
+        self.send(('setup', rows, cols, player_number))
+
+    def send(self, message):
+        try:
+            self.connection.send(message)
+            return True
+        except (OSError, EOFError):
+            self.crashed()
+            return False
+
+    def crashed(self):
+        '''
+        the worker is gone: play NONE until the next game starts a new one
+        '''
+
+        if self.connection is not None:
+            self.crashes += 1
+            self.connection.close()
+            self.connection = None
+
+    def publish(self, observation):
+        '''
+        copy this turn's board, danger map and entity state into shared memory
+        '''
+
+        game = observation.player.game
+        state = observation.state
+        rules = game.get_rules()
+        key = (state.shape, state.dtype.str, game.num_players, tuple(rules.values()))
+        if key != self.layout_key:
+            self.release_memory()
+            layout = get_layout(state.shape[0], state.shape[1], state.dtype, game.num_players, game.max_bombs)
+            self.memory = shared_memory.SharedMemory(create=True, size=layout['size'])
+            self.views = get_views(self.memory.buf, state.shape[0], state.shape[1], state.dtype, game.num_players, game.max_bombs)
+            self.layout_key = key
+            if not self.send(('attach', self.memory.name, state.shape[0], state.shape[1], state.dtype.str, game.num_players, rules)):
+                return False
+
+        shared_state, shared_board, shared_danger = self.views
+        shared_state[:] = game.state
+        shared_board[:] = state
+        if observation.danger is not None:
+            shared_danger[:] = observation.danger
+        return True
+
+    def act(self, observation):
+        return self.act_with_deadline(observation, None)[0]
+
+    def act_with_deadline(self, observation, deadline):
+        '''
+        (action, missed deadline) for a turn, waiting at most deadline seconds (None: no limit)
+        '''
+
+        if self.connection is None:
+            return actions.NONE, False
+
+        # drop the answer to a turn that ran out of time, if it has arrived
+        if self.pending:
+            if self.receive(0) is None:
+                return actions.NONE, self.connection is not None
+
+        if not self.publish(observation):
+            return actions.NONE, False
+        self.sequence += 1
+        bomb_slots = [bomb.index for bomb in observation.bombs]
+        if not self.send(('act', self.sequence, observation.turn, observation.done,
+                          observation.player.number, bomb_slots, observation.danger is not None)):
+            return actions.NONE, False
+
+        self.pending = True
+        reply = self.receive(deadline)
+        if reply is None:
+            return actions.NONE, self.connection is not None
+        return reply, False
+
+    def receive(self, timeout):
+        '''
+        read replies until the one for the latest turn, waiting at most timeout
+        seconds for it; returns its action (None if it didn't arrive)
+        '''
+
+        try:
+            while self.connection.poll(timeout):
+                sequence, action, self.name, error = self.connection.recv()
+                if error is not None:
+                    self.errors.append(error)
+                if sequence == self.sequence:
+                    self.pending = False
+                    return action
+        except (OSError, EOFError):
+            self.crashed()
+        return None
+
+    def release_memory(self):
+        if self.memory is not None:
+            self.views = None
+            self.memory.close()
+            self.memory.unlink()
+            self.memory = None
+        self.layout_key = None
+
+    def stop(self):
+        '''
+        ask the worker to exit, killing it if it doesn't
+        '''
+
+        if self.connection is not None:
+            self.send(('close',))
+        if self.process is not None:
+            self.process.join(CLOSE_TIMEOUT)
+            if self.process.is_alive():
+                self.process.kill()
+                self.process.join()
+        if self.connection is not None:
+            self.connection.close()
+        self.process = None
+        self.connection = None
+
+    def close(self):
+        self.stop()
+        self.release_memory()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,235 @@
+'''
+BATCHED MATCHES
+
+Plays many games at once in lock step, so a policy network decides for all
+of them in one forward pass per turn instead of one pass per board.
+
+Every turn, play_batched collects the observations of every active game,
+and of every seat a BatchAgent plays (both seats when a policy plays itself).
+It calls each BatchAgent once with the whole batch and hands the actions
+back to the games. Agents that aren't BatchAgents act one observation at a
+time as usual, with their own instance in every game. A game that ends
+leaves the batch, or starts the next episode if there are episodes left,
+while the rest carry on.
+
+PolicyAgent is a BatchAgent around any policy function that maps a
+(batch, planes, rows, cols) float32 array of encoded observations (see
+observation.py) to (batch, 6) action scores, e.g. a torch model run on CPU.
+
+usage:
+    policy = PolicyAgent(lambda batch: model(torch.from_numpy(batch)))
+    envs = [Game(11, 13, seed=i) for i in range(256)]
+    results = play_batched(envs, [policy, policy], episodes=1000)
+
+    python batch_runner.py --games 256 --episodes 1000
+'''
+
+import argparse
+import copy
+import time
+import numpy as np
+
+from agent_api import Agent, BatchAgent, Observation, load_agent
+from bm_multi_env import Game, actions
+from observation import NUM_PLANES, ObservationEncoder
+from tournament import MAX_TURNS
+
+NUM_ACTIONS = 6
+
+class PolicyAgent(BatchAgent):
+
+    name = 'policy'
+
+    def __init__(self, policy, greedy=True, seed=None):
+        '''
+        policy: function from a (batch, planes, rows, cols) float32 array to
+        (batch, NUM_ACTIONS) action scores (numpy, or anything with .detach())
+        greedy: play the highest scoring action, otherwise sample from the
+        softmax of the scores
+        '''
+
+        self.policy = policy
+        self.greedy = greedy
+        self.rng = np.random.default_rng(seed)
+        self.encoder = None
+        self.calls = 0 # policy calls
+        self.decisions = 0 # observations decided
+
+    def get_encoder(self, rows, cols, batch_size):
+        '''
+        an encoder holding at least batch_size observations (grown by doubling)
+        '''
+
+        encoder = self.encoder
+        if encoder is None or encoder.rows != rows or encoder.cols != cols or encoder.batch_size < batch_size:
+            size = max(batch_size, 2 * encoder.batch_size if encoder is not None else 1)
+            self.encoder = encoder = ObservationEncoder(rows, cols, size)
+        return encoder
+
+    def act_batch(self, observations):
+        rows, cols = observations[0].state.shape
+        encoder = self.get_encoder(rows, cols, len(observations))
+        batch = encoder.encode_observations(observations)
+
+        scores = self.policy(batch)
+        if hasattr(scores, 'detach'):
+            scores = scores.detach().cpu().numpy()
+        scores = np.asarray(scores, dtype=np.float64)
+        self.calls += 1
+        self.decisions += len(observations)
+
+        if self.greedy:
+            return scores.argmax(axis=1).tolist()
+        probabilities = np.exp(scores - scores.max(axis=1, keepdims=True))
+        probabilities /= probabilities.sum(axis=1, keepdims=True)
+        draws = self.rng.random((len(observations), 1))
+        return (probabilities.cumsum(axis=1) < draws).sum(axis=1).clip(0, NUM_ACTIONS - 1).tolist()
+
+class LinearPolicy():
+    '''
+    a random linear policy over the encoded planes, for trying out and
+    benchmarking batched play without a trained model
+    '''
+
+    def __init__(self, rows=11, cols=13, seed=0):
+        rng = np.random.default_rng(seed)
+        self.weights = rng.normal(size=(NUM_PLANES * rows * cols, NUM_ACTIONS)).astype(np.float32)
+
+    def __call__(self, batch):
+        return batch.reshape(len(batch), -1) @ self.weights
+
+def get_seat_agents(agent, num_games):
+    '''
+    the agent of one seat in every game: a BatchAgent is shared, any other
+    agent gets its own instance in every game (setup keeps per-game state on
+    it), loaded from its name, module or class, or copied from an instance
+    '''
+
+    if isinstance(agent, BatchAgent):
+        return [agent] * num_games
+    if isinstance(agent, Agent):
+        try:
+            return [copy.deepcopy(agent) for _ in range(num_games)]
+        except TypeError as error:
+            raise ValueError(f'{type(agent).__name__} instances can\'t be copied for every game ({error}), '
+                'pass its class or module name instead') from error
+    loaded = load_agent(agent)
+    if isinstance(loaded, BatchAgent):
+        return [loaded] * num_games
+    return [loaded] + [load_agent(agent) for _ in range(num_games - 1)]
+
+def play_batched(envs, agents, episodes=None, max_turns=MAX_TURNS):
+    '''
+    play episodes on the games in envs (all the same board size) at once,
+    with agents[seat] in each seat (anything load_agent accepts; an Agent
+    instance that isn't a BatchAgent is copied into every game and seat)
+    episodes: total episodes to play (default: one per game)
+    returns (scores, turns) for every episode, in the order they finished
+    '''
+
+    num_games = len(envs)
+    num_seats = len(agents)
+    episodes = num_games if episodes is None else episodes
+    if len({(env.rows, env.cols) for env in envs}) > 1:
+        raise ValueError('batched games must all have the same board size')
+    seats = [get_seat_agents(agent, num_games) for agent in agents]
+
+    results = []
+    active = []
+    turns = [0] * num_games
+    bomb_lists = [[] for _ in range(num_games)]
+
+    def start_episode(i):
+        env = envs[i]
+        env.reset(num_seats)
+        for number in range(num_seats):
+            seats[number][i].setup(env.rows, env.cols, number)
+        turns[i] = 0
+        bomb_lists[i] = []
+
+    started = 0
+    for i in range(min(num_games, episodes)):
+        start_episode(i)
+        active.append(i)
+        started += 1
+
+    while active:
+        # gather every observation, batching those of each BatchAgent
+        player_actions = {}
+        batches = {} # id(agent) -> (agent, [(game, seat)], [observations])
+        for i in active:
+            env = envs[i]
+            danger = env.get_danger_map()
+            player_actions[i] = [actions.NONE] * num_seats
+            for number in range(num_seats):
+                agent = seats[number][i]
+                observation = Observation(env.board, False, bomb_lists[i], turns[i], env.players[number], danger)
+                if isinstance(agent, BatchAgent):
+                    batch = batches.setdefault(id(agent), (agent, [], []))
+                    batch[1].append((i, number))
+                    batch[2].append(observation)
+                else:
+                    player_actions[i][number] = agent.act(observation)
+
+        for agent, keys, observations in batches.values():
+            for (i, number), action in zip(keys, agent.act_batch(observations)):
+                player_actions[i][number] = action
+
+        # step every game; finished games leave the batch or start the next episode
+        still_active = []
+        for i in active:
+            env = envs[i]
+            _, done, players, bomb_lists[i] = env.step(player_actions[i])
+            turns[i] += 1
+            if not done and turns[i] < max_turns:
+                still_active.append(i)
+                continue
+            results.append(([player.score for player in players], turns[i]))
+            if started < episodes:
+                start_episode(i)
+                started += 1
+                still_active.append(i)
+        active = still_active
+
+    # close the agents loaded or copied here (instances passed in are the caller's to close)
+    for agent, seat_agents in zip(agents, seats):
+        for seat_agent in {id(seat_agent): seat_agent for seat_agent in seat_agents}.values():
+            if seat_agent is not agent:
+                seat_agent.close()
+
+    return results
+
+def play_unbatched(envs, agents, episodes=None, max_turns=MAX_TURNS):
+    '''
+    the same episodes played one game at a time with one decision per call (for comparison)
+    '''
+
+    from tournament import play_match
+
+    episodes = len(envs) if episodes is None else episodes
+    results = []
+    for episode in range(episodes):
+        scores, turns, _ = play_match(envs[episode % len(envs)], agents, max_turns)
+        results.append((scores, turns))
+    return results
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Batched self-play of a random linear policy, against one game at a time')
+    parser.add_argument('--games', type=int, default=256, help='games played at once')
+    parser.add_argument('--episodes', type=int, default=1000)
+    parser.add_argument('--size', default='11x13', help='board size as ROWSxCOLS')
+    parser.add_argument('--max-turns', type=int, default=MAX_TURNS)
+    args = parser.parse_args()
+
+    rows, cols = (int(n) for n in args.size.lower().split('x'))
+    policy = LinearPolicy(rows, cols)
+
+    for name, play, num_games in (('batched', play_batched, args.games), ('one game at a time', play_unbatched, 1)):
+        agent = PolicyAgent(policy)
+        envs = [Game(rows, cols, seed=i) for i in range(num_games)]
+        start = time.perf_counter()
+        results = play(envs, [agent, agent], args.episodes, args.max_turns)
+        elapsed = time.perf_counter() - start
+        turns = sum(turns for _, turns in results)
+        print(f" {name:<20} {len(results)} episodes, {turns} turns in {elapsed:.2f}s"
+              f" ({turns / elapsed:.0f} turns/s, {agent.decisions / max(agent.calls, 1):.1f} decisions per policy call)")
@@ -0,0 +1,53 @@
+'''
+Per-decision latency of the bundled agents. Each agent plays games against
+random_agent from a fixed seed; every decision is timed with
+latency.TimedAgent and summarized as percentiles.
+
+usage: python benchmarks/bench_agents.py
+'''
+
+import os
+import random
+import sys
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from bm_multi_env import Game
+from latency import LatencyStats
+from tournament import play_match
+
+AGENTS = ['random_agent', 'flee_agent', 'lookahead_agent']
+SIZES = [(5, 7), (11, 13)]
+OPPONENT = 'random_agent'
+
+def time_agent(agent, rows, cols, episodes=10, max_turns=100, seed=0):
+    '''
+    LatencyStats of the agent's decisions over a batch of games
+    '''
+
+    random.seed(seed)
+    np.random.seed(seed)
+    env = Game(rows, cols, seed=seed)
+    latency = [LatencyStats(agent), LatencyStats(OPPONENT)]
+    for _ in range(episodes):
+        play_match(env, [agent, OPPONENT], max_turns, latency=latency)
+    return latency[0]
+
+def run(agents=AGENTS, sizes=SIZES, episodes=10):
+    '''
+    {name: (unit, samples)} for every agent and size, the samples being every decision's latency
+    '''
+
+    results = {}
+    for agent in agents:
+        for rows, cols in sizes:
+            stats = time_agent(agent, rows, cols, episodes)
+            results[f'agent.{agent}.{rows}x{cols}'] = ('us', [latency * 1e6 for latency in stats.latencies])
+    return results
+
+if __name__ == '__main__':
+    print(f"\n {'benchmark':<36}{'decisions':>10}{'p50 us':>10}{'p95 us':>10}{'p99 us':>10}")
+    for name, (unit, samples) in run().items():
+        p50, p95, p99 = np.percentile(samples, [50, 95, 99])
+        print(f" {name:<36}{len(samples):>10}{p50:>10.1f}{p95:>10.1f}{p99:>10.1f}")
@@ -0,0 +1,98 @@
+'''
+Game.reset, Game.step and full episodes at several board sizes. Players play
+random actions (moves and bombs) from a fixed seed, so every run times the
+same games. Each timing is the median of several repeats.
+
+usage: python benchmarks/bench_engine.py
+'''
+
+import os
+import statistics
+import sys
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from bm_multi_env import Game
+
+SIZES = [(5, 7), (11, 13), (31, 31)]
+ACTION_P = [0.1, 0.2, 0.2, 0.2, 0.2, 0.1] # NONE, moves, BOMB
+MAX_TURNS = 200 # turns before an episode is cut off, as in tournament.py
+
+def get_actions(steps, num_players=2, seed=0):
+    rng = np.random.default_rng(seed)
+    return rng.choice(6, size=(steps, num_players), p=ACTION_P).tolist()
+
+def time_reset(rows, cols, number=500, repeat=5, seed=0):
+    '''
+    microseconds per Game.reset (map generation included)
+    '''
+
+    env = Game(rows, cols, seed=seed)
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            env.reset()
+        samples.append((time.perf_counter() - start) / number * 1e6)
+    return samples
+
+def time_step(rows, cols, steps=10000, repeat=5, seed=0):
+    '''
+    microseconds per Game.step (resets between games aren't timed)
+    '''
+
+    player_actions = get_actions(steps, seed=seed)
+    samples = []
+    for _ in range(repeat):
+        env = Game(rows, cols, seed=seed)
+        env.reset()
+        elapsed = 0
+        for actions in player_actions:
+            start = time.perf_counter()
+            env.step(actions)
+            elapsed += time.perf_counter() - start
+            if env.done:
+                env.reset()
+        samples.append(elapsed / steps * 1e6)
+    return samples
+
+def time_episode(rows, cols, episodes=100, repeat=5, seed=0):
+    '''
+    milliseconds per episode: a reset, then steps until the game ends or MAX_TURNS
+    '''
+
+    player_actions = get_actions(MAX_TURNS * episodes, seed=seed)
+    samples = []
+    for _ in range(repeat):
+        env = Game(rows, cols, seed=seed)
+        turn = 0
+        start = time.perf_counter()
+        for _ in range(episodes):
+            env.reset()
+            for _ in range(MAX_TURNS):
+                env.step(player_actions[turn])
+                turn += 1
+                if env.done:
+                    break
+        samples.append((time.perf_counter() - start) / episodes * 1000)
+    return samples
+
+def run(sizes=SIZES, repeat=5):
+    '''
+    {name: (unit, samples)} for every size
+    '''
+
+    results = {}
+    for rows, cols in sizes:
+        size = f'{rows}x{cols}'
+        results[f'engine.reset.{size}'] = ('us', time_reset(rows, cols, repeat=repeat))
+        results[f'engine.step.{size}'] = ('us', time_step(rows, cols, repeat=repeat))
+        results[f'engine.episode.{size}'] = ('ms', time_episode(rows, cols, repeat=repeat))
+    return results
+
+if __name__ == '__main__':
+    print(f"\n {'benchmark':<28}{'median':>12}")
+    for name, (unit, samples) in run().items():
+        print(f" {name:<28}{statistics.median(samples):>9.2f} {unit}")
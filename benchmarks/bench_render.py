@@ -0,0 +1,86 @@
+'''
+Game.__str__ and Game.render at several board sizes, mid-game. The text
+render's output is discarded, and the graphical render draws with
+matplotlib's Agg backend, so no window opens. A graphical render includes
+the 50 ms plt.pause the environment waits after every frame.
+
+usage: python benchmarks/bench_render.py
+'''
+
+import contextlib
+import io
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from bm_multi_env import Game
+
+SIZES = [(5, 7), (11, 13), (31, 31)]
+
+def get_midgame(rows, cols, seed=0):
+    '''
+    a game a few turns in, with a bomb on the map
+    '''
+
+    env = Game(rows, cols, seed=seed)
+    env.reset()
+    env.step([5, 5])
+    env.step([0, 0])
+    return env
+
+def time_calls(function, number, repeat):
+    '''
+    milliseconds per call, one sample per repeat
+    '''
+
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            function()
+        samples.append((time.perf_counter() - start) / number * 1000)
+    return samples
+
+def time_graphical(env, number=3, repeat=3):
+    '''
+    milliseconds per graphical render, or None without matplotlib and OpenCV
+    '''
+
+    try:
+        import matplotlib
+        import cv2
+    except ImportError:
+        return None
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    env.render() # the first render loads the images
+    samples = time_calls(env.render, number, repeat)
+    plt.close('all')
+    return samples
+
+def run(sizes=SIZES, repeat=5, graphical=True):
+    '''
+    {name: (unit, samples)} for every size
+    '''
+
+    results = {}
+    for rows, cols in sizes:
+        size = f'{rows}x{cols}'
+        env = get_midgame(rows, cols)
+        results[f'render.str.{size}'] = ('ms', time_calls(lambda: str(env), 200, repeat))
+        with contextlib.redirect_stdout(io.StringIO()):
+            results[f'render.text.{size}'] = ('ms', time_calls(lambda: env.render(graphical=False), 200, repeat))
+        if graphical:
+            samples = time_graphical(env)
+            if samples is not None:
+                results[f'render.graphical.{size}'] = ('ms', samples)
+    return results
+
+if __name__ == '__main__':
+    print(f"\n {'benchmark':<28}{'median':>12}")
+    for name, (unit, samples) in run().items():
+        print(f" {name:<28}{statistics.median(samples):>9.3f} {unit}")
@@ -0,0 +1,47 @@
+'''
+Game.step time as the board and the number of players grow. Players play
+random actions (moves and bombs); resets between games aren't timed. A step
+touches only the players, their bombs and the tiles those bombs reach, so
+its cost depends on the number of players and not on the board area.
+
+usage: python benchmarks/bench_scaling.py
+'''
+
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from bm_multi_env import Game
+
+SIZES = [(11, 13), (31, 31), (63, 63), (127, 127), (255, 255)]
+PLAYERS = [2, 4, 8, 16]
+
+def run(rows=11, cols=13, num_players=2, steps=20000, seed=0):
+    '''
+    microseconds per Game.step
+    '''
+
+    rng = np.random.default_rng(seed)
+    player_actions = rng.choice(6, size=(steps, num_players), p=[0.1, 0.2, 0.2, 0.2, 0.2, 0.1]).tolist()
+
+    env = Game(rows, cols, seed=seed)
+    env.reset(num_players)
+    elapsed = 0
+    for actions in player_actions:
+        start = time.perf_counter()
+        env.step(actions)
+        elapsed += time.perf_counter() - start
+        if env.done:
+            env.reset(num_players)
+
+    return elapsed / steps * 1e6
+
+if __name__ == '__main__':
+    print("\n us per Game.step")
+    print(f" {'board':<10}" + "".join(f"{f'{n} players':>12}" for n in PLAYERS))
+    for rows, cols in SIZES:
+        timings = [run(rows, cols, n) for n in PLAYERS]
+        print(f" {f'{rows}x{cols}':<10}" + "".join(f"{us:>12.2f}" for us in timings))
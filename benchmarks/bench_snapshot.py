@@ -0,0 +1,58 @@
+'''
+Clone cost of a Game mid-episode: copy.deepcopy(env) against
+Game.snapshot/Game.restore and Game.make_move/Game.unmake_move.
+
+usage: python benchmarks/bench_snapshot.py
+'''
+
+import copy
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from bm_multi_env import Game
+
+def get_midgame(rows, cols, turns=3, seed=0):
+    '''
+    a game a few turns in, with both players' bombs on the map
+    '''
+
+    random.seed(seed)
+    env = Game(rows, cols)
+    env.reset()
+    env.step([5, 5])
+    for _ in range(turns):
+        env.step([0, 0])
+    return env
+
+def run(rows=11, cols=13, number=2000):
+
+    env = get_midgame(rows, cols)
+    buffer = env.snapshot()
+    actions = [0, 0]
+
+    def make_unmake():
+        env.make_move(actions)
+        env.unmake_move()
+
+    timings = {
+        'copy.deepcopy(env)': timeit.timeit(lambda: copy.deepcopy(env), number=number),
+        'snapshot(out=buffer)': timeit.timeit(lambda: env.snapshot(out=buffer), number=number),
+        'restore(buffer)': timeit.timeit(lambda: env.restore(buffer), number=number),
+        'make_move + unmake_move': timeit.timeit(make_unmake, number=number),
+    }
+
+    results = {name: total / number * 1e6 for name, total in timings.items()}
+    return results
+
+if __name__ == '__main__':
+    for rows, cols in [(5, 7), (11, 13)]:
+        results = run(rows, cols)
+        baseline = results['copy.deepcopy(env)']
+        print(f"\n {rows}x{cols} board")
+        print(f" {'operation':<28}{'us/call':>10}{'vs deepcopy':>14}")
+        for name, us in results.items():
+            print(f" {name:<28}{us:>10.2f}{baseline / us:>13.1f}x")
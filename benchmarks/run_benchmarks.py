@@ -0,0 +1,183 @@
+'''
+BENCHMARK SUITE
+
+Runs the engine, render, clone and agent benchmarks and writes every result
+to a JSON file, along with the machine, Python and package versions and the
+git commit they were measured on. Each result keeps the median, mean,
+minimum, 95th percentile and spread of its samples (for agents, one
+sample per decision).
+
+Compare mode checks results against a stored baseline. A benchmark whose
+median is more than --threshold slower than the baseline's is flagged as a
+regression, and the script exits with status 1.
+
+usage:
+    python benchmarks/run_benchmarks.py --json baseline.json
+    python benchmarks/run_benchmarks.py --json after.json --compare baseline.json
+    python benchmarks/run_benchmarks.py --only engine agent --compare baseline.json
+    python benchmarks/run_benchmarks.py --current after.json --compare baseline.json # no new run
+'''
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+
+import numpy as np
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCHMARK_DIR)
+sys.path.insert(0, os.path.join(BENCHMARK_DIR, '..'))
+
+import bench_agents
+import bench_engine
+import bench_render
+import bench_snapshot
+
+SUITES = ['engine', 'render', 'snapshot', 'agent']
+THRESHOLD = 0.10 # slowdown of the median flagged as a regression
+
+def run_snapshot():
+    '''
+    bench_snapshot timings as {name: (unit, samples)}
+    '''
+
+    names = {
+        'copy.deepcopy(env)': 'deepcopy',
+        'snapshot(out=buffer)': 'snapshot',
+        'restore(buffer)': 'restore',
+        'make_move + unmake_move': 'make_unmake',
+    }
+    results = {}
+    for rows, cols in [(5, 7), (11, 13)]:
+        for name, us in bench_snapshot.run(rows, cols).items():
+            results[f'snapshot.{names[name]}.{rows}x{cols}'] = ('us', [us])
+    return results
+
+def run_suites(suites=SUITES, graphical=True):
+    '''
+    {name: (unit, samples)} for every benchmark in the chosen suites
+    '''
+
+    results = {}
+    for suite in suites:
+        print(f" running {suite} benchmarks...", file=sys.stderr)
+        if suite == 'engine':
+            results.update(bench_engine.run())
+        elif suite == 'render':
+            results.update(bench_render.run(graphical=graphical))
+        elif suite == 'snapshot':
+            results.update(run_snapshot())
+        elif suite == 'agent':
+            results.update(bench_agents.run())
+    return results
+
+def summarize(unit, samples):
+    return {
+        'unit': unit,
+        'median': statistics.median(samples),
+        'p95': float(np.percentile(samples, 95)),
+        'mean': statistics.fmean(samples),
+        'min': min(samples),
+        'max': max(samples),
+        'stdev': statistics.stdev(samples) if len(samples) > 1 else 0.0,
+        'samples': len(samples),
+    }
+
+def get_git_commit():
+    try:
+        output = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=BENCHMARK_DIR,
+            capture_output=True, text=True, timeout=10)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return output.stdout.strip() or None
+
+def get_metadata():
+    return {
+        'timestamp': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+        'git_commit': get_git_commit(),
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'processor': platform.processor(),
+        'cpu_count': os.cpu_count(),
+    }
+
+def compare(baseline, current, threshold=THRESHOLD):
+    '''
+    rows of (name, unit, baseline median, current median, change) for the benchmarks
+    in both runs, and the names of those more than threshold slower
+    '''
+
+    rows = []
+    regressions = []
+    for name, result in current['results'].items():
+        if name not in baseline['results']:
+            continue
+        before = baseline['results'][name]['median']
+        after = result['median']
+        change = after / before - 1 if before > 0 else 0.0
+        rows.append((name, result['unit'], before, after, change))
+        if change > threshold:
+            regressions.append(name)
+    return rows, regressions
+
+def print_results(results):
+    print(f"\n {'benchmark':<40}{'median':>14}{'mean':>14}{'stdev':>12}")
+    print(" " + "-"*80)
+    for name, result in results.items():
+        unit = result['unit']
+        print(f" {name:<40}{result['median']:>11.2f} {unit:<2}{result['mean']:>11.2f} {unit:<2}{result['stdev']:>9.2f} {unit:<2}")
+
+def print_comparison(rows, regressions, threshold, baseline, current):
+    print(f"\n baseline: {baseline['metadata'].get('git_commit')} ({baseline['metadata'].get('timestamp')})")
+    print(f" current:  {current['metadata'].get('git_commit')} ({current['metadata'].get('timestamp')})")
+    print(f"\n {'benchmark':<40}{'baseline':>14}{'current':>14}{'change':>10}")
+    print(" " + "-"*80)
+    for name, unit, before, after, change in rows:
+        flag = '  REGRESSION' if name in regressions else ''
+        print(f" {name:<40}{before:>11.2f} {unit:<2}{after:>11.2f} {unit:<2}{100*change:>+9.1f}%{flag}")
+
+    missing = sorted(set(baseline['results']) - set(current['results']))
+    if missing:
+        print(f"\n not in this run: {', '.join(missing)}")
+    print(f"\n {len(regressions)} of {len(rows)} benchmarks more than {100*threshold:.0f}% slower than the baseline")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run the benchmark suite and compare against a baseline')
+    parser.add_argument('--only', nargs='+', choices=SUITES, default=SUITES, help='suites to run')
+    parser.add_argument('--json', default=None, help='write the results to this file')
+    parser.add_argument('--compare', default=None, help='baseline results file to compare against')
+    parser.add_argument('--current', default=None, help='compare this results file instead of running the suite')
+    parser.add_argument('--threshold', type=float, default=THRESHOLD, help='slowdown flagged as a regression (0.1 = 10%%)')
+    parser.add_argument('--no-graphical', action='store_true', help='skip the graphical render benchmark')
+    args = parser.parse_args()
+
+    if args.current:
+        with open(args.current) as f:
+            current = json.load(f)
+    else:
+        results = run_suites(args.only, graphical=not args.no_graphical)
+        current = {
+            'metadata': get_metadata(),
+            'results': {name: summarize(unit, samples) for name, (unit, samples) in results.items()},
+        }
+        print_results(current['results'])
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(current, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        rows, regressions = compare(baseline, current, args.threshold)
+        print_comparison(rows, regressions, args.threshold, baseline, current)
+        if regressions:
+            sys.exit(1)
@@ -1,18 +1,30 @@
 '''
 MULTIPLAYER ENVIRONMENT
+
+Games of 1 to MAX_PLAYERS players on boards of up to MAX_BOARD_SIZE tiles a
+side. Players 1 and 2 keep the original board codes; every further player
+takes two more codes (standing, and standing on a bomb) after them.
+Bombs per player, blast radius and chain reactions are set per Game.
 '''
 
 from time import sleep
+import bisect
+import heapq
 import math
 import numpy as np
-import random
-import matplotlib.pyplot as plt
-import matplotlib.image as mpimg
-import cv2
+
+from board_geometry import get_geometry
+from profiling import PhaseProfiler
 
 IMAGE_DIR = 'img/'
 
+BOARD_DTYPE = np.int8 # board values are 0-37, so one byte per tile is enough
+
+MAX_PLAYERS = 16
+MAX_BOARD_SIZE = 255 # tiles per side
+
 def convert_to_rgba(img):
+    import cv2
     if img.shape[2] == 3:
         # convert img from RGB to RGBA
         b_channel, g_channel, r_channel = cv2.split(img)
@@ -21,29 +33,41 @@ def convert_to_rgba(img):
         #cvtColor(img, cv2.COLOR_BGRA2BGR)
     return img
 
-# load images
-img_empty = convert_to_rgba(mpimg.imread(IMAGE_DIR + 'empty.png'))
-img_p1 = convert_to_rgba(mpimg.imread(IMAGE_DIR + 'p1.png'))
-img_p2 = convert_to_rgba(mpimg.imread(IMAGE_DIR + 'p2.png'))
-img_bomb = convert_to_rgba(mpimg.imread(IMAGE_DIR + 'bomb.png'))
-img_exploding_bomb = convert_to_rgba(mpimg.imread(IMAGE_DIR + 'exploding_bomb.png'))
-img_hard_block = convert_to_rgba(mpimg.imread(IMAGE_DIR + 'hard_block.png'))
-img_soft_block = convert_to_rgba(mpimg.imread(IMAGE_DIR + 'soft_block.png'))
-img_exploding_tile = convert_to_rgba(mpimg.imread(IMAGE_DIR + 'exploding_tile.png'))
-
 # map labels to images
-dict_img = {
-    0: img_empty,
-    1: img_p1,
-    2: img_p2,
-    3: img_soft_block,
-    4: img_hard_block,
-    5: img_bomb,
-    6: img_bomb,
-    7: img_bomb,
-    8: img_exploding_bomb,
-    9: img_exploding_tile
-}
+# (filled by load_images on the first graphical render, so matplotlib
+# and OpenCV are only needed for graphical rendering)
+dict_img = {}
+
+def load_images():
+    import matplotlib.image as mpimg
+
+    img_empty = convert_to_rgba(mpimg.imread(IMAGE_DIR + 'empty.png'))
+    img_p1 = convert_to_rgba(mpimg.imread(IMAGE_DIR + 'p1.png'))
+    img_p2 = convert_to_rgba(mpimg.imread(IMAGE_DIR + 'p2.png'))
+    img_bomb = convert_to_rgba(mpimg.imread(IMAGE_DIR + 'bomb.png'))
+    img_exploding_bomb = convert_to_rgba(mpimg.imread(IMAGE_DIR + 'exploding_bomb.png'))
+    img_hard_block = convert_to_rgba(mpimg.imread(IMAGE_DIR + 'hard_block.png'))
+    img_soft_block = convert_to_rgba(mpimg.imread(IMAGE_DIR + 'soft_block.png'))
+    img_exploding_tile = convert_to_rgba(mpimg.imread(IMAGE_DIR + 'exploding_tile.png'))
+
+    dict_img.update({
+        0: img_empty,
+        1: img_p1,
+        2: img_p2,
+        3: img_soft_block,
+        4: img_hard_block,
+        5: img_bomb,
+        6: img_bomb,
+        7: img_bomb,
+        8: img_exploding_bomb,
+        9: img_exploding_tile
+    })
+    # further players alternate between the two player images
+    for number in range(2, MAX_PLAYERS):
+        dict_img[Game.BOARD_DICT[Game.PLAYER_LIST[number]]] = img_p1 if number % 2 == 0 else img_p2
+        dict_img[Game.BOARD_DICT[Game.ON_BOMB_LIST[number]]] = img_bomb
+
+    return dict_img
 
 # map rewards
 d_rewards = {
@@ -70,15 +94,167 @@ class actions:
     DOWN = 4
     BOMB = 5
 
-# stores bomb's timer & position
+def get_player_codes():
+    '''
+    board labels for players 3 to MAX_PLAYERS, two codes each after the original ten
+    '''
+
+    codes = {}
+    for number in range(3, MAX_PLAYERS + 1):
+        codes[f'player{number}'] = 10 + 2 * (number - 3)
+        codes[f'p{number}_on_bomb'] = 11 + 2 * (number - 3)
+    return codes
+
+def get_starting_positions(rows, cols, num_players=2):
+    '''
+    (row, col) of each player at the start of a game: the four corners, then the
+    middle and the quarter points of the edges (on even rows and columns, so
+    that none of them is a hard block)
+    '''
+
+    if not 1 <= num_players <= MAX_PLAYERS:
+        raise ValueError(f'games have 1 to {MAX_PLAYERS} players, not {num_players}')
+
+    def even(x):
+        return x - x % 2
+
+    last_row, last_col = rows - 1, cols - 1
+    middle_row, middle_col = even(rows // 2), even(cols // 2)
+    rows_14, rows_34 = even(rows // 4), even(3 * rows // 4)
+    cols_14, cols_34 = even(cols // 4), even(3 * cols // 4)
+
+    positions = [(0, 0), (last_row, last_col), (0, last_col), (last_row, 0),
+        (0, middle_col), (last_row, middle_col), (middle_row, 0), (middle_row, last_col),
+        (0, cols_14), (last_row, cols_34), (rows_34, 0), (rows_14, last_col),
+        (0, cols_34), (last_row, cols_14), (rows_14, 0), (rows_34, last_col)][:num_players]
+
+    if len(set(positions)) < num_players:
+        raise ValueError(f'a {rows}x{cols} board is too small for {num_players} players')
+    return positions
+
+def get_map_tables(rows, cols, num_players=2):
+    '''
+    starting map layout for a board size:
+    template is the board with players and hard blocks placed
+    open_tiles are the flat tiles that may hold a soft block
+    (every empty tile except the two on each side of a player)
+    '''
+
+    key = (rows, cols, num_players)
+    if key not in _map_tables:
+        template = np.zeros((rows, cols), dtype=np.int64)
+        is_clear = np.zeros((rows, cols), dtype=bool)
+        for number, (row, col) in enumerate(get_starting_positions(rows, cols, num_players)):
+            template[row, col] = Game.BOARD_DICT[Game.PLAYER_LIST[number]]
+            is_clear[max(row - 2, 0):row + 3, col] = True
+            is_clear[row, max(col - 2, 0):col + 3] = True
+        template[1::2,1::2] = Game.BOARD_DICT['hard_block']
+        template = template.reshape(-1)
+
+        is_open = (template == 0) & ~is_clear.reshape(-1)
+        _map_tables[key] = (template, np.flatnonzero(is_open))
+
+    return _map_tables[key]
+
+_map_tables = {}
+
+def generate_maps(rows, cols, num_maps, rng, num_players=2, dtype=BOARD_DTYPE):
+    '''
+    (num_maps, rows, cols) starting boards, with soft blocks on a random 30% of the
+    tiles drawn from rng (a np.random.Generator)
+    '''
+
+    template, open_tiles = get_map_tables(rows, cols, num_players)
+    num_soft_blocks = int(math.floor(0.3*cols*rows))
+    if num_soft_blocks > open_tiles.size:
+        raise ValueError(f'a {rows}x{cols} board is too small for {num_players} players')
+
+    maps = np.empty((num_maps, rows * cols), dtype=dtype)
+    maps[:] = template
+    # choose a random subset of open tiles per map
+    keys = rng.random((num_maps, open_tiles.size))
+    chosen = np.argpartition(keys, num_soft_blocks - 1, axis=1)[:, :num_soft_blocks]
+    maps[np.arange(num_maps)[:, None], open_tiles[chosen]] = Game.BOARD_DICT['soft_block']
+
+    return maps.reshape(num_maps, rows, cols)
+
+def generate_map(rows, cols, rng, num_players=2, dtype=BOARD_DTYPE):
+    return generate_maps(rows, cols, 1, rng, num_players, dtype)[0]
+
+def get_tile_bits(num_players):
+    '''
+    bits per tile needed to pack the boards of a game: 4 while every board
+    code is below 16 (up to 5 players), 8 otherwise
+    '''
+    highest_code = Game.BOARD_DICT[Game.ON_BOMB_LIST[max(num_players, 2) - 1]]
+    return 4 if highest_code < 16 else 8
+
+def pack_board(board, bits=4):
+    '''
+    pack a board, or a (..., rows, cols) stack of boards, into 4 bits per tile
+    returns a (..., ceil(rows*cols/2)) uint8 array, two tiles per byte
+    (with bits=8, a (..., rows*cols) uint8 array)
+    '''
+
+    board = np.asarray(board)
+    tiles = board.reshape(board.shape[:-2] + (-1,)).astype(np.uint8)
+    if bits == 8:
+        return tiles
+    if tiles.shape[-1] % 2:
+        tiles = np.concatenate([tiles, np.zeros(tiles.shape[:-1] + (1,), dtype=np.uint8)], axis=-1)
+    return (tiles[..., 0::2] << 4) | tiles[..., 1::2]
+
+def unpack_board(packed, rows, cols, dtype=BOARD_DTYPE, bits=4):
+    '''
+    inverse of pack_board: (..., ceil(rows*cols/2)) uint8 -> (..., rows, cols)
+    '''
+
+    packed = np.asarray(packed, dtype=np.uint8)
+    if bits == 8:
+        return packed[..., :rows * cols].astype(dtype).reshape(packed.shape[:-1] + (rows, cols))
+    tiles = np.empty(packed.shape[:-1] + (2 * packed.shape[-1],), dtype=np.uint8)
+    tiles[..., 0::2] = packed >> 4
+    tiles[..., 1::2] = packed & 0x0F
+    return tiles[..., :rows * cols].astype(dtype).reshape(packed.shape[:-1] + (rows, cols))
+
+# view of one bomb slot in the game's bomb arrays
 class Bomb():
 
-    def __init__(self, position, tiles_in_range, player=0, max_timer=5):
-        self.timer = max_timer
-        self.position = position
-        self.owned_by = player
-        self.recently_exploded = False
-        self.tiles_in_range = tiles_in_range
+    __slots__ = ['game', 'index']
+
+    def __init__(self, game, index):
+        self.game = game
+        self.index = index
+
+    @property
+    def timer(self):
+        return self.game.bomb_timers.item(self.index)
+
+    @timer.setter
+    def timer(self, value):
+        self.game.bomb_timers[self.index] = value
+        self.game.index_bombs() # reschedule it
+
+    @property
+    def position(self):
+        return divmod(self.game.bomb_tiles.item(self.index), self.game.cols)
+
+    @property
+    def owned_by(self):
+        return self.game.bomb_owners.item(self.index)
+
+    @property
+    def recently_exploded(self):
+        return bool(self.game.bomb_exploded[self.index])
+
+    @recently_exploded.setter
+    def recently_exploded(self, value):
+        self.game.bomb_exploded[self.index] = value
+
+    @property
+    def tiles_in_range(self):
+        game = self.game
+        return [divmod(tile, game.cols) for tile in game.blast_table[game.bomb_tiles.item(self.index)]]
 
     def update_timer(self):
         self.timer -= 1
@@ -90,15 +266,47 @@ class Bomb():
         self.recently_exploded = False
 
 # define behavior of player e.g. powerups, score
+# (a view of one player in the game's player arrays)
 class Player():
 
-    def __init__(self, number, starting_position, max_bombs):
+    __slots__ = ['game', 'number']
+
+    def __init__(self, game, number):
+        self.game = game
         self.number = number
-        self.position = starting_position
-        self.prev_position = starting_position
-        self.bombs = []
-        self.num_bombs = max_bombs
-        self.score = 0
+
+    @property
+    def position(self):
+        return divmod(self.game.player_tiles.item(self.number), self.game.cols)
+
+    @position.setter
+    def position(self, position):
+        self.game.player_tiles[self.number] = position[0] * self.game.cols + position[1]
+
+    @property
+    def prev_position(self):
+        return divmod(self.game.player_prev_tiles.item(self.number), self.game.cols)
+
+    @property
+    def bombs(self):
+        game = self.game
+        return [game.bomb_views[slot] for slot in game.player_slots[self.number] if game.bomb_active[slot]]
+
+    @property
+    def num_bombs(self):
+        return self.game.player_num_bombs.item(self.number)
+
+    @num_bombs.setter
+    def num_bombs(self, value):
+        self.game.player_num_bombs[self.number] = value
+
+    @property
+    def score(self):
+        return self.game.player_scores.item(self.number)
+
+    @score.setter
+    def score(self, value):
+        self.game.player_scores[self.number] = value
 
     def update_score(self, reward):
         '''
@@ -120,174 +328,581 @@ class Game():
     # dictionary of board labels
     BOARD_DICT = {'empty':0,'player1':1, 'player2':2,'soft_block':3,'hard_block':4,
     'bomb':5,'p1_on_bomb':6, 'p2_on_bomb':7, 'exploding_bomb':8, 'exploding_tile':9}
+    BOARD_DICT.update(get_player_codes())
 
     # dictionary of rewards
     REWARDS_DICT = {'destroy_blocks':1, 'invalid_move':-10, 'lose':-1000}
 
-    PLAYER_LIST = ['player1','player2']
-    ON_BOMB_LIST = ['p1_on_bomb','p2_on_bomb']
+    PLAYER_LIST = [f'player{number}' for number in range(1, MAX_PLAYERS + 1)]
+    ON_BOMB_LIST = [f'p{number}_on_bomb' for number in range(1, MAX_PLAYERS + 1)]
 
     # define movement patterns for each action
     ACTIONS_DICT = {0:(0,0),5:(0,0),1:(0,-1),2:(0,1),3:(-1,0),4:(1,0)}
 
-    def __init__(self,rows=11,cols=13):
+    # fields of each player and each bomb slot, stored column-wise in self.state
+    PLAYER_FIELDS = ['tiles', 'prev_tiles', 'scores', 'num_bombs']
+    BOMB_FIELDS = ['tiles', 'timers', 'owners', 'active', 'exploded']
+
+    def __init__(self,rows=11,cols=13,dtype=BOARD_DTYPE,seed=None,map_pool=None,
+                 max_bombs=MAX_BOMBS,blast_radius=1,chain_reactions=False):
+        if not (1 <= rows <= MAX_BOARD_SIZE and 1 <= cols <= MAX_BOARD_SIZE):
+            raise ValueError(f'boards have 1 to {MAX_BOARD_SIZE} rows and columns, not {rows}x{cols}')
         self.rows=rows
         self.cols=cols
+        self.dtype=dtype # board dtype (np.int64 for the original full-width boards)
+        self.rng = np.random.default_rng(seed) # draws the starting maps
+        self.map_pool = map_pool # optional MapPool of pregenerated starting maps
+        self.map_seed = None
+        self.geometry = get_geometry(rows, cols) # static neighbour, blast and distance tables
+        self.move_table = self.geometry.move
+        self.num_players = 0
+
+        # bomb rules
+        self.max_bombs = max_bombs # bombs each player can have on the board at once
+        self.blast_radius = blast_radius # tiles a blast reaches in each direction
+        self.chain_reactions = chain_reactions # blasts set off the bombs they reach
+        self.blast_table = self.geometry.get_blast(blast_radius)
+        self.tick = 0 # steps since reset, for the bomb scheduler (see index_bombs)
+        self.bomb_changes = 0 # bombs placed, exploded or cleared, so unmake_move knows when to reindex
+        self.timers_stale = False # bomb_timers is behind the step count (see sync_timers)
+        self.undo_stack = [] # one entry per make_move that hasn't been unmade
+        self.undo_log = None # board writes recorded during make_move
+        self.profiler = None # PhaseProfiler of the last profile() call
+
+        # turns until each tile is hit by a live bomb (0: safe), see get_danger_map
+        self.danger = np.zeros((rows, cols), dtype=np.int8)
+        self._flat_danger = self.danger.reshape(-1)
+        self.danger_tiles = [] # tiles currently set in the danger map
+        self.danger_stale = True # bombs may have changed since the danger map was updated
+
+        self.player_codes = [self.BOARD_DICT[name] for name in self.PLAYER_LIST]
+        self.on_bomb_codes = [self.BOARD_DICT[name] for name in self.ON_BOMB_LIST]
+        # which player a board value belongs to
+        self.code_owners = {code: number for codes in (self.player_codes, self.on_bomb_codes) for number, code in enumerate(codes)}
+        self.standing_codes = set(self.player_codes) # players not on a bomb
+        # flat tile -> player shown there on the board, kept up to date by set_tile
+        # so blasts find the players they hit without reading the board
+        self.player_at = {}
+        self.owner_table = np.full(max(self.BOARD_DICT.values()) + 1, -1, dtype=np.int64)
+        for code, number in self.code_owners.items():
+            self.owner_table[code] = number
+
+    @property
+    def board(self):
+        return self._board
+
+    @board.setter
+    def board(self, board):
+        self._board = np.ascontiguousarray(board)
+        self._flat_board = self._board.reshape(-1) # flat view, indexed by tile
+        self.index_players()
+
+    def index_players(self):
+        '''
+        rebuild player_at from the whole board (after it is replaced or restored)
+        '''
+
+        owners = self.owner_table[self._flat_board]
+        tiles = np.flatnonzero(owners >= 0)
+        self.player_at = dict(zip(tiles.tolist(), owners[tiles].tolist()))
+
+    @property
+    def state(self):
+        if self.timers_stale:
+            self.sync_timers()
+        return self._state
+
+    @property
+    def bomb_timers(self):
+        if self.timers_stale:
+            self.sync_timers()
+        return self._bomb_timers
+
+    def sync_timers(self):
+        '''
+        write the turns left on every live bomb into bomb_timers. A step only
+        explodes the bombs due that step and doesn't count the others down, so
+        their timers are worked out from their due step when they are read
+        (through bomb_timers, state, the Bomb views or a snapshot).
+        '''
+
+        timers = self._bomb_timers
+        tick = self.tick
+        bomb_due = self.bomb_due
+        for slot in self.bomb_at.values():
+            timers[slot] = bomb_due[slot] - tick + 1
+        self.timers_stale = False
+
+    def init_arrays(self, num_players):
+        '''
+        allocate the player and bomb arrays. Every array is a view into one
+        flat buffer (self.state), so the whole entity state can be copied,
+        saved or restored at once.
+        '''
+
+        num_slots = num_players * self.max_bombs
+        num_player_fields = len(self.PLAYER_FIELDS)
+        num_bomb_fields = len(self.BOMB_FIELDS)
+        self._state = np.zeros(num_players * num_player_fields + num_slots * num_bomb_fields, dtype=np.int64)
+        self.timers_stale = False
+
+        players = self._state[:num_players * num_player_fields].reshape(num_player_fields, num_players)
+        self.player_tiles, self.player_prev_tiles, self.player_scores, self.player_num_bombs = players
+
+        bombs = self._state[num_players * num_player_fields:].reshape(num_bomb_fields, num_slots)
+        self.bomb_tiles, self._bomb_timers, self.bomb_owners, self.bomb_active, self.bomb_exploded = bombs
+
+        self.num_players = num_players
+        # bomb slots owned by each player
+        self.player_slots = [list(range(number * self.max_bombs, (number + 1) * self.max_bombs)) for number in range(num_players)]
+        self.bomb_owners[:] = np.repeat(np.arange(num_players), self.max_bombs)
+
+        self.players = [Player(self, number) for number in range(num_players)]
+        self.bomb_views = [Bomb(self, slot) for slot in range(num_slots)]
+        self.initial_state = self._state.copy()
+        self.index_bombs()
+
+    def index_bombs(self):
+        '''
+        rebuild the bomb scheduler from the bomb arrays. Call this after writing the
+        arrays directly (restore, unmake_move and reset already do).
+
+        Every live bomb is filed in its owner's timer wheel under the step it is due
+        to explode, so a step only looks at the bombs due that step:
+            wheel[player][tick]               slots due on that step
+            bomb_due[slot]                    step the slot's bomb is due (-1: none)
+            live_slots[player]                the player's active slots, in slot order
+            exploded_slots[player]            the player's exploded slots waiting to be cleared
+            exploded_at[slot]                 step an exploded slot went off
+            bomb_at[tile]                     unexploded bomb on a tile
+        '''
+
+        if self.timers_stale:
+            self.sync_timers()
+        tick = self.tick
+        num_players = self.num_players
+        self.wheel = [{} for _ in range(num_players)]
+        self.bomb_due = [-1] * len(self.bomb_views)
+        self.live_slots = [[] for _ in range(num_players)]
+        self.exploded_slots = [[] for _ in range(num_players)]
+        self.exploded_at = {}
+        self.bomb_at = {}
+
+        bomb_active = self.bomb_active.tolist()
+        if 1 not in bomb_active:
+            return
+        tiles = self.bomb_tiles.tolist()
+        timers = self._bomb_timers.tolist()
+        owners = self.bomb_owners.tolist()
+        exploded = self.bomb_exploded.tolist()
+        for slot, active in enumerate(bomb_active):
+            if not active:
+                continue
+            number = owners[slot]
+            self.live_slots[number].append(slot)
+            if exploded[slot]:
+                self.exploded_slots[number].append(slot)
+                self.exploded_at[slot] = tick - 1
+            else:
+                # a bomb with timer t is counted down this step and explodes when it reaches 0
+                due = tick + timers[slot] - 1
+                self.bomb_due[slot] = due
+                self.wheel[number].setdefault(due, []).append(slot)
+                self.bomb_at[tiles[slot]] = slot
 
     def step(self, player_actions):
+        '''
+        play one turn. Only the bombs due this step are touched: the timers of
+        the others are derived from their due step when read (see sync_timers).
+        '''
 
-        rewards = np.zeros((len(self.players),1)) # rewards assigned this turn
+        board = self._flat_board
         bomb_list = [] # populate list of bombs to return to players
+        tick = self.tick
+        bomb_views = self.bomb_views
+
+        # read the player positions once; each player's entry is only
+        # changed during that player's own turn below
+        player_tiles = self.player_tiles.tolist()
 
         # get player's new positions
-        for player in self.players:
+        for number in range(self.num_players):
             # store current position before next move
-            player.prev_position = player.position 
+            tile = player_tiles[number]
+            self.player_prev_tiles[number] = tile
 
             # clear any recent bombs
-            for bomb in player.bombs:
-                if bomb.recently_exploded == True:
-                    self.clear_bomb(bomb)
-                    del bomb 
-                    player.bombs = [] 
+            if self.exploded_slots[number]:
+                self.clear_bombs(number)
 
             # get player's action
-            action = player_actions[player.number]
+            action = player_actions[number]
             # get player's new position if action is taken
-            new_position = tuple([sum(x) for x in zip(self.ACTIONS_DICT[player_actions[player.number]],player.prev_position)])
+            new_tile = self.move_table[tile][action]
 
-            if self.check_if_valid(action, player.prev_position, new_position):
-                player.position = new_position # valid move, so update player's position
+            if self.check_if_valid(action, tile, new_tile):
                 if action == actions.BOMB:
-                    if player.num_bombs > 0:
-                        player.bombs.append(Bomb(player.position, self.get_tiles_in_range(player.position), player.number, self.MAX_TIMER)) # create a bomb instance
-                        player.num_bombs -= 1 # one less bomb available for the player
-                        self.board[player.position] = self.BOARD_DICT[self.ON_BOMB_LIST[player.number]] # place bomb on map
+                    if self.player_num_bombs.item(number) > 0 and tile not in self.bomb_at:
+                        self.place_bomb(number, tile)
                 elif action == actions.NONE:
                     pass
                 else:
                     # move
-                    self.board[player.position] = self.BOARD_DICT[self.PLAYER_LIST[player.number]]
+                    self.player_tiles[number] = new_tile
+                    self.set_tile(new_tile, self.player_codes[number])
 
-                    if not self.board[player.prev_position] == self.BOARD_DICT[self.ON_BOMB_LIST[player.number]]:
+                    if not board.item(tile) == self.on_bomb_codes[number]:
                         # clear previous position only if it wasn't a just-placed bomb
-                        self.board[player.prev_position] = self.BOARD_DICT['empty']
+                        self.set_tile(tile, self.BOARD_DICT['empty'])
                     else:
                         # player has left behind a bomb
-                        self.board[player.prev_position] = self.BOARD_DICT['bomb']
+                        self.set_tile(tile, self.BOARD_DICT['bomb'])
             else:
                 # return some invalid move penalty
-                player.score += self.get_reward('invalid_move')
-
-            # update timer of any bombs
-            for bomb in player.bombs:
-                bomb_list.append(bomb)
-                bomb.update_timer()                               
-                if bomb.timer == 0: # bomb explodes
-                    # check if any player is in range of the bomb
-                    is_game_over, player_hit = self.check_if_game_over(bomb.tiles_in_range)
-                    if is_game_over:
-                        self.done = True
-                        self.players[player_hit].score += self.get_reward('lose')
-                    num_blocks = self.explode_bomb(bomb) # update bomb objects and map
-                    player.score += self.get_reward('destroy_blocks', num_blocks)
-                    player.num_bombs += 1 # return bomb to the player
-
+                self.player_scores[number] += self.get_reward('invalid_move')
+
+            for slot in self.live_slots[number]:
+                bomb_list.append(bomb_views[slot])
+
+            # explode the player's bombs due this step
+            due = self.wheel[number].pop(tick, None)
+            if due:
+                for slot in due:
+                    # skip slots whose bomb went off early in a chain reaction
+                    if self.bomb_due[slot] == tick:
+                        self.detonate(slot)
+
+        self.tick = tick + 1
+        self.timers_stale = True
+        self.danger_stale = True
         return self.board, self.done, self.players, bomb_list
 
-    def check_if_valid(self, action, curr_pos, new_pos):
+    def detonate(self, slot):
+        '''
+        explode a bomb, and with chain reactions every live bomb its blast reaches
+        (each bomb scores for its own owner)
+        '''
+
+        queue = [slot]
+        for slot in queue:
+            number = self.bomb_owners.item(slot)
+            tiles = self.blast_table[self.bomb_tiles.item(slot)]
+            # check if any player is in range of the bomb
+            # (every player caught loses, and the game ends even if several are hit at once)
+            is_game_over, players_hit = self.check_if_game_over(tiles)
+            if is_game_over:
+                self.done = True
+                for player_hit in players_hit:
+                    self.player_scores[player_hit] += self.get_reward('lose')
+            num_blocks = self.explode_bomb(slot) # update bomb arrays and map
+            self.player_scores[number] += self.get_reward('destroy_blocks', num_blocks)
+            self.player_num_bombs[number] += 1 # return bomb to the player
+
+            if self.chain_reactions:
+                for tile in tiles:
+                    other = self.bomb_at.pop(tile, None)
+                    if other is not None:
+                        queue.append(other)
+
+    def set_tile(self, tile, value):
+        '''
+        write a board tile (flat index), recording its old value while inside make_move
+        '''
+        if self.undo_log is not None:
+            self.undo_log.append((tile, self._flat_board.item(tile)))
+        self._flat_board[tile] = value
+        number = self.code_owners.get(value)
+        if number is None:
+            self.player_at.pop(tile, None)
+        else:
+            self.player_at[tile] = number
+
+    ###################################
+    ######## SIMULATION HELPERS #######
+    ###################################
+
+    def make_move(self, player_actions):
+        '''
+        same as step, but the step can be reverted with unmake_move
+        '''
+
+        done = self.done
+        state = self.state.copy()
+        tick = self.tick
+        bomb_changes = self.bomb_changes
+        self.undo_log = []
+        try:
+            result = self.step(player_actions)
+        finally:
+            self.undo_stack.append((done, state, self.undo_log, tick, bomb_changes))
+            self.undo_log = None
+
+        return result
+
+    def unmake_move(self):
+        '''
+        revert the most recent make_move
+        '''
+
+        done, state, tiles, tick, bomb_changes = self.undo_stack.pop()
+        # restore the board tiles in reverse order of writing
+        board = self._flat_board
+        player_at = self.player_at
+        for tile, value in reversed(tiles):
+            board[tile] = value
+            number = self.code_owners.get(value)
+            if number is None:
+                player_at.pop(tile, None)
+            else:
+                player_at[tile] = number
+
+        self._state[:] = state # saved by make_move with the timers in sync
+        self.timers_stale = False
+        self.done = done
+        self.tick = tick
+        # the scheduler is keyed by step, so it only needs rebuilding if the step changed a bomb
+        if self.bomb_changes != bomb_changes:
+            self.index_bombs()
+        self.danger_stale = True
+
+    def get_danger_map(self):
+        '''
+        (rows, cols) map of the number of turns until each tile is hit by a live bomb
+        (1: hit at the end of the next turn, 0: no live bomb in range)
+        The same array is updated in place, touching only the tiles in range of
+        the bombs live before and after the last step, and only when requested.
+        '''
+
+        if self.danger_stale:
+            danger = self._flat_danger
+            for tile in self.danger_tiles:
+                danger[tile] = 0
+
+            tiles = []
+            bomb_tiles = self.bomb_tiles.tolist()
+            timers = self.get_chain_timers() if self.chain_reactions else self.bomb_timers.tolist()
+            for slot in self.bomb_at.values():
+                timer = timers[slot]
+                for tile in self.blast_table[bomb_tiles[slot]]:
+                    ticks = danger.item(tile)
+                    if ticks == 0 or timer < ticks:
+                        danger[tile] = timer
+                    tiles.append(tile)
+
+            self.danger_tiles = tiles
+            self.danger_stale = False
+
+        return self.danger
+
+    def get_chain_timers(self):
+        '''
+        turns until each bomb explodes, counting bombs set off early by the blasts
+        of others (a shortest-path pass over the live bombs, soonest first)
+        '''
+
+        timers = self.bomb_timers.tolist()
+        bomb_tiles = self.bomb_tiles.tolist()
+        bomb_at = self.bomb_at
+        queue = [(timers[slot], slot) for slot in bomb_at.values()]
+        heapq.heapify(queue)
+        while queue:
+            timer, slot = heapq.heappop(queue)
+            if timer > timers[slot]:
+                continue
+            for tile in self.blast_table[bomb_tiles[slot]]:
+                other = bomb_at.get(tile)
+                if other is not None and timers[other] > timer:
+                    timers[other] = timer
+                    heapq.heappush(queue, (timer, other))
+        return timers
+
+    def packed_board(self):
+        '''
+        the board packed at 4 bits per tile, or 8 with more than 5 players (see pack_board)
+        '''
+        return pack_board(self._board, get_tile_bits(self.num_players))
+
+    def board_key(self):
+        '''
+        hashable key of the board, e.g. for a dict of visited positions
+        '''
+        return self.packed_board().tobytes()
+
+    def last_move_tiles(self):
+        '''
+        (flat tile, old value) of every board write made by the most recent make_move
+        '''
+        return self.undo_stack[-1][2]
+
+    def snapshot_size(self):
+        return 2 + self.rows * self.cols + self._state.size
+
+    def snapshot(self, out=None):
+        '''
+        pack the full game state into a flat integer buffer:
+        done, number of players, board, then the player and bomb arrays (self.state)
+        '''
+
+        if out is None:
+            out = np.empty(self.snapshot_size(), dtype=np.int64)
+
+        num_tiles = self.rows * self.cols
+        out[0] = self.done
+        out[1] = self.num_players
+        out[2:2+num_tiles] = self._flat_board
+        out[2+num_tiles:] = self.state
+
+        return out
+
+    def restore(self, snapshot):
+        '''
+        load a state packed by snapshot, reusing the current board and arrays
+        '''
+
+        num_tiles = self.rows * self.cols
+        self.done = bool(snapshot[0])
+        num_players = int(snapshot[1])
+        if getattr(self, '_board', None) is None:
+            self.board = np.zeros((self.rows, self.cols), dtype=self.dtype)
+        if self.num_players != num_players:
+            self.init_arrays(num_players)
+
+        self._flat_board[:] = snapshot[2:2+num_tiles]
+        self.index_players()
+        self._state[:] = snapshot[2+num_tiles:]
+        self.timers_stale = False
+        self.index_bombs()
+        self.undo_stack = []
+        self.danger_stale = True
+
+    def check_if_valid(self, action, curr_tile, new_tile):
 
         if (action == actions.NONE) or (action == actions.BOMB):
             is_valid = True
-        elif (new_pos[0] < 0 or new_pos[1] < 0):
-            # trying to move through left or top boundary
-            is_valid = False
-        elif new_pos[0] >= self.rows or new_pos[1] >= self.cols:
-            # trying to move through right or bottom boundary
+        elif new_tile < 0:
+            # trying to move through a boundary
             is_valid = False
-        elif (self.board[tuple(new_pos)] == self.BOARD_DICT['empty']) or (self.board[tuple(new_pos)] == self.BOARD_DICT['exploding_tile']):
-            is_valid = True
         else:
-            is_valid = False
+            value = self._flat_board.item(new_tile)
+            is_valid = (value == self.BOARD_DICT['empty']) or (value == self.BOARD_DICT['exploding_tile'])
 
         return is_valid
 
     def check_if_game_over(self,tiles):
 
-        is_game_over = False # did a player get hit
-        player_hit = None # which player
+        players_hit = [] # which players got hit
 
+        player_at = self.player_at
         for tile in tiles:
-            if (self.board[tile] == self.BOARD_DICT['player1']) or (self.board[tile] == self.BOARD_DICT['p1_on_bomb']):
-                is_game_over = True
-                player_hit = 0
+            number = player_at.get(tile)
+            if number is not None:
+                players_hit.append(number)
 
-            if (self.board[tile] == self.BOARD_DICT['player2']) or (self.board[tile] == self.BOARD_DICT['p2_on_bomb']):
-                is_game_over = True
-                player_hit = 1
+        is_game_over = len(players_hit) > 0 # did a player get hit
 
-        return is_game_over, player_hit
+        return is_game_over, players_hit
 
     ###################################            
     ###### BOMB HELPER FUNCTIONS ######
     ###################################
 
-    def get_tiles_in_range(self, position):
+    def get_tiles_in_range(self, tile):
         '''
-        get surrounding 4 tiles impacted near bomb
+        get tiles impacted by a bomb (flat indices), up to blast_radius
+        tiles in each direction, excluding tiles that cross the border
+        of the board or contain indestructible object
         '''
+        return self.blast_table[tile]
 
-        tile_up = (position[0]-1,position[1])
-        tile_down = (position[0]+1,position[1])
-        tile_left = (position[0],position[1]-1)
-        tile_right = (position[0],position[1]+1)
-        
-        bomb_range = [tile_up, tile_down, tile_left, tile_right, position]
-        tiles_to_remove = []
+    def place_bomb(self, number, tile):
+        '''
+        create a bomb in one of the player's free slots
+        '''
 
-        for tile in bomb_range:
-            if (tile[0] < 0 or tile[1] < 0 or tile[0] >= self.rows or tile[1] >= self.cols or 
-                self.board[tile] == self.BOARD_DICT['hard_block']):
-                # exclude tiles that cross the border of the board
-                # or contain indestructible object
-                tiles_to_remove.append(tile)
+        for slot in self.player_slots[number]:
+            if not self.bomb_active[slot]:
+                break
 
-        for tile in tiles_to_remove:
-            bomb_range.remove(tile)
+        self.bomb_tiles[slot] = tile
+        self.bomb_active[slot] = True
+        self.bomb_exploded[slot] = False
+        self.player_num_bombs[number] -= 1 # one less bomb available for the player
+        self.set_tile(tile, self.on_bomb_codes[number]) # place bomb on map
 
-        return bomb_range
+        # schedule it: counted down from this step on, it explodes MAX_TIMER - 1 steps later
+        due = self.tick + self.MAX_TIMER - 1
+        self.bomb_due[slot] = due
+        self.wheel[number].setdefault(due, []).append(slot)
+        bisect.insort(self.live_slots[number], slot)
+        self.bomb_at[tile] = slot
+        self.bomb_changes += 1
 
-    def explode_bomb(self, bomb):
+        return self.bomb_views[slot]
+
+    def explode_bomb(self, slot):
         '''
-        reset bomb parameters and return number of blocks destroyed
+        update bomb arrays and map, and return number of blocks destroyed
         '''
 
         num_blocks = 0
+        board = self._flat_board
+        bomb_tile = self.bomb_tiles.item(slot)
 
         # update tiles that have been impacted
-        for tile in bomb.tiles_in_range:
-            if self.board[tile] == self.BOARD_DICT['soft_block']:
+        for tile in self.get_tiles_in_range(bomb_tile):
+            if board.item(tile) == self.BOARD_DICT['soft_block']:
                 num_blocks+=1
-            self.board[tile] = self.BOARD_DICT['exploding_tile']
+            self.set_tile(tile, self.BOARD_DICT['exploding_tile'])
 
-        self.board[bomb.position] = self.BOARD_DICT['exploding_bomb']
+        self.set_tile(bomb_tile, self.BOARD_DICT['exploding_bomb'])
 
-        bomb.explode()
+        self.bomb_exploded[slot] = True
+        self._bomb_timers[slot] = 0
+        self.bomb_due[slot] = -1
+        self.bomb_at.pop(bomb_tile, None)
+        self.exploded_at[slot] = self.tick
+        self.exploded_slots[self.bomb_owners.item(slot)].append(slot)
+        self.bomb_changes += 1
 
         return num_blocks
 
-    def clear_bomb(self, bomb):
+    def clear_bomb(self, slot):
         '''
-        clear map after recent bomb
+        clear map after recent bomb and free its slot
         '''
 
-        self.board[bomb.position] = self.BOARD_DICT['empty'] 
-        for tile in bomb.tiles_in_range:
-            if (self.board[tile] != self.BOARD_DICT['player1']) and (self.board[tile] != self.BOARD_DICT['player2']):
-                self.board[tile] = self.BOARD_DICT['empty']
+        board = self._flat_board
+        bomb_tile = self.bomb_tiles.item(slot)
+        self.set_tile(bomb_tile, self.BOARD_DICT['empty'])
+        for tile in self.get_tiles_in_range(bomb_tile):
+            if board.item(tile) not in self.standing_codes:
+                self.set_tile(tile, self.BOARD_DICT['empty'])
+
+        self.bomb_active[slot] = False
+        self.bomb_exploded[slot] = False
+        self.live_slots[self.bomb_owners.item(slot)].remove(slot)
+        del self.exploded_at[slot]
+        self.bomb_changes += 1
+
+    def clear_bombs(self, number):
+        '''
+        clear the player's bombs that exploded on an earlier step
+        '''
+
+        waiting = []
+        for slot in self.exploded_slots[number]:
+            if self.exploded_at[slot] < self.tick:
+                self.clear_bomb(slot)
+            else:
+                waiting.append(slot) # set off this step by another player's bomb
+        self.exploded_slots[number] = waiting
+
+    def get_rules(self):
+        '''
+        the bomb rules as Game keyword arguments, to build a Game that plays the same way
+        '''
+        return {'max_bombs': self.max_bombs, 'blast_radius': self.blast_radius, 'chain_reactions': self.chain_reactions}
 
-        bomb.clear()
-        
     def get_reward(self, item, num_blocks=0):
         '''
         reward system:
@@ -301,63 +916,79 @@ class Game():
         else:
             return self.REWARDS_DICT[item]
 
-    def reset(self,num_players=2):
+    def reset(self,num_players=2,seed=None):
         '''
         Initializes a starting board
+        seed: reseed the game's generator, to replay a particular episode
         '''
 
         ### move num_players to environment level
 
+        if seed is not None:
+            self.rng = np.random.default_rng(seed)
+        self.map_seed = seed # recorded in replays
+
         # initalize board
-        self.board = np.zeros((self.rows,self.cols)).astype(int)
-        self.players = [] # stores player objects
-        self.tiles_in_range = [] # stores position of surrounding spaces near a bomb --> should beowned by bomb?
+        self.board = self.get_starting_board(num_players)
         self.done = False # checks if game over
-
-        # number of soft blocks to place
-        num_soft_blocks = int(math.floor(0.3*self.cols*self.rows))
+        self.undo_stack = []
+        self.danger_stale = True
 
         # initialize players
-        assert num_players <= 4
-        starting_positions = [(0,0), (self.rows-1, self.cols-1), (0, self.cols-1), (self.rows-1, 0)]
-        for i in range(num_players):
-            self.players.append(Player(i, starting_positions[i], self.MAX_BOMBS))
+        if self.num_players == num_players:
+            # reuse the arrays (and Player views) of the previous episode
+            self._state[:] = self.initial_state
+            self.timers_stale = False
+        else:
+            self.init_arrays(num_players)
+        for i, position in enumerate(get_starting_positions(self.rows, self.cols, num_players)):
+            self.players[i].position = position
+        self.player_prev_tiles[:] = self.player_tiles
+        self.player_num_bombs[:] = self.max_bombs
+        self.tick = 0
+        self.index_bombs()
 
-        # update map with player locations
-        player_list = ['player1', 'player2', 'player3', 'player4']
-        for player in range(len(self.players)):
-            self.board[self.players[player].position] = self.BOARD_DICT[player_list[player]]
+        return self.board, self.players
 
-        # place hard blocks
-        self.board[1::2,1::2] = self.BOARD_DICT['hard_block']
+    def get_starting_board(self, num_players):
+        '''
+        a new starting map (from the map pool if there is one)
+        '''
 
-        ## place soft blocks (random)
-        # flatten array
-        flat_board = np.reshape(self.board,-1)
-        # get positions that can be filled
-        open_pos = [i for i in range(len(flat_board)) if flat_board[i] == 0]
-        # spots immediately to the right and bottom of player1 can't be filled
-        open_pos.remove(1)
-        open_pos.remove(2)
-        open_pos.remove(self.cols)
-        open_pos.remove(self.cols*2)
-        # spots immediately to the left and top of player2 can't be filled
-        open_pos.remove(self.cols * self.rows - 2)
-        open_pos.remove(self.cols * self.rows - 3)
-        open_pos.remove(self.cols * self.rows - self.cols*2 - 1)
-        open_pos.remove(self.cols * self.rows - self.cols - 1)
-        # choose a random subset from open spots
-        rand_pos = random.sample(open_pos,num_soft_blocks)
-        flat_board[rand_pos] = self.BOARD_DICT['soft_block']
-        self.board = np.reshape(flat_board,(self.rows,self.cols))
+        pool = self.map_pool
+        if pool is not None and pool.rows == self.rows and pool.cols == self.cols and pool.num_players == num_players:
+            return np.array(pool.sample(self.rng), dtype=self.dtype)
+        return generate_map(self.rows, self.cols, self.rng, num_players, self.dtype)
 
-        return self.board, self.players
+    def profile(self, trace_memory=False):
+        '''
+        start timing the phases of step and reset (see profiling.py), and return the
+        PhaseProfiler. Use it as a context manager, or call its stop method.
+        trace_memory: also record allocations with tracemalloc
+        '''
+
+        if self.profiler is not None and self.profiler.running:
+            raise RuntimeError('this game is already being profiled')
+        self.profiler = PhaseProfiler(self, trace_memory=trace_memory)
+        return self.profiler.start()
+
+    def stats(self):
+        '''
+        phase timings (and allocations) from the last profile() call, {} if never profiled
+        '''
+        if self.profiler is None:
+            return {}
+        return self.profiler.stats()
 
     def render(self, graphical=True):
         # renders bomberman environment
 
         # render with graphics
         if graphical:
+            import matplotlib.pyplot as plt
+            if not dict_img:
+                load_images()
+
             flattened_map = np.reshape(self.board,-1)
             # get rows
             map_rows=[]
@@ -393,6 +1024,12 @@ class Game():
         d = {0: '     ', 1:f'{bcolors.MAGENTA}  P1 {bcolors.RESET}', 2:f'{bcolors.BLUE}  P2 {bcolors.RESET}', 3:f'{bcolors.YELLOW}  O  {bcolors.RESET}',
          4:'  X  ', 5:f'{bcolors.RED}  *  {bcolors.RESET}', 6:f'{bcolors.MAGENTA} P1* {bcolors.RESET}', 7:f'{bcolors.BLUE} P2* {bcolors.RESET}',
           8:f'{bcolors.RED}  !  {bcolors.RESET}', 9:f'{bcolors.RED} === {bcolors.RESET}'}
+        # further players cycle through the other colours
+        colours = [bcolors.GREEN, bcolors.CYAN, bcolors.YELLOW]
+        for number in range(3, MAX_PLAYERS + 1):
+            colour = colours[(number - 3) % len(colours)]
+            d[self.BOARD_DICT[f'player{number}']] = f'{colour}{f"P{number}":>4} {bcolors.RESET}'
+            d[self.BOARD_DICT[f'p{number}_on_bomb']] = f'{colour}{f"P{number}*":>4} {bcolors.RESET}'
         #d = {0: '     ', 1:'  P1 ', 2:'  O  ', 3:'  X  ', 4:'  *  ', 5:'  P* ', 6:'  !  ', 7:' === '}
         flat_board = np.reshape(self.board,-1)
         mapped_board=[d[i] for i in flat_board]
@@ -0,0 +1,250 @@
+'''
+VECTORIZED MULTIPLAYER ENVIRONMENT
+
+Steps N boards at once. All boards are stored in a single (N, rows, cols)
+array and every phase of Game.step (movement, bomb placement, timers,
+explosions and clearing) is applied to all boards with array operations.
+'''
+
+import numpy as np
+
+from bm_multi_env import BOARD_DTYPE, Game, actions, generate_maps
+from board_geometry import get_geometry
+
+class VecGame():
+
+    # environment attributes (shared with the single-board environment)
+    MAX_BOMBS = Game.MAX_BOMBS
+    MAX_TIMER = Game.MAX_TIMER
+    BOARD_DICT = Game.BOARD_DICT
+    REWARDS_DICT = Game.REWARDS_DICT
+
+    NUM_PLAYERS = 2
+    PLAYER_CODES = [BOARD_DICT['player1'], BOARD_DICT['player2']]
+    ON_BOMB_CODES = [BOARD_DICT['p1_on_bomb'], BOARD_DICT['p2_on_bomb']]
+
+    def __init__(self, num_envs, rows=11, cols=13, seed=None, auto_reset=True, dtype=BOARD_DTYPE, map_pool=None):
+        self.num_envs = num_envs
+        self.rows = rows
+        self.cols = cols
+        self.auto_reset = auto_reset
+        self.dtype = dtype
+        self.map_pool = map_pool # optional MapPool of pregenerated starting maps
+        self.rng = np.random.default_rng(seed)
+
+        self._build_tables()
+
+        n = num_envs
+        p = self.NUM_PLAYERS
+        self.board = np.zeros((n, rows, cols), dtype=dtype)
+        self.player_tiles = np.zeros((n, p), dtype=int) # flat index of each player
+        self.scores = np.zeros((n, p), dtype=int)
+        self.num_bombs = np.zeros((n, p), dtype=int)
+        self.bomb_tiles = np.zeros((n, p), dtype=int) # flat index of each player's bomb
+        self.bomb_ranges = np.zeros((n, p, 5), dtype=int) # tiles in range of each bomb
+        self.bomb_timers = np.zeros((n, p), dtype=int)
+        self.bomb_active = np.zeros((n, p), dtype=bool)
+        self.bomb_exploded = np.zeros((n, p), dtype=bool)
+        self.done = np.zeros(n, dtype=bool)
+        # board of each environment at the moment it finished (before auto reset)
+        self.terminal_board = np.zeros((n, rows, cols), dtype=dtype)
+
+        self._envs = np.arange(n)
+
+    def _build_tables(self):
+        '''
+        move targets and blast ranges as flat board indices
+        (-1 marks a tile off the board), from the board's geometry
+        '''
+
+        geometry = get_geometry(self.rows, self.cols)
+        # target tile for each action, indexed by [tile, action]
+        self._move = geometry.move_array
+        # tiles hit by a bomb at each tile, in the order used by
+        # Game.get_tiles_in_range: up, down, left, right, bomb position
+        self._range = geometry.blast_array
+        self._starting_tiles = np.array([0, self.rows * self.cols - 1])
+
+    @property
+    def positions(self):
+        '''
+        (N, num_players, 2) array of player (row, col) positions
+        '''
+        return np.stack(np.divmod(self.player_tiles, self.cols), axis=-1)
+
+    def reset(self, mask=None):
+        '''
+        Initializes a starting board for every environment (or only those
+        selected by a boolean mask)
+        '''
+
+        if mask is None:
+            idx = self._envs
+        else:
+            idx = np.flatnonzero(mask)
+        if idx.size == 0:
+            return self.board
+
+        pool = self.map_pool
+        if pool is not None and pool.rows == self.rows and pool.cols == self.cols and pool.num_players == self.NUM_PLAYERS:
+            self.board[idx] = pool.sample(self.rng, idx.size)
+        else:
+            self.board[idx] = generate_maps(self.rows, self.cols, idx.size, self.rng, self.NUM_PLAYERS, self.dtype)
+
+        self.player_tiles[idx] = self._starting_tiles
+        self.scores[idx] = 0
+        self.num_bombs[idx] = self.MAX_BOMBS
+        self.bomb_active[idx] = False
+        self.bomb_exploded[idx] = False
+        self.bomb_timers[idx] = 0
+        self.done[idx] = False
+
+        return self.board
+
+    def step(self, player_actions):
+        '''
+        player_actions: (N, num_players) array of actions
+        returns the boards, which environments finished this step and the
+        scores of every player (final scores for finished environments)
+        '''
+
+        player_actions = np.asarray(player_actions)
+        flat_board = self.board.reshape(self.num_envs, -1)
+
+        # players take their turns in order, as in Game.step
+        for p in range(self.NUM_PLAYERS):
+            self._clear_bombs(flat_board, p)
+            self._move_players(flat_board, p, player_actions[:, p])
+            self._update_bombs(flat_board, p)
+
+        done = self.done.copy()
+        scores = self.scores.copy()
+
+        if done.any():
+            self.terminal_board[done] = self.board[done]
+            if self.auto_reset:
+                self.reset(done)
+
+        return self.board, done, scores
+
+    def _clear_bombs(self, flat_board, p):
+        '''
+        clear map after bombs that exploded on the previous step
+        '''
+
+        idx = np.flatnonzero(self.bomb_exploded[:, p])
+        if idx.size == 0:
+            return
+
+        bomb_tiles = self.bomb_tiles[idx, p]
+        flat_board[idx, bomb_tiles] = self.BOARD_DICT['empty']
+
+        tiles = self.bomb_ranges[idx, p]
+        envs = np.broadcast_to(idx[:, None], tiles.shape)
+        values = flat_board[envs, tiles]
+        keep = (tiles >= 0)
+        for code in self.PLAYER_CODES:
+            keep &= (values != code)
+        flat_board[envs[keep], tiles[keep]] = self.BOARD_DICT['empty']
+
+        self.bomb_active[idx, p] = False
+        self.bomb_exploded[idx, p] = False
+
+    def _move_players(self, flat_board, p, player_actions):
+        '''
+        validate and apply each board's action for player p
+        '''
+
+        prev = self.player_tiles[:, p]
+        new = self._move[prev, player_actions]
+
+        moving = (player_actions >= actions.LEFT) & (player_actions <= actions.DOWN)
+        target = flat_board[self._envs, new]
+        walkable = (new >= 0) & ((target == self.BOARD_DICT['empty']) | (target == self.BOARD_DICT['exploding_tile']))
+        valid = ~moving | walkable
+
+        # invalid move penalty
+        self.scores[~valid, p] += self.REWARDS_DICT['invalid_move']
+
+        # place bombs
+        place = np.flatnonzero((player_actions == actions.BOMB) & (self.num_bombs[:, p] > 0))
+        if place.size:
+            self.bomb_tiles[place, p] = prev[place]
+            self.bomb_ranges[place, p] = self._range[prev[place]]
+            self.bomb_timers[place, p] = self.MAX_TIMER
+            self.bomb_active[place, p] = True
+            self.bomb_exploded[place, p] = False
+            self.num_bombs[place, p] -= 1
+            flat_board[place, prev[place]] = self.ON_BOMB_CODES[p]
+
+        # move
+        move = np.flatnonzero(moving & valid)
+        if move.size:
+            old = prev[move]
+            flat_board[move, new[move]] = self.PLAYER_CODES[p]
+            # leave behind a bomb if the player was standing on one
+            left_bomb = flat_board[move, old] == self.ON_BOMB_CODES[p]
+            flat_board[move, old] = np.where(left_bomb, self.BOARD_DICT['bomb'], self.BOARD_DICT['empty'])
+            self.player_tiles[move, p] = new[move]
+
+    def _update_bombs(self, flat_board, p):
+        '''
+        tick player p's bombs and explode the ones that run out
+        '''
+
+        live = np.flatnonzero(self.bomb_active[:, p] & ~self.bomb_exploded[:, p])
+        if live.size == 0:
+            return
+
+        self.bomb_timers[live, p] -= 1
+        boom = live[self.bomb_timers[live, p] == 0]
+        if boom.size == 0:
+            return
+
+        bomb_tiles = self.bomb_tiles[boom, p]
+        tiles = self.bomb_ranges[boom, p]
+        in_range = tiles >= 0
+        envs = np.broadcast_to(boom[:, None], tiles.shape)
+        values = np.where(in_range, flat_board[envs, tiles], self.BOARD_DICT['empty'])
+
+        # check if any player is in range of the bomb
+        # (like Game.check_if_game_over, every player hit loses and the game ends)
+        is_game_over = np.zeros(boom.size, dtype=bool)
+        for q in range(self.NUM_PLAYERS):
+            is_hit = ((values == self.PLAYER_CODES[q]) | (values == self.ON_BOMB_CODES[q])).any(axis=1)
+            self.scores[boom[is_hit], q] += self.REWARDS_DICT['lose']
+            is_game_over |= is_hit
+
+        self.done[boom[is_game_over]] = True
+
+        # update tiles that have been impacted
+        num_blocks = (values == self.BOARD_DICT['soft_block']).sum(axis=1)
+        flat_board[envs[in_range], tiles[in_range]] = self.BOARD_DICT['exploding_tile']
+        flat_board[boom, bomb_tiles] = self.BOARD_DICT['exploding_bomb']
+
+        self.scores[boom, p] += num_blocks * self.REWARDS_DICT['destroy_blocks']
+        self.num_bombs[boom, p] += 1
+        self.bomb_exploded[boom, p] = True
+
+    def get_game(self, i):
+        '''
+        return a Game holding a copy of environment i (e.g. for rendering)
+        '''
+
+        game = Game(self.rows, self.cols, self.dtype)
+        game.board = self.board[i].copy()
+        game.done = bool(self.done[i])
+        game.init_arrays(self.NUM_PLAYERS)
+        game.player_tiles[:] = self.player_tiles[i]
+        game.player_prev_tiles[:] = self.player_tiles[i]
+        game.player_scores[:] = self.scores[i]
+        game.player_num_bombs[:] = self.num_bombs[i]
+
+        # with one bomb per player, bomb slots line up with players
+        game.bomb_tiles[:] = self.bomb_tiles[i]
+        game.bomb_timers[:] = self.bomb_timers[i]
+        game.bomb_active[:] = self.bomb_active[i]
+        game.bomb_exploded[:] = self.bomb_exploded[i]
+        game.index_bombs()
+
+        return game
@@ -0,0 +1,162 @@
+'''
+BOARD GEOMETRY
+
+Static lookup tables for a board size, shared by the engine and the agents.
+Every board produced by Game.reset has a hard block at each (odd, odd)
+tile, so these never change during a game:
+
+    move[tile][action]        tile reached by an action (-1 if off the board)
+    neighbours[tile]          tiles up, down, left and right that aren't off the
+                              board or hard blocks
+    blast[tile]               tiles hit by a bomb at tile
+    get_blast(radius)[tile]   the same for a longer blast radius
+    distance(a, b)            shortest path between two tiles around the hard blocks
+
+Tiles are flat indices (row * cols + col). Geometries are cached per
+(rows, cols) with LRU eviction; use get_geometry rather than building them.
+'''
+
+from functools import lru_cache
+import numpy as np
+
+# same layout as Game.ACTIONS_DICT
+ACTIONS_DICT = {0:(0,0),5:(0,0),1:(0,-1),2:(0,1),3:(-1,0),4:(1,0)}
+NUM_ACTIONS = 6
+
+GEOMETRY_CACHE_SIZE = 32 # board sizes kept in memory
+ALL_PAIRS_MAX_TILES = 4096 # largest board with a precomputed distance matrix
+
+class BoardGeometry():
+
+    def __init__(self, rows, cols):
+        self.rows = rows
+        self.cols = cols
+        num_tiles = rows * cols
+
+        tile_rows, tile_cols = np.divmod(np.arange(num_tiles), cols)
+        self.is_hard = (tile_rows % 2 == 1) & (tile_cols % 2 == 1)
+        is_hard = self.is_hard.tolist()
+
+        def offset(row, col, d_row, d_col):
+            new_row, new_col = row + d_row, col + d_col
+            if new_row < 0 or new_col < 0 or new_row >= rows or new_col >= cols:
+                return -1
+            return new_row * cols + new_col
+
+        self.move = []
+        self.neighbours = []
+        self.blast = []
+        for tile in range(num_tiles):
+            row, col = divmod(tile, cols)
+            self.move.append([offset(row, col, *ACTIONS_DICT[action]) for action in range(NUM_ACTIONS)])
+            # up, down, left, right: the order bombs and agents have always used
+            around = [offset(row, col, -1, 0), offset(row, col, 1, 0), offset(row, col, 0, -1), offset(row, col, 0, 1)]
+            self.neighbours.append([tile for tile in around if tile >= 0 and not is_hard[tile]])
+            self.blast.append([tile for tile in around + [tile] if tile >= 0 and not is_hard[tile]])
+
+        # the same tables as arrays, padded with -1
+        self.move_array = np.array(self.move, dtype=np.int64).reshape(num_tiles, NUM_ACTIONS)
+        self.neighbour_array = np.full((num_tiles, 4), -1, dtype=np.int64)
+        self.blast_array = np.full((num_tiles, 5), -1, dtype=np.int64)
+        for tile in range(num_tiles):
+            self.neighbour_array[tile, :len(self.neighbours[tile])] = self.neighbours[tile]
+            self.blast_array[tile, :len(self.blast[tile])] = self.blast[tile]
+
+        # (row, col) versions, for agents that work with positions
+        self.neighbour_positions = [[divmod(tile, cols) for tile in tiles] for tiles in self.neighbours]
+
+        self._tile_rows = tile_rows
+        self._tile_cols = tile_cols
+        self._distances = None
+        self._blasts = {1: self.blast}
+
+    def tile(self, position):
+        return position[0] * self.cols + position[1]
+
+    def position(self, tile):
+        return divmod(tile, self.cols)
+
+    def get_blast(self, radius=1):
+        '''
+        tiles hit by a bomb at each tile with a blast radius: rays of up to `radius`
+        tiles up, down, left and right, each stopped by a hard block or the edge of
+        the board, then the bomb's own tile (radius 1 gives self.blast)
+        '''
+
+        if radius not in self._blasts:
+            rows, cols = self.rows, self.cols
+            is_hard = self.is_hard.tolist()
+            blast = []
+            for tile in range(rows * cols):
+                row, col = divmod(tile, cols)
+                tiles = []
+                for d_row, d_col in ((-1, 0), (1, 0), (0, -1), (0, 1)):
+                    for distance in range(1, radius + 1):
+                        new_row, new_col = row + d_row * distance, col + d_col * distance
+                        if new_row < 0 or new_col < 0 or new_row >= rows or new_col >= cols:
+                            break
+                        new_tile = new_row * cols + new_col
+                        if is_hard[new_tile]:
+                            break
+                        tiles.append(new_tile)
+                if not is_hard[tile]:
+                    tiles.append(tile)
+                blast.append(tiles)
+            self._blasts[radius] = blast
+        return self._blasts[radius]
+
+    def in_blast_range(self, bomb_tile, tile):
+        return tile in self.blast[bomb_tile]
+
+    def distance(self, a, b):
+        '''
+        length of the shortest path between two tiles, moving around the hard blocks
+        (soft blocks and bombs are ignored). -1 if either tile is a hard block.
+        Two tiles in the same odd row (or column) have a hard block between them,
+        so the path steps out of the row and back: 2 more than the Manhattan distance.
+        '''
+
+        if self.is_hard[a] or self.is_hard[b]:
+            return -1
+        row_a, col_a = divmod(a, self.cols)
+        row_b, col_b = divmod(b, self.cols)
+        d = abs(row_a - row_b) + abs(col_a - col_b)
+        if (row_a == row_b and row_a % 2 == 1 and col_a != col_b) or (col_a == col_b and col_a % 2 == 1 and row_a != row_b):
+            d += 2
+        return d
+
+    def distances_from(self, tiles):
+        '''
+        distances from each of `tiles` (a tile or an array of tiles) to every tile on the board
+        '''
+
+        tiles = np.asarray(tiles)
+        row, col = np.divmod(tiles, self.cols)
+        row = row[..., None]
+        col = col[..., None]
+        tile_rows, tile_cols = self._tile_rows, self._tile_cols
+
+        d = np.abs(row - tile_rows) + np.abs(col - tile_cols)
+        same_odd_row = (row == tile_rows) & (row % 2 == 1) & (col != tile_cols)
+        same_odd_col = (col == tile_cols) & (col % 2 == 1) & (row != tile_rows)
+        d = d + 2 * (same_odd_row | same_odd_col)
+        d = np.where(self.is_hard | self.is_hard[tiles][..., None], -1, d)
+        return d
+
+    @property
+    def distances(self):
+        '''
+        all-pairs (tiles, tiles) distance matrix, built on first use
+        (only for boards of up to ALL_PAIRS_MAX_TILES tiles, use distances_from on larger ones)
+        '''
+
+        if self._distances is None:
+            num_tiles = self.rows * self.cols
+            if num_tiles > ALL_PAIRS_MAX_TILES:
+                raise ValueError(f'{self.rows}x{self.cols} board is too large for an all-pairs distance matrix')
+            self._distances = self.distances_from(np.arange(num_tiles)).astype(np.int16)
+        return self._distances
+
+@lru_cache(maxsize=GEOMETRY_CACHE_SIZE)
+def get_geometry(rows, cols):
+    return BoardGeometry(rows, cols)
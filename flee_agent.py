@@ -2,69 +2,53 @@
 This agent places a bomb and runs away
 '''
 
-def agent(state, done, bombs, turn, player):
+import random
 
-	import random
+from agent_api import Agent, agent_function
+from bm_multi_env import Game
+from board_geometry import get_geometry
+import pathfinding
 
-	########################
-	###    VARIABLES     ###
-	########################
+class FleeAgent(Agent):
+
+	name = "flee bot"
+
+	def setup(self, rows, cols, player_number):
+		super().setup(rows, cols, player_number)
+
+		########################
+		###    VARIABLES     ###
+		########################
 
-    # store some useful information about our environment
-	rows = state.shape[0]
-	cols = state.shape[1]
+		# neighbour tables for this board size
+		self.geometry = get_geometry(rows, cols)
 
-	# a useful dictionary for our actions
-	actions = ['none','left','right','up','down','bomb']
-	action_id = [0,1,2,3,4,5]
-	d_actions = dict(zip(actions,action_id))
+		# a useful dictionary for our actions
+		self.actions = ['none','left','right','up','down','bomb']
+		action_id = [0,1,2,3,4,5]
+		self.d_actions = dict(zip(self.actions,action_id))
 
-	# we need to keep track of different values of the 
-	# environment state based on which agent we are
-	if player.number == 0:
-		player_id = 1
-		player_on_bomb_id = 6
-	else:
-		player_id = 2
-		player_on_bomb_id = 7
+		# we need to keep track of different values of the 
+		# environment state based on which agent we are
+		self.player_id = Game.BOARD_DICT[Game.PLAYER_LIST[player_number]]
+		self.player_on_bomb_id = Game.BOARD_DICT[Game.ON_BOMB_LIST[player_number]]
+
+		# distance field to the nearest safe tile, kept across turns
+		self.safe_field = pathfinding.DistanceField(rows, cols, pathfinding.safe_tiles)
 
 	########################
 	###     HELPERS      ###
 	########################
 
-	def get_surrounding_tiles(state, position):
+	def get_surrounding_tiles(self, position):
 		'''
 		return a position's surrounding 4 tiles
+		(excluding ones that cross the borders of the map, and hard blocks)
 		'''
 
-		# find all the surrounding tiles
-		tile_up = (position[0]-1,position[1])
-		tile_down = (position[0]+1,position[1])
-		tile_left = (position[0],position[1]-1)
-		tile_right = (position[0],position[1]+1)
-
-		# combine these into a list
-		surrounding_tiles = [tile_up, tile_down, tile_left, tile_right]
-
-		# used to store tiles we can't move to
-		# (ones that cross the borders of the map, and holes)
-		tiles_to_remove = [] 
-
-		# loop through surrounding tiles
-		for tile in surrounding_tiles:
-			if (tile[0] < 0 or tile[1] < 0 or tile[0] >= rows or tile[1] >= cols or 
-				state[tile] == 4):
-				# add illegal tiles to our list
-				tiles_to_remove.append(tile)
-
-		# loop through the tiles we're going to exclude
-		# and remove them from our original list of tiles
-		for tile in tiles_to_remove:
-			surrounding_tiles.remove(tile)
-
-		return surrounding_tiles
+		return list(self.geometry.neighbour_positions[self.geometry.tile(position)])
 
-	def get_empty_tiles(list_of_tiles):
+	def get_empty_tiles(self, state, list_of_tiles):
 		'''
 		from a list of tiles, return the ones where we can move to
 		'''
@@ -78,7 +62,7 @@ def agent(state, done, bombs, turn, player):
 
 		return empty_tiles
 
-	def get_safe_tiles(list_of_tiles, bomb_pos):
+	def get_safe_tiles(self, list_of_tiles, bomb_pos, danger):
 		'''
 		from a list of tiles, return ones which are guaranteed safe to move to
 		'''
@@ -88,6 +72,11 @@ def agent(state, done, bombs, turn, player):
 
 		# loop the tiles
 		for tile in list_of_tiles:
+			if danger is not None:
+				# the environment's danger map covers every live bomb
+				if danger[tile] == 0:
+					safe_tiles.append(tile)
+				continue
 			diff = tuple(x-y for x, y in zip(tile, bomb_pos))
 			if diff in [(0,1),(1,0),(0,-1),(-1,0),(0,0)]:
 				# this tile is adjacent to a bomb
@@ -98,11 +87,25 @@ def agent(state, done, bombs, turn, player):
 
 		return safe_tiles
 
-	def move_to_tile(position, tile):
+	def get_escape_action(self, state, danger, position):
+		'''
+		first move along the shortest route to a tile no bomb will hit
+		(none if we're already safe, there's no route, or no danger map)
+		'''
+
+		if danger is None:
+			return self.d_actions['none']
+
+		self.safe_field.update(state, danger)
+		return self.safe_field.next_action(position)
+
+	def move_to_tile(self, position, tile):
 		'''
 		given an adjacent tile location, move your agent to that tile
 		'''
 
+		d_actions = self.d_actions
+
 		# see where the tile is relative to our current location
 		diff = tuple(x-y for x, y in zip(position, tile))
 
@@ -122,63 +125,77 @@ def agent(state, done, bombs, turn, player):
 	###      AGENT       ###
 	########################
 
-	if player.bombs:
-		# this means we've got a bomb on the map
-		# so let's run away
-
-		# get the bomb's position
-		# note that the bombs are stored in a list owned by the player/agent
-		bomb_pos = player.bombs[0].position
-
-		# get a list of our surrounding tiles
-		surrounding_tiles = get_surrounding_tiles(state, player.position)
-
-		# get a list of the available tiles we can actually move to
-		empty_tiles = get_empty_tiles(surrounding_tiles)
-
-		# get a list of the safe tiles we should move to
-		safe_tiles = get_safe_tiles(empty_tiles, bomb_pos)
-
-		# check if we're on a bomb
-		if state[player.position] == player_on_bomb_id:
-			# we're on a bomb
-			# let's move to an empty slot
-			if empty_tiles:
-				random_tile = random.choice(empty_tiles)
-				action = move_to_tile(player.position, random_tile)
-				#print(random_tile)
-				#print(action)
-				#input()
+	def act(self, observation):
+		state = observation.state
+		player = observation.player
+		danger = observation.danger
+		actions = self.actions
+		d_actions = self.d_actions
+
+		if player.bombs:
+			# this means we've got a bomb on the map
+			# so let's run away
+
+			# get the bomb's position
+			# note that the bombs are stored in a list owned by the player/agent
+			bomb_pos = player.bombs[0].position
+
+			# get a list of our surrounding tiles
+			surrounding_tiles = self.get_surrounding_tiles(player.position)
+
+			# get a list of the available tiles we can actually move to
+			empty_tiles = self.get_empty_tiles(state, surrounding_tiles)
+
+			# get a list of the safe tiles we should move to
+			safe_tiles = self.get_safe_tiles(empty_tiles, bomb_pos, danger)
+
+			# the way out of danger, if we know where the blasts will land
+			escape_action = self.get_escape_action(state, danger, player.position)
+
+			# check if we're on a bomb
+			if state[player.position] == self.player_on_bomb_id:
+				# we're on a bomb
+				# let's move to an empty slot
+				if escape_action != d_actions['none']:
+					action = escape_action
+				elif empty_tiles:
+					random_tile = random.choice(empty_tiles)
+					action = self.move_to_tile(player.position, random_tile)
+				else:
+					# there aren't any empty tiles to go to
+					# we're probably done for.
+					action = d_actions['none']
 			else:
-				# there aren't any empty tiles to go to
-				# we're probably done for.
-				action = d_actions['none']
-		else:
-			# we're not on a bomb
-			# check if we're next to a bomb
-			for tile in surrounding_tiles:
-				if (tile[0] == bomb_pos[0]) and (tile[1] == bomb_pos[1]):
-					# we're next to a bomb
-					# move to a random safe tile (if there are any)
-					if safe_tiles:
-						random_tile = random.choice(safe_tiles)
-						action = move_to_tile(player.position, random_tile)
-						break
-					else:
-						# there isn't a guaranteed safe tile near us
-						# choose a move at random
-						action = d_actions[random.choice(actions)]
-						break
-			else:
-				# there isn't a bomb nearby
-				# we're probably safe so lets stay here
-				action = d_actions['none']
+				# we're not on a bomb
+				# check if we're next to a bomb
+				for tile in surrounding_tiles:
+					if (tile[0] == bomb_pos[0]) and (tile[1] == bomb_pos[1]):
+						# we're next to a bomb
+						# move to a random safe tile (if there are any)
+						if escape_action != d_actions['none']:
+							action = escape_action
+							break
+						elif safe_tiles:
+							random_tile = random.choice(safe_tiles)
+							action = self.move_to_tile(player.position, random_tile)
+							break
+						else:
+							# there isn't a guaranteed safe tile near us
+							# choose a move at random
+							action = d_actions[random.choice(actions)]
+							break
+				else:
+					# there isn't a bomb nearby
+					# we're probably safe so lets stay here
+					action = d_actions['none']
 
-	else:
-		# no bombs in play, take a random action
-		action = d_actions[random.choice(actions)]
+		else:
+			# no bombs in play, take a random action
+			action = d_actions[random.choice(actions)]
 
-	name = "flee bot"
-	return action, name
+		return action
 
+AGENT_CLASS = FleeAgent
 
+# the original agent(state, done, bombs, turn, player) interface
+agent = agent_function(FleeAgent)
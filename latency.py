@@ -0,0 +1,185 @@
+'''
+AGENT LATENCY
+
+Measures how long agents take to decide, and enforces a per-turn deadline.
+
+TimedAgent wraps any Agent: every act is timed into a LatencyStats. With a
+deadline, act runs on a daemon thread and the runner waits at most that long.
+An agent that runs out of time plays actions.NONE that turn. If its
+late call is still running at the next turn, it also plays NONE, so a hung
+agent is never entered twice and can't stall the match. The thread acts on a
+copy of the turn's game, since the runner changes the real one next step.
+
+LatencyStats keeps every turn's latency, so stats from many games and
+processes can be merged, and summarizes them as percentiles, a log-spaced
+histogram and the slowest turn (with the board it was played on).
+'''
+
+import json
+import threading
+import time
+import numpy as np
+
+from agent_api import Agent
+from bm_multi_env import Game, actions
+
+# histogram bucket edges in seconds: 1us to 100s, 4 buckets per decade
+HISTOGRAM_EDGES = 10.0 ** np.arange(-6, 2.01, 0.25)
+
+class LatencyStats():
+
+    def __init__(self, name):
+        self.name = name
+        self.latencies = [] # seconds per turn
+        self.missed_deadlines = 0
+        self.slowest = None # latency, turn and board of the slowest turn
+
+    def record(self, latency, turn, state, missed_deadline=False):
+        self.latencies.append(latency)
+        if missed_deadline:
+            self.missed_deadlines += 1
+        if self.slowest is None or latency > self.slowest['latency']:
+            self.slowest = {'latency': latency, 'turn': turn, 'board': np.asarray(state).tolist()}
+
+    def merge(self, other):
+        self.latencies.extend(other.latencies)
+        self.missed_deadlines += other.missed_deadlines
+        if other.slowest is not None and (self.slowest is None or other.slowest['latency'] > self.slowest['latency']):
+            self.slowest = other.slowest
+        return self
+
+    def summary(self):
+        '''
+        JSON-ready summary (latencies in milliseconds)
+        '''
+
+        latencies = np.array(self.latencies)
+        if latencies.size == 0:
+            return {'name': self.name, 'turns': 0, 'missed_deadlines': self.missed_deadlines}
+
+        p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) * 1000
+        counts, _ = np.histogram(np.clip(latencies, HISTOGRAM_EDGES[0], HISTOGRAM_EDGES[-1]), bins=HISTOGRAM_EDGES)
+        return {
+            'name': self.name,
+            'turns': int(latencies.size),
+            'missed_deadlines': self.missed_deadlines,
+            'mean_ms': float(latencies.mean() * 1000),
+            'p50_ms': float(p50),
+            'p95_ms': float(p95),
+            'p99_ms': float(p99),
+            'max_ms': float(latencies.max() * 1000),
+            'histogram': {'edges_ms': (HISTOGRAM_EDGES * 1000).tolist(), 'counts': counts.tolist()},
+            'slowest_turn': self.slowest,
+        }
+
+def print_latency(summaries):
+    '''
+    print a table of LatencyStats summaries
+    '''
+
+    print(f"\n {'agent':<20}{'turns':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}{'missed':>10}")
+    print(" " + "-"*78)
+    for summary in summaries:
+        if not summary['turns']:
+            continue
+        print(f" {summary['name']:<20}{summary['turns']:>8}{summary['p50_ms']:>10.3f}{summary['p95_ms']:>10.3f}"
+              f"{summary['p99_ms']:>10.3f}{summary['max_ms']:>10.3f}{summary['missed_deadlines']:>10}")
+
+def save_latency(stats, path):
+    with open(path, 'w') as f:
+        json.dump([s.summary() for s in stats], f, indent=2)
+
+class TimedAgent(Agent):
+
+    def __init__(self, agent, deadline=None, stats=None):
+        '''
+        agent: the Agent to time
+        deadline: seconds allowed per turn (None: no limit, act runs on the calling thread)
+        stats: LatencyStats to record into (a new one by default)
+        '''
+
+        self.agent = agent
+        self.deadline = deadline
+        self.stats = stats if stats is not None else LatencyStats(agent.name)
+        self._thread = None
+        self._game = None # the deadline thread's copy of the game
+        self._game_key = None
+
+    def __getattr__(self, name):
+        # anything else the agent offers (e.g. lookahead_agent's cache_stats)
+        if name == 'agent':
+            raise AttributeError(name)
+        return getattr(self.agent, name)
+
+    @property
+    def name(self):
+        return self.agent.name
+
+    def setup(self, rows, cols, player_number):
+        self.agent.setup(rows, cols, player_number)
+
+    def close(self):
+        self.agent.close()
+
+    def act(self, observation):
+        start = time.perf_counter()
+        if self.deadline is None:
+            action = self.agent.act(observation)
+            timed_out = False
+        else:
+            action, timed_out = self.act_with_deadline(observation)
+        self.stats.record(time.perf_counter() - start, observation.turn, observation.state, timed_out)
+        return action
+
+    def act_with_deadline(self, observation):
+        '''
+        (action, timed out) for a turn, waiting at most self.deadline for the agent
+        '''
+
+        if hasattr(self.agent, 'act_with_deadline'):
+            # the agent enforces the deadline itself (e.g. agent_worker.AgentProcess)
+            return self.agent.act_with_deadline(observation, self.deadline)
+
+        if self._thread is not None and self._thread.is_alive():
+            # still busy with a turn that ran out of time
+            return actions.NONE, True
+
+        # the environment changes the game in place, so a late agent gets its own copy
+        observation = self.copy_observation(observation)
+        result = []
+        error = []
+        def run():
+            try:
+                result.append(self.agent.act(observation))
+            except Exception as e:
+                error.append(e)
+
+        self._thread = threading.Thread(target=run, daemon=True)
+        self._thread.start()
+        self._thread.join(self.deadline)
+
+        if error:
+            raise error[0]
+        if result:
+            return result[0], False
+        return actions.NONE, True
+
+    def copy_observation(self, observation):
+        '''
+        the observation with its board, danger map, bombs and player read from a
+        copy of the game (reused between turns, once the last thread has finished)
+        '''
+
+        game = observation.player.game
+        rules = game.get_rules()
+        key = (game.rows, game.cols, np.dtype(game.dtype).str, tuple(rules.values()))
+        if key != self._game_key:
+            self._game = Game(game.rows, game.cols, game.dtype, **rules)
+            self._game_key = key
+        self._game.restore(game.snapshot())
+
+        return observation._replace(
+            state=observation.state.copy(),
+            bombs=[self._game.bomb_views[bomb.index] for bomb in observation.bombs],
+            player=self._game.players[observation.player.number],
+            danger=observation.danger.copy() if observation.danger is not None else None)
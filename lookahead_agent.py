@@ -1,61 +1,209 @@
-def agent(state, done, bombs, turn, player):
+import random
+from collections import OrderedDict
+import numpy as np
+
+from agent_api import Agent, agent_function
+from bm_multi_env import Game
+from board_geometry import get_geometry
+from pattern_matcher import PatternMatcher
+
+BOARD_DICT = {'empty':0,'player1':1, 'player2':2,'soft_block':3,'hard_block':4,'bomb':5,'p1_on_bomb':6, 'p2_on_bomb':7, 'exploding_bomb':8, 'exploding_tile':9}
+ON_BOMB_IDS = [Game.BOARD_DICT[name] for name in Game.ON_BOMB_LIST] # a player standing on a bomb, by player
+
+def get_configs(player_id, player_on_bomb_id):
+	# define configurations
+	# GOOD CONFIGS
+	g_config_1 = [BOARD_DICT['soft_block'], player_on_bomb_id, BOARD_DICT['empty'], BOARD_DICT['empty']]			# |  O  | P1* |     |     |
+	g_config_2 = [BOARD_DICT['soft_block'], BOARD_DICT['soft_block'], player_on_bomb_id, BOARD_DICT['empty']]		# |  O  |  O  | P1* |     |
+	g_config_3 = [BOARD_DICT['soft_block'], BOARD_DICT['soft_block'], BOARD_DICT['soft_block'], player_on_bomb_id]	# |  O  |  O  |  O  | P1* |
+	g_config_4 = [BOARD_DICT['soft_block'], player_on_bomb_id, BOARD_DICT['empty'], BOARD_DICT['soft_block']]		# |  O  | P1* |     |  O  |
+	g_config_5 = [BOARD_DICT['soft_block'], player_on_bomb_id, BOARD_DICT['soft_block'], BOARD_DICT['soft_block']]	# |  O  | P1* |  O  |  O  |
+	g_config_6 = [BOARD_DICT['soft_block'], player_on_bomb_id, BOARD_DICT['soft_block'], BOARD_DICT['empty']]		# |  O  | P1* |  O  |     |
+	g_config_7 = [BOARD_DICT['soft_block'], BOARD_DICT['bomb'], player_id, BOARD_DICT['empty']]						# |  O  |  *  | P1  |     |		
+	g_config_8 = [BOARD_DICT['soft_block'], BOARD_DICT['bomb'], BOARD_DICT['empty'], player_id]						# |  O  |  *  |     | P1  |
+	g_config_9 = [BOARD_DICT['soft_block'], BOARD_DICT['soft_block'], BOARD_DICT['bomb'], player_id]				# |  O  |  O  |  *  | P1  |		
+	g_config_10 = [BOARD_DICT['soft_block'], BOARD_DICT['exploding_bomb'], BOARD_DICT['empty'], player_id]			# |  O  |  !  |     | P1  |		
+	g_config_11 = [BOARD_DICT['exploding_bomb'], BOARD_DICT['empty'], BOARD_DICT['empty'], player_id]				# |  !  |     |     | P1  |		
+	g_config_12 = [BOARD_DICT['empty'], player_id, BOARD_DICT['bomb'], BOARD_DICT['empty']]							# |     | P1  |  *  |     |		
+	g_config_13 = [player_id, BOARD_DICT['empty'], BOARD_DICT['bomb'], BOARD_DICT['empty']]							# | P1  |     |  *  |     |		
+	g_config_14 = [player_id, BOARD_DICT['empty'], BOARD_DICT['empty'], BOARD_DICT['bomb']]							# | P1  |     |     |  *  |		
+	g_config_15 = [BOARD_DICT['empty'], player_id, BOARD_DICT['empty'], BOARD_DICT['bomb']]							# |     | P1  |     |  *  |		
+	g_config_16 = [BOARD_DICT['empty'], BOARD_DICT['empty'], player_id, BOARD_DICT['bomb']]							# |     |     | P1  |  *  |		
+
+	# BAD CONFIGS
+	b_config_1 = [BOARD_DICT['empty'], BOARD_DICT['bomb'], player_id, BOARD_DICT['soft_block']]						# |     |  *  | P1  |  O  |
+	b_config_2 = [BOARD_DICT['bomb'], player_id, BOARD_DICT['soft_block'], BOARD_DICT['soft_block']]				# |  *  |  P1 |  O  |  O  |
+	b_config_3 = [BOARD_DICT['soft_block'], BOARD_DICT['bomb'], player_id, BOARD_DICT['soft_block']]				# |  O  |  *  | P1  |  O  |
+	b_config_4 = [player_id, BOARD_DICT['exploding_bomb'], BOARD_DICT['empty'], BOARD_DICT['empty']]				# | P1  |  !  |     |     |
+	b_config_5 = [player_id, BOARD_DICT['exploding_bomb'], BOARD_DICT['empty'], BOARD_DICT['soft_block']]			# | P1  |  !  |     |  O  |
+	b_config_6 = [player_id, BOARD_DICT['exploding_bomb'], BOARD_DICT['soft_block'], BOARD_DICT['soft_block']]		# | P1  |  !  |  O  |  O  |
+	b_config_7 = [player_id, BOARD_DICT['exploding_bomb'], BOARD_DICT['soft_block'], BOARD_DICT['empty']]			# | P1  |  !  |  O  |     |
+	b_config_8 = [BOARD_DICT['exploding_bomb'], player_id, BOARD_DICT['empty'], BOARD_DICT['empty']]				# |  !  | P1  |     |     |
+	b_config_9 = [BOARD_DICT['exploding_bomb'], player_id, BOARD_DICT['empty'], BOARD_DICT['soft_block']]			# |  !  | P1  |     |  O  |
+	b_config_10 = [BOARD_DICT['exploding_bomb'], player_id, BOARD_DICT['soft_block'], BOARD_DICT['soft_block']]		# |  !  | P1  |  O  |  O  |
+	b_config_11 = [BOARD_DICT['exploding_bomb'], player_id, BOARD_DICT['soft_block'], BOARD_DICT['empty']]			# |  !  | P1  |  O  |     |
+	b_config_12 = [BOARD_DICT['empty'], BOARD_DICT['exploding_bomb'], player_id, BOARD_DICT['empty']]				# |     |  !  | P1  |     |
+	b_config_13 = [BOARD_DICT['empty'], BOARD_DICT['exploding_bomb'], player_id, BOARD_DICT['soft_block']]			# |     |  !  | P1  |  O  |
+	b_config_14 = [BOARD_DICT['soft_block'], BOARD_DICT['exploding_bomb'], player_id, BOARD_DICT['empty']]			# |  O  |  !  | P1  |     |
+	b_config_15 = [BOARD_DICT['soft_block'], BOARD_DICT['exploding_bomb'], player_id, BOARD_DICT['soft_block']]		# |  O  |  !  | P1  |  O  |
+	b_config_16 = [BOARD_DICT['bomb'], player_id, BOARD_DICT['soft_block'], BOARD_DICT['soft_block']]				# |  *  |  P1 |  O  |     |
+
+	# list of configs
+	list_configs = [g_config_1, g_config_2, g_config_3, g_config_4, g_config_5, g_config_6, g_config_7, g_config_8, g_config_9, g_config_10, g_config_11, 
+	g_config_12, g_config_13, g_config_14,g_config_15, g_config_16,
+	b_config_1, b_config_2, b_config_3, b_config_4, b_config_5, b_config_6, b_config_7, b_config_8, b_config_9, b_config_10, b_config_11, b_config_12, b_config_13, b_config_14, b_config_15, b_config_16]
+	
+	# Map points to configs
+	rewards = [10, 10, 10, 10, 10, 10, 100, 1000, 100, 1000, 1000, 
+	50, 500, 500, 500, 50,
+	-10000, -10000, -10000, -100000, -100000, -100000, -100000, -100000, -100000, -100000, -100000, -100000, -100000, -100000, -100000, -10000]
+
+	return list_configs, rewards
+
+# pattern matchers for each player's heuristic, built once and reused every turn
+matchers = {}
+
+def get_matcher(player_id, player_on_bomb_id):
+	if player_id not in matchers:
+		list_configs, rewards = get_configs(player_id, player_on_bomb_id)
+		matchers[player_id] = PatternMatcher(list_configs, rewards, window=4)
+	return matchers[player_id]
+
+HEURISTIC_CACHE_SIZE = 100000 # boards kept, the least recently used are dropped first
+
+class HeuristicCache():
+	'''
+	bounded LRU cache of heuristic scores, keyed by the player id and a hash of
+	the board's bytes. Opponents often stand still and little changes between
+	turns, so the same next states come up turn after turn.
+	'''
+
+	def __init__(self, max_size=HEURISTIC_CACHE_SIZE):
+		self.max_size = max_size
+		self.scores = OrderedDict()
+		self.hits = 0
+		self.misses = 0
+
+	def score_batch(self, matcher, player_id, states):
+		'''
+		scores of a list of boards, scoring those not in the cache in one batch
+		returns (scores, number of boards that weren't in the cache)
+		'''
+
+		scores = self.scores
+		keys = [(player_id, state.shape, hash(state.tobytes())) for state in states]
+		results = [scores.get(key) for key in keys]
+		missing = [i for i, score in enumerate(results) if score is None]
+		for i, key in enumerate(keys):
+			if results[i] is not None:
+				scores.move_to_end(key)
+
+		if missing:
+			new_scores = matcher.score_batch(np.stack([states[i] for i in missing])).tolist()
+			for i, score in zip(missing, new_scores):
+				results[i] = score
+				scores[keys[i]] = score
+			while len(scores) > self.max_size:
+				scores.popitem(last=False)
+
+		self.hits += len(states) - len(missing)
+		self.misses += len(missing)
+		return results, len(missing)
+
+	def stats(self):
+		lookups = self.hits + self.misses
+		return {'hits': self.hits, 'misses': self.misses, 'hit_rate': self.hits / lookups if lookups else 0.0,
+			'size': len(self.scores), 'max_size': self.max_size}
+
+	def clear(self):
+		self.scores.clear()
+		self.hits = 0
+		self.misses = 0
+
+# shared by every LookaheadAgent in this process, across turns and games
+heuristic_cache = HeuristicCache()
+
+def cache_stats():
+	'''
+	hits, misses, hit rate and size of this process's heuristic cache
+	'''
+	return heuristic_cache.stats()
+
+class LookaheadAgent(Agent):
+	'''
+	scores the board after each of our valid moves with the pattern heuristic
+	and picks one of the best
+	'''
+
+	name = "onestep bot"
 
-	BOARD_DICT = {'empty':0,'player1':1, 'player2':2,'soft_block':3,'hard_block':4,'bomb':5,'p1_on_bomb':6, 'p2_on_bomb':7, 'exploding_bomb':8, 'exploding_tile':9}
 	ACTIONS_DICT = {0:(0,0),5:(0,0),1:(0,-1),2:(0,1),3:(-1,0),4:(1,0)}
-	# dictionary for actions
-	actions = ['none','left','right','up','down','bomb']
-	action_id = [0,1,2,3,4,5]
-	d_actions = dict(zip(actions,action_id))
+
+	def __init__(self):
+		# heuristic cache lookups by this agent, over every game it plays
+		self.cache_hits = 0
+		self.cache_misses = 0
+
+	def setup(self, rows, cols, player_number):
+		super().setup(rows, cols, player_number)
+
+		# dictionary for actions
+		actions = ['none','left','right','up','down','bomb']
+		action_id = [0,1,2,3,4,5]
+		self.d_actions = dict(zip(actions,action_id))
+
+		# get player reference id's for the map (1 and 6, 2 and 7, then two more codes per player)
+		self.player_id = Game.BOARD_DICT[Game.PLAYER_LIST[player_number]]
+		self.player_on_bomb_id = Game.BOARD_DICT[Game.ON_BOMB_LIST[player_number]]
+
+		# neighbour tables for this board size
+		self.geometry = get_geometry(rows, cols)
+
+		# compiled heuristic for our player
+		self.matcher = get_matcher(self.player_id, self.player_on_bomb_id)
 
 	############################
 	##### HELPER FUNCTIONS #####
 	############################
 
-	import random
-	import os
-	from time import sleep
-	import numpy as np
-
-	# get player reference id's for the map
-	if player.number == 0:
-		player_id = 1
-		player_on_bomb_id = 6
-	else:
-		player_id = 2
-		player_on_bomb_id = 7
-
-	# get shape of the map
-	rows = state.shape[0]
-	cols = state.shape[1]
-	inarow = 4 # number of tiles in a window
-
-	# get bomb_timer
-	if player.bombs:
-		for bomb in player.bombs:
-			bomb_timer=bomb.timer
-	else:
-		bomb_timer=5
-
 	# calculates score if agent makes selected move
-	def score_move(state, action, curr_pos, bomb_timer):
-		next_state = make_move(state, action, curr_pos, bomb_timer)
-		score = get_heuristic(next_state)
+	def score_move(self, state, action, curr_pos, bomb_pos, bomb_timer):
+		next_state = self.make_move(state, action, curr_pos, bomb_pos, bomb_timer)
+		score = self.get_heuristic(next_state)
 		return score
 
+	# calculates scores for a list of moves, scoring all new next states in one batch
+	def score_moves(self, state, actions, curr_pos, bomb_pos, bomb_timer):
+		next_states = [self.make_move(state, action, curr_pos, bomb_pos, bomb_timer) for action in actions]
+		return self.score_states(next_states)
+
+	# heuristic scores of a list of boards, from the cache for boards seen before
+	def score_states(self, states):
+		scores, misses = heuristic_cache.score_batch(self.matcher, self.player_id, states)
+		self.cache_hits += len(states) - misses
+		self.cache_misses += misses
+		return scores
+
+	# this agent's heuristic cache lookups
+	def cache_stats(self):
+		lookups = self.cache_hits + self.cache_misses
+		return {'hits': self.cache_hits, 'misses': self.cache_misses, 'hit_rate': self.cache_hits / lookups if lookups else 0.0}
+
 	# gets the state of the next map if agent makes selected move
 	# agent doesn't know the bomb timer
-	def make_move(state, action, curr_pos,bomb_timer):
+	def make_move(self, state, action, curr_pos, bomb_pos, bomb_timer):
+		d_actions = self.d_actions
 		next_state = state.copy()
-		new_pos = [sum(x) for x in zip(ACTIONS_DICT[action],curr_pos)]
+		new_pos = [sum(x) for x in zip(self.ACTIONS_DICT[action],curr_pos)]
 
 		if action == d_actions['bomb']:
-			next_state[tuple(new_pos)] = player_on_bomb_id
+			next_state[tuple(new_pos)] = self.player_on_bomb_id
 		elif action == d_actions['none']:
 			pass
 		else:
-			next_state[tuple(new_pos)] = player_id
+			next_state[tuple(new_pos)] = self.player_id
 
-			if not next_state[curr_pos] == player_on_bomb_id:
+			if not next_state[curr_pos] == self.player_on_bomb_id:
 				# clear previous position only if it wasn't a just-placed bomb
 				next_state[curr_pos] = BOARD_DICT['empty']
 			else:
@@ -67,163 +215,72 @@ def agent(state, done, bombs, turn, player):
 
 		return next_state
 
-	def get_heuristic(state):
-		# define configurations
-		# GOOD CONFIGS
-		g_config_1 = [BOARD_DICT['soft_block'], player_on_bomb_id, BOARD_DICT['empty'], BOARD_DICT['empty']]			# |  O  | P1* |     |     |
-		g_config_2 = [BOARD_DICT['soft_block'], BOARD_DICT['soft_block'], player_on_bomb_id, BOARD_DICT['empty']]		# |  O  |  O  | P1* |     |
-		g_config_3 = [BOARD_DICT['soft_block'], BOARD_DICT['soft_block'], BOARD_DICT['soft_block'], player_on_bomb_id]	# |  O  |  O  |  O  | P1* |
-		g_config_4 = [BOARD_DICT['soft_block'], player_on_bomb_id, BOARD_DICT['empty'], BOARD_DICT['soft_block']]		# |  O  | P1* |     |  O  |
-		g_config_5 = [BOARD_DICT['soft_block'], player_on_bomb_id, BOARD_DICT['soft_block'], BOARD_DICT['soft_block']]	# |  O  | P1* |  O  |  O  |
-		g_config_6 = [BOARD_DICT['soft_block'], player_on_bomb_id, BOARD_DICT['soft_block'], BOARD_DICT['empty']]		# |  O  | P1* |  O  |     |
-		g_config_7 = [BOARD_DICT['soft_block'], BOARD_DICT['bomb'], player_id, BOARD_DICT['empty']]						# |  O  |  *  | P1  |     |		
-		g_config_8 = [BOARD_DICT['soft_block'], BOARD_DICT['bomb'], BOARD_DICT['empty'], player_id]						# |  O  |  *  |     | P1  |
-		g_config_9 = [BOARD_DICT['soft_block'], BOARD_DICT['soft_block'], BOARD_DICT['bomb'], player_id]				# |  O  |  O  |  *  | P1  |		
-		g_config_10 = [BOARD_DICT['soft_block'], BOARD_DICT['exploding_bomb'], BOARD_DICT['empty'], player_id]			# |  O  |  !  |     | P1  |		
-		g_config_11 = [BOARD_DICT['exploding_bomb'], BOARD_DICT['empty'], BOARD_DICT['empty'], player_id]				# |  !  |     |     | P1  |		
-		g_config_12 = [BOARD_DICT['empty'], player_id, BOARD_DICT['bomb'], BOARD_DICT['empty']]							# |     | P1  |  *  |     |		
-		g_config_13 = [player_id, BOARD_DICT['empty'], BOARD_DICT['bomb'], BOARD_DICT['empty']]							# | P1  |     |  *  |     |		
-		g_config_14 = [player_id, BOARD_DICT['empty'], BOARD_DICT['empty'], BOARD_DICT['bomb']]							# | P1  |     |     |  *  |		
-		g_config_15 = [BOARD_DICT['empty'], player_id, BOARD_DICT['empty'], BOARD_DICT['bomb']]							# |     | P1  |     |  *  |		
-		g_config_16 = [BOARD_DICT['empty'], BOARD_DICT['empty'], player_id, BOARD_DICT['bomb']]							# |     |     | P1  |  *  |		
-
-		# BAD CONFIGS
-		b_config_1 = [BOARD_DICT['empty'], BOARD_DICT['bomb'], player_id, BOARD_DICT['soft_block']]						# |     |  *  | P1  |  O  |
-		b_config_2 = [BOARD_DICT['bomb'], player_id, BOARD_DICT['soft_block'], BOARD_DICT['soft_block']]				# |  *  |  P1 |  O  |  O  |
-		b_config_3 = [BOARD_DICT['soft_block'], BOARD_DICT['bomb'], player_id, BOARD_DICT['soft_block']]				# |  O  |  *  | P1  |  O  |
-		b_config_4 = [player_id, BOARD_DICT['exploding_bomb'], BOARD_DICT['empty'], BOARD_DICT['empty']]				# | P1  |  !  |     |     |
-		b_config_5 = [player_id, BOARD_DICT['exploding_bomb'], BOARD_DICT['empty'], BOARD_DICT['soft_block']]			# | P1  |  !  |     |  O  |
-		b_config_6 = [player_id, BOARD_DICT['exploding_bomb'], BOARD_DICT['soft_block'], BOARD_DICT['soft_block']]		# | P1  |  !  |  O  |  O  |
-		b_config_7 = [player_id, BOARD_DICT['exploding_bomb'], BOARD_DICT['soft_block'], BOARD_DICT['empty']]			# | P1  |  !  |  O  |     |
-		b_config_8 = [BOARD_DICT['exploding_bomb'], player_id, BOARD_DICT['empty'], BOARD_DICT['empty']]				# |  !  | P1  |     |     |
-		b_config_9 = [BOARD_DICT['exploding_bomb'], player_id, BOARD_DICT['empty'], BOARD_DICT['soft_block']]			# |  !  | P1  |     |  O  |
-		b_config_10 = [BOARD_DICT['exploding_bomb'], player_id, BOARD_DICT['soft_block'], BOARD_DICT['soft_block']]		# |  !  | P1  |  O  |  O  |
-		b_config_11 = [BOARD_DICT['exploding_bomb'], player_id, BOARD_DICT['soft_block'], BOARD_DICT['empty']]			# |  !  | P1  |  O  |     |
-		b_config_12 = [BOARD_DICT['empty'], BOARD_DICT['exploding_bomb'], player_id, BOARD_DICT['empty']]				# |     |  !  | P1  |     |
-		b_config_13 = [BOARD_DICT['empty'], BOARD_DICT['exploding_bomb'], player_id, BOARD_DICT['soft_block']]			# |     |  !  | P1  |  O  |
-		b_config_14 = [BOARD_DICT['soft_block'], BOARD_DICT['exploding_bomb'], player_id, BOARD_DICT['empty']]			# |  O  |  !  | P1  |     |
-		b_config_15 = [BOARD_DICT['soft_block'], BOARD_DICT['exploding_bomb'], player_id, BOARD_DICT['soft_block']]		# |  O  |  !  | P1  |  O  |
-		b_config_16 = [BOARD_DICT['bomb'], player_id, BOARD_DICT['soft_block'], BOARD_DICT['soft_block']]				# |  *  |  P1 |  O  |     |
-
-		# list of configs
-		list_configs = [g_config_1, g_config_2, g_config_3, g_config_4, g_config_5, g_config_6, g_config_7, g_config_8, g_config_9, g_config_10, g_config_11, 
-		g_config_12, g_config_13, g_config_14,g_config_15, g_config_16,
-		b_config_1, b_config_2, b_config_3, b_config_4, b_config_5, b_config_6, b_config_7, b_config_8, b_config_9, b_config_10, b_config_11, b_config_12, b_config_13, b_config_14, b_config_15, b_config_16]
-		
-		# Map points to configs
-		rewards = [10, 10, 10, 10, 10, 10, 100, 1000, 100, 1000, 1000, 
-		50, 500, 500, 500, 50,
-		-10000, -10000, -10000, -100000, -100000, -100000, -100000, -100000, -100000, -100000, -100000, -100000, -100000, -100000, -100000, -10000]
-
-		score = 0
-
-		for config in list_configs:
-			num_config = count_windows(state, config)
-			score += num_config * rewards[list_configs.index(config)]
-
-		return score
-
-	# checks if window satisfies heuristic conditions
-	def check_window(window, config):
-
-		return (window == config or window == config[::-1])
-
-	# counts number of windows satisfying heuristic conditions
-	def count_windows(state,config):
-		num_windows=0
-
-		# HORIZONTAL
-		for row in range(rows):
-			for col in range(cols - inarow):
-				window = list(state[row, col:(col+inarow)])
-				if check_window(window,config):
-					num_windows +=1
-
-		# VERTICAL
-		for col in range(cols):
-			for row in range(rows - inarow):
-				window = list(state[row:(row+inarow), col])
-				if check_window(window,config):
-					num_windows +=1
-
-		return num_windows
+	def get_heuristic(self, state):
+		return self.score_states([state])[0]
 
 	############################
 	#####      AGENT       #####
 	############################
 
-	### find valid moves
-	# get current location of agent
-	curr_pos = np.where(state == player_id)
-	if curr_pos[0].size==0 and curr_pos[1].size==0:
-		# if player couldn't be found, check if the player is on a bomb
-		curr_pos = np.where(state == player_on_bomb_id)
-
-	# check if there is a bomb on the map
-	bomb_pos = np.where(state == BOARD_DICT['bomb'])
-	if bomb_pos[0].size==0 and bomb_pos[1].size==0:
-		bomb_pos = np.where(state == BOARD_DICT['p1_on_bomb'])
-	if bomb_pos[0].size==0 and bomb_pos[1].size==0:
-		bomb_pos = np.where(state == BOARD_DICT['p2_on_bomb'])
-
-	# get surrounding tiles
-	tile_up = (curr_pos[0]-1,curr_pos[1])
-	tile_down = (curr_pos[0]+1,curr_pos[1])
-	tile_left = (curr_pos[0],curr_pos[1]-1)
-	tile_right = (curr_pos[0],curr_pos[1]+1)
-
-	surrounding_tiles = [tile_up, tile_down, tile_left, tile_right]
-
-	# exclude tiles that cross the border of the board
-	tiles_to_remove = []
-	for tile in surrounding_tiles:
-		if tile[0] < 0 or tile[1] < 0 or tile[0] >= rows or tile[1] >= cols:
-			tiles_to_remove.append(tile)
-
-	for tile in tiles_to_remove:
-		surrounding_tiles.remove(tile)
-
-	# find list of empty tiles
-	empty_tiles = []
-	for tile in surrounding_tiles:
-		if state[tile] == 0:
-			empty_tiles.append(tile)
-
-	all_actions = [d_actions['up'],d_actions['down'],d_actions['left'],d_actions['right'],d_actions['none'],d_actions['bomb']]
-
-	valid_actions = [d_actions['none']]
-	# get valid moves
-	for tile in empty_tiles:
-		if tile == tile_up:
-			valid_actions.append(d_actions['up'])
-		elif tile == tile_down:
-			valid_actions.append(d_actions['down'])
-		elif tile == tile_left:
-			valid_actions.append(d_actions['left'])
-		elif tile == tile_right:
-			valid_actions.append(d_actions['right'])
-
-	valid_move_actions = valid_actions
-	
-	if bomb_pos[0].size==0 and bomb_pos[1].size==0:
-		valid_actions.append(d_actions['bomb'])
-		is_bomb = False
-	else:
-		is_bomb = True
-
-	# calculate best next move
-	scores = dict(zip(valid_actions, [score_move(state, action, curr_pos, bomb_timer) for action in valid_actions]))
-
-	# Get a list of moves that maximize the heuristic
-	max_actions = [key for key in scores.keys() if scores[key] == max(scores.values())]
-	if max_actions:
-		action = random.choice(max_actions)
-	elif valid_move_actions:
-		action = random.choice(valid_move_actions)
-	else:
-		action = random.choice(all_actions)
+	def act(self, observation):
+		state = observation.state
+		player = observation.player
+		d_actions = self.d_actions
+		player_id = self.player_id
 
-	name = "onestep bot"
-	return action, name
+		# get bomb_timer
+		if player.bombs:
+			for bomb in player.bombs:
+				bomb_timer=bomb.timer
+		else:
+			bomb_timer=5
+
+		### find valid moves
+		# get current location of agent
+		curr_pos = np.where(state == player_id)
+		if curr_pos[0].size==0 and curr_pos[1].size==0:
+			# if player couldn't be found, check if the player is on a bomb
+			curr_pos = np.where(state == self.player_on_bomb_id)
+
+		# check if there is a bomb on the map
+		bomb_pos = np.where(state == BOARD_DICT['bomb'])
+		for on_bomb_id in ON_BOMB_IDS:
+			if bomb_pos[0].size or bomb_pos[1].size:
+				break
+			bomb_pos = np.where(state == on_bomb_id)
+
+		all_actions = [d_actions['up'],d_actions['down'],d_actions['left'],d_actions['right'],d_actions['none'],d_actions['bomb']]
+
+		# get valid moves: the surrounding tiles that are empty
+		valid_actions = [d_actions['none']]
+		if curr_pos[0].size:
+			tile = self.geometry.tile((int(curr_pos[0][0]), int(curr_pos[1][0])))
+			flat_state = state.reshape(-1)
+			for action in [d_actions['up'],d_actions['down'],d_actions['left'],d_actions['right']]:
+				new_tile = self.geometry.move[tile][action]
+				if new_tile >= 0 and flat_state[new_tile] == 0:
+					valid_actions.append(action)
+
+		valid_move_actions = valid_actions
+
+		if bomb_pos[0].size==0 and bomb_pos[1].size==0:
+			valid_actions.append(d_actions['bomb'])
+
+		# calculate best next move
+		scores = dict(zip(valid_actions, self.score_moves(state, valid_actions, curr_pos, bomb_pos, bomb_timer)))
+
+		# Get a list of moves that maximize the heuristic
+		max_actions = [key for key in scores.keys() if scores[key] == max(scores.values())]
+		if max_actions:
+			action = random.choice(max_actions)
+		elif valid_move_actions:
+			action = random.choice(valid_move_actions)
+		else:
+			action = random.choice(all_actions)
+
+		return action
 
+AGENT_CLASS = LookaheadAgent
 
+# the original agent(state, done, bombs, turn, player) interface
+agent = agent_function(LookaheadAgent)
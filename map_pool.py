@@ -0,0 +1,72 @@
+'''
+MAP POOL
+
+Pregenerated starting maps for one board size. A pool is generated once per
+(rows, cols, seed), saved to disk as a .npy file and memory-mapped when
+loaded, so resetting an episode from the pool costs one array copy.
+
+usage:
+    pool = MapPool(11, 13, seed=0)
+    env = Game(11, 13, seed=1, map_pool=pool)
+'''
+
+import os
+import numpy as np
+
+from bm_multi_env import BOARD_DTYPE, generate_maps
+
+POOL_DIR = 'maps/'
+POOL_SIZE = 10000 # maps per pool
+BATCH_SIZE = 4096 # maps generated per vectorized call
+
+class MapPool():
+
+    def __init__(self, rows=11, cols=13, seed=0, size=POOL_SIZE, num_players=2, directory=POOL_DIR, dtype=BOARD_DTYPE):
+        '''
+        loads the pool for (rows, cols, seed) from directory, generating and saving it
+        if it doesn't exist yet (directory=None keeps the pool in memory only)
+        '''
+
+        self.rows = rows
+        self.cols = cols
+        self.seed = seed
+        self.num_players = num_players
+        self.dtype = dtype
+
+        if directory is None:
+            self.path = None
+            self.maps = self.generate(size)
+            return
+
+        self.path = os.path.join(directory, f'{rows}x{cols}_p{num_players}_seed{seed}_n{size}.npy')
+        if not os.path.exists(self.path):
+            os.makedirs(directory, exist_ok=True)
+            # write to a temporary file first, so processes building the same pool
+            # at once never load a partial file
+            tmp_path = f'{self.path}.{os.getpid()}.tmp'
+            with open(tmp_path, 'wb') as f:
+                np.save(f, self.generate(size))
+            os.replace(tmp_path, self.path)
+
+        self.maps = np.load(self.path, mmap_mode='r')
+
+    def generate(self, size):
+        rng = np.random.default_rng(self.seed)
+        maps = np.empty((size, self.rows, self.cols), dtype=self.dtype)
+        for start in range(0, size, BATCH_SIZE):
+            n = min(BATCH_SIZE, size - start)
+            maps[start:start+n] = generate_maps(self.rows, self.cols, n, rng, self.num_players, self.dtype)
+        return maps
+
+    def __len__(self):
+        return len(self.maps)
+
+    def sample(self, rng, num_maps=None):
+        '''
+        random map from the pool (read-only; copy it before playing on it),
+        or a (num_maps, rows, cols) array of random maps
+        '''
+
+        if num_maps is None:
+            return self.maps[rng.integers(len(self.maps))]
+        return self.maps[rng.integers(len(self.maps), size=num_maps)]
@@ -0,0 +1,126 @@
+'''
+MATCH CLIENT
+
+Connects an agent (any module or Agent class load_agent accepts) to a
+match_server.py and plays every match the server gives it. Each turn's
+state is unpacked into a small Game shell, so the agent gets the same
+Observation, Player and Bomb views it would get from a local Game.
+
+usage:
+    python match_client.py flee_agent --port 7777
+    python match_client.py lookahead_agent --unix /tmp/bomberman.sock --games 10
+    python match_client.py random_agent --connections 50
+'''
+
+import argparse
+import socket
+import threading
+import numpy as np
+
+from agent_api import Observation, load_agent
+from agent_worker import get_layout, get_views
+from bm_multi_env import BOARD_DTYPE, Game
+from match_server import (ACTION, ACTION_MESSAGE, END, END_MESSAGE, FRAME, HELLO, HOST, PORT,
+    START, START_MESSAGE, STATE, STATE_MESSAGE)
+
+def connect(host=HOST, port=PORT, path=None):
+    if path is not None:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.connect(path)
+    else:
+        sock = socket.create_connection((host, port))
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    return sock
+
+class MatchClient():
+
+    def __init__(self, agent, sock):
+        self.agent = load_agent(agent)
+        self.sock = sock
+        self.stream = sock.makefile('rb')
+        self.results = [] # (match, our score, every player's scores, turns)
+
+    def send(self, kind, payload):
+        self.sock.sendall(FRAME.pack(len(payload), kind) + payload)
+
+    def read_message(self):
+        header = self.stream.read(FRAME.size)
+        if len(header) < FRAME.size:
+            return None, None
+        length, kind = FRAME.unpack(header)
+        return kind, self.stream.read(length)
+
+    def start_match(self, payload):
+        match, rows, cols, number, num_players = START_MESSAGE.unpack(payload)
+        self.number = number
+        self.block = bytearray(get_layout(rows, cols, BOARD_DTYPE, num_players)['size'])
+        self.shared_state, self.board, self.danger = get_views(self.block, rows, cols, BOARD_DTYPE, num_players)
+        # a game shell whose Player and Bomb views read the received entity state
+        self.game = Game(rows, cols, BOARD_DTYPE)
+        self.game.board = self.board
+        self.game.init_arrays(num_players)
+        self.agent.setup(rows, cols, number)
+
+    def play_turn(self, payload):
+        turn, done, num_bombs = STATE_MESSAGE.unpack_from(payload)
+        offset = STATE_MESSAGE.size
+        slots = payload[offset:offset + num_bombs]
+        self.block[:] = payload[offset + num_bombs:]
+        game = self.game
+        game.state[:] = self.shared_state
+
+        observation = Observation(self.board, bool(done), [game.bomb_views[slot] for slot in slots],
+            turn, game.players[self.number], self.danger)
+        action = self.agent.act(observation)
+        self.send(ACTION, ACTION_MESSAGE.pack(turn, action))
+
+    def run(self, games=None):
+        '''
+        play until the server disconnects, or until `games` matches are finished
+        '''
+
+        self.send(HELLO, self.agent.name.encode('utf-8'))
+        while games is None or len(self.results) < games:
+            kind, payload = self.read_message()
+            if kind is None:
+                break
+            if kind == STATE:
+                self.play_turn(payload)
+            elif kind == START:
+                self.start_match(payload)
+            elif kind == END:
+                match, turns = END_MESSAGE.unpack_from(payload)
+                scores = np.frombuffer(payload, dtype='<i8', offset=END_MESSAGE.size).tolist()
+                self.results.append((match, scores[self.number], scores, turns))
+                if games is None or len(self.results) < games:
+                    self.send(HELLO, self.agent.name.encode('utf-8'))
+        self.sock.close()
+        return self.results
+
+def run_client(agent, host=HOST, port=PORT, path=None, games=None):
+    return MatchClient(agent, connect(host, port, path)).run(games)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Play an agent on a match server')
+    parser.add_argument('agent', help='agent module, e.g. flee_agent')
+    parser.add_argument('--host', default=HOST)
+    parser.add_argument('--port', type=int, default=PORT)
+    parser.add_argument('--unix', default=None, help='connect to this Unix socket path instead of TCP')
+    parser.add_argument('--games', type=int, default=None, help='matches to play per connection (default: until the server closes)')
+    parser.add_argument('--connections', type=int, default=1, help='connections to open, each with its own agent')
+    args = parser.parse_args()
+
+    results = []
+    def play():
+        results.extend(run_client(args.agent, args.host, args.port, args.unix, args.games))
+
+    threads = [threading.Thread(target=play) for _ in range(args.connections)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    if results:
+        scores = [score for _, score, _, _ in results]
+        wins = sum(score == max(all_scores) and all_scores.count(score) == 1 for _, score, all_scores, _ in results)
+        print(f" {len(results)} matches, {wins} wins, average score {sum(scores) / len(scores):.1f}")
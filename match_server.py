@@ -0,0 +1,256 @@
+'''
+MATCH SERVER
+
+Hosts many games at once on one asyncio event loop, for agents connecting
+over local TCP or a Unix socket (see match_client.py). Connections wait in
+a lobby and are paired into matches as they arrive. Every match is one
+task, so hundreds of games share a single thread. After a game, a
+connection goes back to the lobby by sending HELLO again.
+
+Each turn the server sends every player the state and waits until the
+deadline for their actions. A player that hasn't answered by then plays
+actions.NONE. A player whose late answer hasn't arrived yet skips that
+turn's state instead of falling further behind.
+
+Protocol: every message is a frame header FRAME (payload length, message
+type) followed by the payload, all little-endian:
+    HELLO   client -> server   agent name (utf-8); asks for a match
+    START   server -> client   START_MESSAGE: match, rows, cols, player number, number of players
+    STATE   server -> client   STATE_MESSAGE: turn, done, number of bombs; the bombs' slots (uint8);
+                               then the entity state, board and danger map laid out as in
+                               agent_worker.get_layout
+    ACTION  client -> server   ACTION_MESSAGE: turn, action
+    END     server -> client   END_MESSAGE: match, turns; then every player's score (int64)
+
+usage:
+    python match_server.py --port 7777 --deadline 0.1
+    python match_server.py --unix /tmp/bomberman.sock
+'''
+
+import argparse
+import asyncio
+import struct
+import time
+import numpy as np
+
+from agent_worker import get_layout, get_views
+from bm_multi_env import BOARD_DTYPE, Game, actions
+
+HOST = '127.0.0.1'
+PORT = 7777
+DEADLINE = 0.1 # seconds players have to answer each turn
+MAX_TURNS = 200
+HELLO_TIMEOUT = 5 # seconds a new connection has to introduce itself
+MAX_WRITE_BUFFER = 2**20 # bytes queued for a client that isn't reading before it is dropped
+
+FRAME = struct.Struct('<IB')
+HELLO, START, STATE, ACTION, END = range(5)
+START_MESSAGE = struct.Struct('<IHHBB')
+STATE_MESSAGE = struct.Struct('<IBB')
+ACTION_MESSAGE = struct.Struct('<IB')
+END_MESSAGE = struct.Struct('<IH')
+
+class Connection():
+    '''
+    one connected agent
+    '''
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.name = None
+        self.closed = False
+        self.turn = None # turn whose action we're waiting for
+        self.action = None # future for that action
+        self.owes_action = False # sent a state that hasn't been answered yet, even late
+        self.playing = False # in the lobby or in a match
+
+    async def read_message(self):
+        length, kind = FRAME.unpack(await self.reader.readexactly(FRAME.size))
+        return kind, await self.reader.readexactly(length)
+
+    def send(self, kind, payload):
+        if self.closed:
+            return
+        self.writer.write(FRAME.pack(len(payload), kind) + payload)
+        if self.writer.transport.get_write_buffer_size() > MAX_WRITE_BUFFER:
+            self.close()
+
+    def expect(self, turn):
+        '''
+        future for this turn's action
+        '''
+
+        self.turn = turn
+        self.action = asyncio.get_running_loop().create_future()
+        if self.closed:
+            self.action.set_result(actions.NONE)
+        return self.action
+
+    def receive_action(self, turn, action):
+        self.owes_action = False
+        if turn == self.turn and self.action is not None and not self.action.done():
+            self.action.set_result(action)
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        if self.action is not None and not self.action.done():
+            self.action.set_result(actions.NONE)
+        self.writer.close()
+
+class MatchServer():
+
+    def __init__(self, rows=11, cols=13, players_per_match=2, deadline=DEADLINE, max_turns=MAX_TURNS, seed=None, verbose=False):
+        self.rows = rows
+        self.cols = cols
+        self.players_per_match = players_per_match
+        self.deadline = deadline
+        self.max_turns = max_turns
+        self.seed = seed
+        self.verbose = verbose
+
+        self.lobby = [] # connections waiting for a match
+        self.matches = set() # running match tasks
+        self.num_matches = 0 # matches started
+        self.results = [] # (names, scores, turns) of every finished match
+        self.turns_played = 0
+        self.missed_deadlines = 0
+
+    async def start(self, host=HOST, port=PORT, path=None):
+        '''
+        start listening on TCP, or on a Unix socket if a path is given
+        '''
+
+        if path is not None:
+            return await asyncio.start_unix_server(self.handle_connection, path)
+        return await asyncio.start_server(self.handle_connection, host, port)
+
+    async def handle_connection(self, reader, writer):
+        connection = Connection(reader, writer)
+        try:
+            kind, payload = await asyncio.wait_for(connection.read_message(), HELLO_TIMEOUT)
+            while True:
+                if kind == ACTION:
+                    connection.receive_action(*ACTION_MESSAGE.unpack(payload))
+                elif kind == HELLO and not connection.playing:
+                    connection.name = payload.decode('utf-8', 'replace')
+                    self.join_lobby(connection)
+                kind, payload = await connection.read_message()
+        except (asyncio.IncompleteReadError, asyncio.TimeoutError, ConnectionError, struct.error):
+            pass
+        finally:
+            connection.close()
+            if connection in self.lobby:
+                self.lobby.remove(connection)
+
+    def join_lobby(self, connection):
+        if connection.closed:
+            return
+        connection.playing = True
+        self.lobby.append(connection)
+        while len(self.lobby) >= self.players_per_match:
+            players = self.lobby[:self.players_per_match]
+            del self.lobby[:self.players_per_match]
+            task = asyncio.create_task(self.play_match(players))
+            self.matches.add(task)
+            task.add_done_callback(self.matches.discard)
+
+    async def play_match(self, connections):
+        match = self.num_matches
+        self.num_matches += 1
+        num_players = len(connections)
+        rows, cols = self.rows, self.cols
+
+        env = Game(rows, cols, seed=None if self.seed is None else self.seed + match)
+        state, players = env.reset(num_players)
+        for number, connection in enumerate(connections):
+            connection.send(START, START_MESSAGE.pack(match, rows, cols, number, num_players))
+
+        # every player is sent the same state block each turn
+        block = bytearray(get_layout(rows, cols, BOARD_DTYPE, num_players)['size'])
+        shared_state, shared_board, shared_danger = get_views(block, rows, cols, BOARD_DTYPE, num_players)
+
+        done = False
+        bomb_list = []
+        turn = 0
+        while not done and turn < self.max_turns:
+            shared_state[:] = env.state
+            shared_board[:] = state
+            shared_danger[:] = env.get_danger_map()
+            slots = bytes(bomb.index for bomb in bomb_list)
+            message = STATE_MESSAGE.pack(turn, done, len(slots)) + slots + bytes(block)
+
+            futures = []
+            for connection in connections:
+                future = connection.expect(turn)
+                if future.done():
+                    pass # disconnected
+                elif connection.owes_action:
+                    # still answering an earlier turn: it plays NONE until it catches up
+                    future.set_result(actions.NONE)
+                    self.missed_deadlines += 1
+                else:
+                    connection.owes_action = True
+                    connection.send(STATE, message)
+                futures.append(future)
+
+            pending = [future for future in futures if not future.done()]
+            if pending:
+                await asyncio.wait(pending, timeout=self.deadline)
+
+            player_actions = []
+            for future in futures:
+                if future.done():
+                    player_actions.append(future.result())
+                else:
+                    future.set_result(actions.NONE)
+                    player_actions.append(actions.NONE)
+                    self.missed_deadlines += 1
+
+            state, done, players, bomb_list = env.step(player_actions)
+            turn += 1
+
+        self.turns_played += turn
+        scores = [player.score for player in players]
+        names = [connection.name for connection in connections]
+        self.results.append((names, scores, turn))
+        if self.verbose:
+            print(f" match {match}: " + ", ".join(f"{name} {score}" for name, score in zip(names, scores)) + f" ({turn} turns)")
+
+        message = END_MESSAGE.pack(match, turn) + np.array(scores, dtype='<i8').tobytes()
+        for connection in connections:
+            connection.send(END, message)
+            connection.action = None
+            connection.playing = False
+
+async def serve(server, host=HOST, port=PORT, path=None, report_interval=10):
+    listener = await server.start(host, port, path)
+    print(f" listening on {path or f'{host}:{port}'}")
+    async with listener:
+        start = time.perf_counter()
+        while True:
+            await asyncio.sleep(report_interval)
+            elapsed = time.perf_counter() - start
+            print(f" {len(server.results)} matches, {server.turns_played} turns ({server.turns_played / elapsed:.0f} turns/s),"
+                  f" {len(server.matches)} running, {len(server.lobby)} waiting, {server.missed_deadlines} missed deadlines")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Host games for agents connecting over sockets')
+    parser.add_argument('--host', default=HOST)
+    parser.add_argument('--port', type=int, default=PORT)
+    parser.add_argument('--unix', default=None, help='listen on this Unix socket path instead of TCP')
+    parser.add_argument('--rows', type=int, default=11)
+    parser.add_argument('--cols', type=int, default=13)
+    parser.add_argument('--deadline', type=float, default=DEADLINE, help='seconds players have to answer each turn')
+    parser.add_argument('--max-turns', type=int, default=MAX_TURNS)
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--verbose', action='store_true', help='print every match result')
+    args = parser.parse_args()
+
+    server = MatchServer(args.rows, args.cols, deadline=args.deadline, max_turns=args.max_turns, seed=args.seed, verbose=args.verbose)
+    try:
+        asyncio.run(serve(server, args.host, args.port, args.unix))
+    except KeyboardInterrupt:
+        pass
@@ -4,6 +4,9 @@ import lookahead_agent
 import random_agent
 import flee_agent
 import random
+from replay import ReplayRecorder
+from agent_api import Observation, load_agent
+from latency import TimedAgent, print_latency, save_latency
 import os
 from time import sleep
 
@@ -17,31 +20,49 @@ sleep(0.5)
 num_episodes = 10
 max_turns = 200
 
+# save a replay of each episode to this directory (None to disable)
+replay_dir = None
+
+# seconds each agent may take to decide before it plays NONE (None for no limit)
+turn_deadline = None
+# write each agent's decision latency stats to this JSON file (None to disable)
+latency_json = None
+
 # set agents in play
-# available: lookahead_agent, random_agent, flee_agent
-agent1 = flee_agent
-agent2 = lookahead_agent
+# available: lookahead_agent, random_agent, flee_agent, search_agent
+# (or any module with an agent function, or an Agent class)
+agent1 = TimedAgent(load_agent(flee_agent), turn_deadline)
+agent2 = TimedAgent(load_agent(lookahead_agent), turn_deadline)
 
 for i in range(num_episodes):
 	turn = 0
 	# initialize the map & players
 	state, players = env.reset()
+	agent1.setup(env.rows, env.cols, 0)
+	agent2.setup(env.rows, env.cols, 1)
 	# initialize variables
 	done = False
 	rewards = [0,0] # reward received per turn
 	total_rewards = [0,0] # cumulative rewards received
 	bomb_timer = env.MAX_TIMER
 	bomb_list = [] # a list of bomb objects in play and their properties
+	if replay_dir:
+		recorder = ReplayRecorder(env)
 
 	# until game ends
-	while not done:
+	while not done and turn < max_turns:
 
 		os.system('cls')
 
+		# map of turns until each tile is hit by a bomb
+		danger = env.get_danger_map()
+
 		# get player one's action
-		p1_action, p1_bot = agent1.agent(state, done, bomb_list, turn, player=players[0])
+		p1_action = agent1.act(Observation(state, done, bomb_list, turn, players[0], danger))
+		p1_bot = agent1.name
 		# get player two's action
-		p2_action, p2_bot = agent2.agent(state, done, bomb_list, turn, player=players[1])
+		p2_action = agent2.act(Observation(state, done, bomb_list, turn, players[1], danger))
+		p2_bot = agent2.name
 
 		# perform action
 		actions = [p1_action, p2_action]
@@ -74,4 +95,13 @@ for i in range(num_episodes):
 
 		turn +=1
 
-		sleep(0.2)
\ No newline at end of file
+		sleep(0.2)
+
+	if replay_dir:
+		recorder.detach()
+		os.makedirs(replay_dir, exist_ok=True)
+		recorder.save(os.path.join(replay_dir, f'episode_{i}.bmr'))
+
+print_latency([agent1.stats.summary(), agent2.stats.summary()])
+if latency_json:
+	save_latency([agent1.stats, agent2.stats], latency_json)
\ No newline at end of file
@@ -0,0 +1,189 @@
+'''
+OBSERVATIONS
+
+Encodes games as stacks of binary feature planes for learning agents, from
+the point of view of one player:
+
+    hard_block, soft_block    blocks on the map
+    self, opponents           player positions
+    bomb_timer_1 .. _5        live bombs, one plane per turns left to explode
+    blast_zone                tiles that a live bomb will hit
+    explosion                 tiles exploding this turn
+
+The encoder owns one preallocated (batch, planes, rows, cols) buffer and
+rewrites it in place on every call. Board values are mapped to planes with
+a lookup table, and a VecGame batch is encoded in one vectorized pass. The
+buffer can be handed to torch with as_tensor(), which shares its memory, so
+each step's observation is visible to the tensor without copying.
+
+usage:
+    encoder = ObservationEncoder(11, 13)
+    obs = encoder.encode(env, player=0) # (planes, rows, cols) view of the buffer
+    tensor = encoder.as_tensor() # torch.from_numpy(encoder.buffer), created once
+'''
+
+import numpy as np
+
+from bm_multi_env import Game
+
+PLANES = (['hard_block', 'soft_block', 'self', 'opponents']
+    + [f'bomb_timer_{timer}' for timer in range(1, Game.MAX_TIMER + 1)]
+    + ['blast_zone', 'explosion'])
+NUM_PLANES = len(PLANES)
+PLANE_DICT = {name: index for index, name in enumerate(PLANES)}
+
+def get_code_planes():
+    '''
+    plane of each board value, for each player's point of view (-1: no plane)
+    bombs are encoded from the bomb arrays, so their timers are known
+    '''
+
+    num_codes = max(Game.BOARD_DICT.values()) + 1
+    num_players = len(Game.PLAYER_LIST)
+    code_planes = np.full((num_players, num_codes), -1, dtype=np.int64)
+    code_planes[:, Game.BOARD_DICT['hard_block']] = PLANE_DICT['hard_block']
+    code_planes[:, Game.BOARD_DICT['soft_block']] = PLANE_DICT['soft_block']
+    code_planes[:, Game.BOARD_DICT['exploding_bomb']] = PLANE_DICT['explosion']
+    code_planes[:, Game.BOARD_DICT['exploding_tile']] = PLANE_DICT['explosion']
+    for player in range(num_players):
+        for number, names in enumerate(zip(Game.PLAYER_LIST, Game.ON_BOMB_LIST)):
+            plane = PLANE_DICT['self'] if number == player else PLANE_DICT['opponents']
+            for name in names:
+                code_planes[player, Game.BOARD_DICT[name]] = plane
+    return code_planes
+
+class ObservationEncoder():
+
+    def __init__(self, rows=11, cols=13, batch_size=1, dtype=np.float32):
+        self.rows = rows
+        self.cols = cols
+        self.batch_size = batch_size
+        self.buffer = np.zeros((batch_size, NUM_PLANES, rows, cols), dtype=dtype)
+        self.code_planes = get_code_planes()
+        self._flat = self.buffer.reshape(batch_size, NUM_PLANES, rows * cols)
+        self._tensor = None
+
+    def as_tensor(self):
+        '''
+        torch tensor sharing the buffer's memory (requires torch)
+        '''
+
+        if self._tensor is None:
+            import torch
+            self._tensor = torch.from_numpy(self.buffer)
+        return self._tensor
+
+    def encode(self, game, player=0, index=0):
+        '''
+        encode a Game into row `index` of the buffer, returns that (planes, rows, cols) view
+        '''
+
+        flat = self._flat[index]
+        flat.fill(0)
+
+        planes = self.code_planes[player][game._flat_board]
+        tiles = np.flatnonzero(planes >= 0)
+        flat[planes[tiles], tiles] = 1
+
+        bomb_tiles = game.bomb_tiles.tolist()
+        timers = game.bomb_timers.tolist()
+        exploded = game.bomb_exploded.tolist()
+        for slot, active in enumerate(game.bomb_active.tolist()):
+            if active and not exploded[slot]:
+                tile = bomb_tiles[slot]
+                flat[PLANE_DICT['bomb_timer_1'] + timers[slot] - 1, tile] = 1
+                flat[PLANE_DICT['blast_zone'], game.get_tiles_in_range(tile)] = 1
+
+        return self.buffer[index]
+
+    def encode_games(self, games, player=0):
+        '''
+        encode a list of Games (at most batch_size) into the buffer
+        '''
+
+        for index, game in enumerate(games):
+            self.encode(game, player, index)
+        return self.buffer[:len(games)]
+
+    def encode_batch(self, games, players):
+        '''
+        encode a list of Games (at most batch_size), each from the point of view
+        of the matching player number, with one vectorized pass over the boards
+        '''
+
+        num_games = len(games)
+        flat = self.encode_boards([game._flat_board for game in games], players)
+
+        timer_1 = PLANE_DICT['bomb_timer_1']
+        blast_zone = PLANE_DICT['blast_zone']
+        for index, game in enumerate(games):
+            # bomb_at holds the game's live bombs, by tile
+            for tile, slot in game.bomb_at.items():
+                flat[index, timer_1 + game.bomb_timers.item(slot) - 1, tile] = 1
+                flat[index, blast_zone, game.get_tiles_in_range(tile)] = 1
+
+        return self.buffer[:num_games]
+
+    def encode_observations(self, observations):
+        '''
+        encode a list of Observations (at most batch_size), each from the point of
+        view of its own player, from nothing but the board and bomb list it shows
+        (so it works on observations from agent_worker and match_client too)
+        '''
+
+        num_observations = len(observations)
+        flat = self.encode_boards([observation.state.reshape(-1) for observation in observations],
+            [observation.player.number for observation in observations])
+
+        cols = self.cols
+        timer_1 = PLANE_DICT['bomb_timer_1']
+        blast_zone = PLANE_DICT['blast_zone']
+        for index, observation in enumerate(observations):
+            for bomb in observation.bombs:
+                if bomb.recently_exploded:
+                    continue
+                row, col = bomb.position
+                flat[index, timer_1 + bomb.timer - 1, row * cols + col] = 1
+                flat[index, blast_zone, [row * cols + col for row, col in bomb.tiles_in_range]] = 1
+
+        return self.buffer[:num_observations]
+
+    def encode_boards(self, boards, players):
+        '''
+        clear the first len(boards) rows of the buffer and set the planes read off
+        the flat boards, returns those rows of the flat buffer
+        '''
+
+        flat = self._flat[:len(boards)]
+        flat.fill(0)
+
+        planes = self.code_planes[np.asarray(players)[:, None], np.stack(boards)]
+        games_index, tiles = np.nonzero(planes >= 0)
+        flat[games_index, planes[games_index, tiles], tiles] = 1
+        return flat
+
+    def encode_vec(self, vec_game, player=0):
+        '''
+        encode every environment of a VecGame (batch_size must equal num_envs)
+        '''
+
+        if vec_game.num_envs != self.batch_size:
+            raise ValueError(f'encoder batch size {self.batch_size} does not match {vec_game.num_envs} environments')
+
+        flat = self._flat
+        flat.fill(0)
+
+        planes = self.code_planes[player][vec_game.board.reshape(self.batch_size, -1)]
+        envs, tiles = np.nonzero(planes >= 0)
+        flat[envs, planes[envs, tiles], tiles] = 1
+
+        envs, players = np.nonzero(vec_game.bomb_active & ~vec_game.bomb_exploded)
+        timers = vec_game.bomb_timers[envs, players]
+        flat[envs, PLANE_DICT['bomb_timer_1'] + timers - 1, vec_game.bomb_tiles[envs, players]] = 1
+
+        ranges = vec_game.bomb_ranges[envs, players]
+        in_range = ranges >= 0
+        envs = np.broadcast_to(envs[:, None], ranges.shape)[in_range]
+        flat[envs, PLANE_DICT['blast_zone'], ranges[in_range]] = 1
+
+        return self.buffer
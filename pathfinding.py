@@ -0,0 +1,283 @@
+'''
+PATHFINDING
+
+Breadth-first distance fields over a board in the Game.BOARD_DICT encoding.
+A tile can be walked through if a player could move onto it (empty or
+exploding_tile, the same rule as Game.check_if_valid).
+
+DistanceField holds the number of moves from every tile to the nearest of a
+set of target tiles (e.g. safe tiles, tiles next to a soft block, tiles next
+to an opponent). It is kept across turns: each update compares the new board
+with the last one, and when only a few tiles changed (a block destroyed, a
+bomb placed, a player moved) only the distances that depended on them are
+repaired. Large changes, such as a new game, rebuild the field with a
+vectorized BFS.
+
+distance_fields(board, sources) runs one vectorized BFS from many sources at
+once, e.g. from every player.
+
+usage:
+    field = DistanceField(11, 13, safe_tiles)
+    field.update(state, danger)
+    action = field.next_action(player.position)
+'''
+
+import heapq
+import numpy as np
+
+from bm_multi_env import Game, actions
+from board_geometry import get_geometry
+
+WALKABLE_CODES = [Game.BOARD_DICT['empty'], Game.BOARD_DICT['exploding_tile']]
+# tiles a player can be standing on
+STANDABLE_CODES = WALKABLE_CODES + [Game.BOARD_DICT[name] for name in Game.PLAYER_LIST + Game.ON_BOMB_LIST]
+
+UNREACHABLE = -1
+INF = 2**30 # internal distance of unreachable tiles
+MAX_REPAIR_FRACTION = 0.1 # rebuild from scratch when more of the board than this changed
+
+MOVE_ACTIONS = [actions.UP, actions.DOWN, actions.LEFT, actions.RIGHT]
+
+########################
+###  TARGET SETS     ###
+########################
+
+def get_code_table(codes):
+    '''
+    boolean lookup table indexed by board value (faster than np.isin on small boards)
+    '''
+
+    table = np.zeros(max(Game.BOARD_DICT.values()) + 1, dtype=bool)
+    table[codes] = True
+    return table
+
+WALKABLE_TABLE = get_code_table(WALKABLE_CODES)
+STANDABLE_TABLE = get_code_table(STANDABLE_CODES)
+
+def get_walkable(board):
+    return WALKABLE_TABLE[board].reshape(-1)
+
+def get_adjacent(mask, geometry):
+    '''
+    tiles next to any tile of a flat (..., tiles) mask (hard blocks are never next to anything)
+    '''
+
+    grid = mask.reshape(mask.shape[:-1] + (geometry.rows, geometry.cols))
+    adjacent = np.zeros_like(grid)
+    adjacent[..., 1:, :] |= grid[..., :-1, :]
+    adjacent[..., :-1, :] |= grid[..., 1:, :]
+    adjacent[..., :, 1:] |= grid[..., :, :-1]
+    adjacent[..., :, :-1] |= grid[..., :, 1:]
+    return adjacent.reshape(mask.shape) & ~geometry.is_hard
+
+def safe_tiles(board, danger, geometry):
+    '''
+    tiles a player can stand on that no live bomb will hit
+    '''
+    return STANDABLE_TABLE[board].reshape(-1) & (danger.reshape(-1) == 0)
+
+def soft_block_tiles(board, danger, geometry):
+    '''
+    tiles a player can stand on next to a soft block (where a bomb would destroy it)
+    '''
+    is_block = (board == Game.BOARD_DICT['soft_block']).reshape(-1)
+    return STANDABLE_TABLE[board].reshape(-1) & get_adjacent(is_block, geometry)
+
+def opponent_tiles(number):
+    '''
+    target set of the tiles next to any player other than `number`
+    '''
+
+    codes = [Game.BOARD_DICT[name] for i, names in enumerate(zip(Game.PLAYER_LIST, Game.ON_BOMB_LIST)) if i != number for name in names]
+    opponent_table = get_code_table(codes)
+    def targets(board, danger, geometry):
+        is_opponent = opponent_table[board].reshape(-1)
+        return STANDABLE_TABLE[board].reshape(-1) & get_adjacent(is_opponent, geometry)
+    return targets
+
+########################
+###  DISTANCE FIELDS ###
+########################
+
+def bfs_levels(seeds, walkable, geometry):
+    '''
+    vectorized BFS: distance from a (..., tiles) mask of seed tiles to every tile,
+    expanding only through walkable tiles (the seeds themselves only if walkable)
+    '''
+
+    distances = np.where(seeds, 0, INF)
+    reached = seeds.copy()
+    frontier = seeds & walkable
+    level = 0
+    while frontier.any():
+        level += 1
+        new = get_adjacent(frontier, geometry) & ~reached
+        distances[new] = level
+        reached |= new
+        frontier = new & walkable
+    return distances
+
+def distance_fields(board, sources):
+    '''
+    moves from each source tile (flat index) to every tile: a (num_sources, tiles) array,
+    UNREACHABLE where a tile can't be reached
+    '''
+
+    geometry = get_geometry(*board.shape)
+    sources = np.asarray(sources).reshape(-1)
+    seeds = np.zeros((sources.size, board.size), dtype=bool)
+    seeds[np.arange(sources.size), sources] = True
+
+    # a source is left by moving, whatever it holds
+    walkable = np.broadcast_to(get_walkable(board), seeds.shape) | seeds
+    distances = bfs_levels(seeds, walkable, geometry)
+    return np.where(distances == INF, UNREACHABLE, distances)
+
+class DistanceField():
+
+    def __init__(self, rows, cols, targets):
+        '''
+        targets: function of (board, danger map, geometry) returning a flat mask of target
+        tiles, e.g. safe_tiles, soft_block_tiles or opponent_tiles(number)
+        '''
+
+        self.rows = rows
+        self.cols = cols
+        self.targets = targets
+        self.geometry = get_geometry(rows, cols)
+        self.distances = np.full(rows * cols, UNREACHABLE, dtype=np.int64)
+
+        self._d = [INF] * (rows * cols) # the same distances as a list, INF where unreachable
+        self._walkable = None
+        self._is_target = None
+        self.num_repaired = 0 # tiles recomputed by the last update
+
+    def update(self, board, danger=None):
+        '''
+        bring the field up to date with a board (and danger map, for targets that use it)
+        returns the (rows, cols) distance field
+        '''
+
+        if danger is None:
+            danger = np.zeros(board.shape, dtype=np.int8)
+        # tiles of the hard block lattice are never walked or targeted
+        # (even on boards where reset put a player there)
+        walkable = get_walkable(board) & ~self.geometry.is_hard
+        is_target = self.targets(board, danger, self.geometry) & ~self.geometry.is_hard
+
+        if self._walkable is None:
+            changed = None
+        else:
+            changed = np.flatnonzero((walkable != self._walkable) | (is_target != self._is_target))
+        self._walkable = walkable
+        self._is_target = is_target
+
+        if changed is None or changed.size > MAX_REPAIR_FRACTION * walkable.size:
+            distances = bfs_levels(is_target, walkable, self.geometry)
+            self._d = distances.tolist()
+            self.distances = np.where(distances == INF, UNREACHABLE, distances)
+            self.num_repaired = walkable.size
+        else:
+            touched = self.repair(changed.tolist())
+            d = self._d
+            for tile in touched:
+                self.distances[tile] = UNREACHABLE if d[tile] == INF else d[tile]
+            self.num_repaired = len(touched)
+
+        return self.distances.reshape(self.rows, self.cols)
+
+    def repair(self, changed):
+        '''
+        recompute the distances that could depend on the changed tiles:
+        every tile downstream of them in the BFS is reset, given the best distance
+        offered by an unaffected neighbour and relaxed again in order of distance
+        returns the tiles whose distance may have changed
+        '''
+
+        d = self._d
+        neighbours = self.geometry.neighbours
+        walkable = self._walkable
+        is_target = self._is_target
+
+        # tiles whose distance may have come through a changed tile
+        affected = set(changed)
+        stack = list(changed)
+        while stack:
+            tile = stack.pop()
+            if d[tile] == INF:
+                continue
+            for neighbour in neighbours[tile]:
+                if neighbour not in affected and d[neighbour] == d[tile] + 1:
+                    affected.add(neighbour)
+                    stack.append(neighbour)
+
+        # best distance each affected tile gets from the rest of the field
+        heap = []
+        for tile in affected:
+            if is_target.item(tile):
+                best = 0
+            else:
+                best = INF
+                for neighbour in neighbours[tile]:
+                    if neighbour not in affected and walkable.item(neighbour) and d[neighbour] + 1 < best:
+                        best = d[neighbour] + 1
+            d[tile] = best
+            if best < INF:
+                heapq.heappush(heap, (best, tile))
+
+        # relax outwards (this also spreads distances that got shorter)
+        while heap:
+            distance, tile = heapq.heappop(heap)
+            if distance > d[tile] or not walkable.item(tile):
+                continue
+            for neighbour in neighbours[tile]:
+                if distance + 1 < d[neighbour]:
+                    d[neighbour] = distance + 1
+                    affected.add(neighbour)
+                    heapq.heappush(heap, (distance + 1, neighbour))
+
+        return affected
+
+    def distance(self, position):
+        return int(self.distances[self.geometry.tile(position)])
+
+    def next_tile(self, tile):
+        '''
+        neighbouring tile one move closer to a target (None if at a target or no route)
+        '''
+
+        d = self._d
+        if d[tile] in (0, INF):
+            return None
+        walkable = self._walkable
+        for neighbour in self.geometry.neighbours[tile]:
+            if walkable.item(neighbour) and d[neighbour] == d[tile] - 1:
+                return neighbour
+        return None
+
+    def next_action(self, position):
+        '''
+        action that moves a player at position one step along a shortest route to a target
+        (actions.NONE if already on one or none can be reached)
+        '''
+
+        tile = self.geometry.tile(position)
+        next_tile = self.next_tile(tile)
+        if next_tile is None:
+            return actions.NONE
+        for action in MOVE_ACTIONS:
+            if self.geometry.move[tile][action] == next_tile:
+                return action
+
+    def path(self, position):
+        '''
+        tiles (row, col) of a shortest route from position to the nearest target
+        '''
+
+        tile = self.geometry.tile(position)
+        route = []
+        while True:
+            tile = self.next_tile(tile)
+            if tile is None:
+                return route
+            route.append(self.geometry.position(tile))
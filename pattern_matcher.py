@@ -0,0 +1,82 @@
+'''
+PATTERN MATCHER
+
+Scores boards by counting horizontal and vertical windows that match a set
+of tile configurations (e.g. the lookahead agent's heuristic configs).
+
+Every window of tiles is encoded as one integer key (the tile values read as
+the digits of a base-N number) and looked up in a table that already holds
+the summed reward of every config matching that window, forwards or reversed.
+Only the values that appear in some config get their own digit; every other
+board value (e.g. the codes of players 3 and up) reads as one shared 'other'
+digit, so the table stays small however many codes the board uses.
+A whole board, or a stack of boards, is scored in one vectorized pass.
+'''
+
+import numpy as np
+
+class PatternMatcher():
+
+    def __init__(self, configs, rewards, window=4, num_codes=256):
+        '''
+        configs: list of tile configurations, each a list of `window` board values
+        rewards: reward for each config
+        num_codes: board values are below this (Game.BOARD_DICT uses 0 to 37)
+        '''
+
+        self.window = window
+        # digit of each board value: its index among the config values, or 'other'
+        values = sorted({int(value) for config in configs for value in config})
+        self.num_digits = len(values) + 1
+        self.digits = np.full(num_codes, len(values), dtype=np.int64)
+        self.digits[values] = np.arange(len(values))
+        self.table = np.zeros(self.num_digits ** window, dtype=np.int64)
+
+        for config in configs:
+            # duplicated configs all take the reward of the first occurrence
+            reward = rewards[configs.index(config)]
+            # a window matching both orders of a config is counted once
+            for key in {self.get_key(config), self.get_key(config[::-1])}:
+                self.table[key] += reward
+
+    def get_key(self, tiles):
+        '''
+        encode a list of tile values as an integer key
+        '''
+        key = 0
+        for value in tiles:
+            key = key * self.num_digits + int(self.digits[int(value)])
+        return key
+
+    def get_keys(self, states, axis):
+        '''
+        keys of every window along an axis of a (..., rows, cols) stack of boards,
+        already mapped to digits (self.digits[boards])
+        (as in the original count_windows, windows start at index < length - window)
+        '''
+
+        length = max(states.shape[axis] - self.window, 0)
+        keys = 0
+        for i in range(self.window):
+            if axis == -1:
+                keys = keys * self.num_digits + states[..., i:i+length]
+            else:
+                keys = keys * self.num_digits + states[..., i:i+length, :]
+        return keys
+
+    def score_batch(self, states):
+        '''
+        score a (num_states, rows, cols) stack of boards, returns one score per board
+        '''
+
+        states = self.digits[np.asarray(states)]
+        horizontal = self.table[self.get_keys(states, -1)]
+        vertical = self.table[self.get_keys(states, -2)]
+
+        return horizontal.sum(axis=(-2, -1)) + vertical.sum(axis=(-2, -1))
+
+    def score(self, state):
+        '''
+        score a single board
+        '''
+        return int(self.score_batch(state[None])[0])
@@ -0,0 +1,227 @@
+'''
+PHASE PROFILER
+
+Opt-in timing of the phases of Game.step and Game.reset: cumulative time and
+call counts for movement validation, bomb placement, blast ranges, hit
+detection, explosions, clearing, map generation and so on.
+
+While a profiler runs, each phase method is replaced on that one Game
+instance by a timing wrapper (the way ReplayRecorder wraps step). Stopping it
+puts the original methods back, so a game that isn't being profiled runs
+exactly the same code as before, at no cost. Times are inclusive: step
+includes every phase called during it, and explode_bomb includes its
+get_tiles_in_range calls.
+
+With trace_memory, tracemalloc runs while profiling. stats() then also
+reports the memory traced and the source lines that allocated the most
+since profiling started.
+
+usage:
+    with env.profile(trace_memory=True):
+        for _ in range(1000):
+            env.step(player_actions)
+    print_stats(env.stats())
+
+    python profiling.py --size 11x13 --steps 20000 --memory
+'''
+
+import argparse
+import time
+import tracemalloc
+
+# methods timed on the Game, in the order they are reported
+PHASES = [
+    'step', 'check_if_valid', 'place_bomb', 'detonate', 'check_if_game_over',
+    'explode_bomb', 'clear_bomb', 'get_tiles_in_range', 'get_danger_map', 'sync_timers',
+    'make_move', 'unmake_move',
+    'reset', 'get_starting_board', 'init_arrays', 'index_bombs',
+]
+TOP_ALLOCATIONS = 10 # source lines listed in the memory stats
+
+class PhaseProfiler():
+
+    def __init__(self, game, phases=PHASES, trace_memory=False, top=TOP_ALLOCATIONS):
+        self.game = game
+        self.phases = list(phases)
+        self.trace_memory = trace_memory
+        self.top = top
+        self.calls = dict.fromkeys(self.phases, 0)
+        self.times = dict.fromkeys(self.phases, 0) # nanoseconds
+        self.running = False
+        self.elapsed = 0 # nanoseconds profiled, over every start/stop
+        self._saved = {} # instance attributes replaced by the wrappers
+        self._wrappers = {}
+        self._started_tracing = False
+        self._first_snapshot = None
+        self._last_snapshot = None
+
+    def wrap(self, name, method):
+        calls = self.calls
+        times = self.times
+        clock = time.perf_counter_ns
+
+        def timed(*args, **kwargs):
+            start = clock()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                times[name] += clock() - start
+                calls[name] += 1
+
+        return timed
+
+    def start(self):
+        '''
+        start (or resume) timing the game's phases
+        '''
+
+        if self.running:
+            return self
+        game = self.game
+        for name in self.phases:
+            self._saved[name] = game.__dict__.get(name)
+            self._wrappers[name] = self.wrap(name, getattr(game, name))
+            setattr(game, name, self._wrappers[name])
+
+        if self.trace_memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self._started_tracing = True
+            if self._first_snapshot is None:
+                self._first_snapshot = tracemalloc.take_snapshot()
+
+        self.running = True
+        self._start_time = time.perf_counter_ns()
+        return self
+
+    def stop(self):
+        '''
+        stop timing and put the game's own methods back (the stats are kept)
+        '''
+
+        if not self.running:
+            return self
+        self.elapsed += time.perf_counter_ns() - self._start_time
+
+        game = self.game
+        for name in self.phases:
+            # leave alone anything that wrapped the method after us
+            if game.__dict__.get(name) is self._wrappers[name]:
+                if self._saved[name] is None:
+                    del game.__dict__[name]
+                else:
+                    setattr(game, name, self._saved[name])
+        self._saved = {}
+        self._wrappers = {}
+
+        if self.trace_memory:
+            self._last_snapshot = tracemalloc.take_snapshot()
+            self._traced = tracemalloc.get_traced_memory()
+            if self._started_tracing:
+                tracemalloc.stop()
+                self._started_tracing = False
+
+        self.running = False
+        return self
+
+    def clear(self):
+        '''
+        zero the counters (and restart the memory comparison)
+        '''
+
+        for name in self.phases:
+            self.calls[name] = 0
+            self.times[name] = 0
+        self.elapsed = 0
+        if self.running:
+            self._start_time = time.perf_counter_ns()
+        self._first_snapshot = tracemalloc.take_snapshot() if self.running and self.trace_memory else None
+        self._last_snapshot = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def get_memory_stats(self):
+        if self.running:
+            last = tracemalloc.take_snapshot()
+            current, peak = tracemalloc.get_traced_memory()
+        else:
+            last = self._last_snapshot
+            current, peak = self._traced
+        differences = last.compare_to(self._first_snapshot, 'lineno')
+        top = [{
+            'location': f'{stat.traceback[0].filename}:{stat.traceback[0].lineno}',
+            'size_kb': stat.size / 1024,
+            'size_diff_kb': stat.size_diff / 1024,
+            'count_diff': stat.count_diff,
+        } for stat in differences[:self.top]]
+        return {'current_kb': current / 1024, 'peak_kb': peak / 1024, 'top_allocations': top}
+
+    def stats(self):
+        '''
+        JSON-ready {'elapsed_ms', 'phases': {name: calls, total_ms, mean_us}, 'memory' (with trace_memory)}
+        '''
+
+        elapsed = self.elapsed
+        if self.running:
+            elapsed += time.perf_counter_ns() - self._start_time
+
+        phases = {}
+        for name in self.phases:
+            calls = self.calls[name]
+            phases[name] = {
+                'calls': calls,
+                'total_ms': self.times[name] / 1e6,
+                'mean_us': self.times[name] / calls / 1e3 if calls else 0.0,
+            }
+        stats = {'elapsed_ms': elapsed / 1e6, 'phases': phases}
+        if self.trace_memory and self._first_snapshot is not None and (self.running or self._last_snapshot is not None):
+            stats['memory'] = self.get_memory_stats()
+        return stats
+
+def print_stats(stats):
+    '''
+    print a table of PhaseProfiler.stats()
+    '''
+
+    print(f"\n {'phase':<22}{'calls':>10}{'total ms':>12}{'mean us':>10}")
+    print(" " + "-"*54)
+    for name, phase in stats['phases'].items():
+        if phase['calls']:
+            print(f" {name:<22}{phase['calls']:>10}{phase['total_ms']:>12.2f}{phase['mean_us']:>10.2f}")
+    print(f"\n {stats['elapsed_ms']:.1f} ms profiled (times are inclusive of nested phases)")
+
+    memory = stats.get('memory')
+    if memory:
+        print(f"\n traced memory: {memory['current_kb']:.1f} KiB now, {memory['peak_kb']:.1f} KiB peak")
+        print(f" {'allocated since start':<60}{'KiB':>10}{'blocks':>10}")
+        for allocation in memory['top_allocations']:
+            print(f" {allocation['location'][-60:]:<60}{allocation['size_diff_kb']:>10.1f}{allocation['count_diff']:>10}")
+
+if __name__ == '__main__':
+    import numpy as np
+    from bm_multi_env import Game
+
+    parser = argparse.ArgumentParser(description='Profile the phases of Game.step over random-action games')
+    parser.add_argument('--size', default='11x13', help='board size as ROWSxCOLS')
+    parser.add_argument('--players', type=int, default=2)
+    parser.add_argument('--steps', type=int, default=20000)
+    parser.add_argument('--memory', action='store_true', help='also trace allocations with tracemalloc')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rows, cols = (int(n) for n in args.size.lower().split('x'))
+    rng = np.random.default_rng(args.seed)
+    player_actions = rng.choice(6, size=(args.steps, args.players), p=[0.1, 0.2, 0.2, 0.2, 0.2, 0.1]).tolist()
+
+    env = Game(rows, cols, seed=args.seed)
+    with env.profile(trace_memory=args.memory):
+        env.reset(args.players)
+        for actions in player_actions:
+            env.step(actions)
+            if env.done:
+                env.reset(args.players)
+    print_stats(env.stats())
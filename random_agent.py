@@ -4,9 +4,18 @@ RANDOM AGENT
 
 import random
 
-def agent(state, done, bombs, turn, player):
+from agent_api import Agent, agent_function
+
+class RandomAgent(Agent):
 
 	name = "random bot"
-	actions = [0,1,2,3,4,5]
-	action = random.choice(actions)
-	return action, name
\ No newline at end of file
+
+	def act(self, observation):
+		actions = [0,1,2,3,4,5]
+		action = random.choice(actions)
+		return action
+
+AGENT_CLASS = RandomAgent
+
+# the original agent(state, done, bombs, turn, player) interface
+agent = agent_function(RandomAgent)
\ No newline at end of file
@@ -0,0 +1,197 @@
+'''
+REPLAYS
+
+Records games to a compact binary file and re-simulates them to any turn.
+
+A replay holds the board size, the bomb rules (see Game.__init__), the map
+seed (if the episode was reset with one), every turn's actions at 4 bits per action and keyframes of the full
+game state every `keyframe_interval` turns (the board packed at 4 bits per
+tile, or 8 with more than 5 players, plus the player and bomb arrays). Game.step is deterministic, so any
+turn is rebuilt by restoring the nearest earlier keyframe and replaying the
+actions from there. A 200-turn game on an 11x13 board takes about 600 bytes.
+
+usage:
+    state, players = env.reset(seed=7)
+    recorder = ReplayRecorder(env) # records every env.step from here on
+    ...
+    recorder.save('game.bmr')
+
+    replay = Replay.load('game.bmr')
+    env = replay.game_at(120)
+'''
+
+import bisect
+import struct
+import numpy as np
+
+from bm_multi_env import Game, get_tile_bits, unpack_board
+
+MAGIC = b'BMRP'
+VERSION = 2 # version 1 replays (without bomb rules) are still read
+KEYFRAME_INTERVAL = 100 # turns between keyframes
+
+# magic, version, rows, cols, num players, state size, map seed (-1 if unknown),
+# keyframe interval, number of turns, number of keyframes
+HEADER = struct.Struct('<4sBHHBHqIII')
+# bombs per player, blast radius, chain reactions (version 2 on)
+RULES = struct.Struct('<BBB')
+# turn and done flag at the start of a keyframe
+KEYFRAME_HEADER = struct.Struct('<IB')
+
+def pack_actions(player_actions):
+    '''
+    pack a (turns, num_players) array of actions (0-5) into 4 bits per action
+    '''
+
+    flat = np.asarray(player_actions, dtype=np.uint8).reshape(-1)
+    if flat.size % 2:
+        flat = np.append(flat, np.uint8(0))
+    return ((flat[0::2] << 4) | flat[1::2]).tobytes()
+
+def unpack_actions(data, num_turns, num_players):
+    packed = np.frombuffer(data, dtype=np.uint8)
+    flat = np.empty(2 * packed.size, dtype=np.uint8)
+    flat[0::2] = packed >> 4
+    flat[1::2] = packed & 0x0F
+    return flat[:num_turns * num_players].reshape(num_turns, num_players)
+
+class ReplayRecorder():
+
+    def __init__(self, game, keyframe_interval=KEYFRAME_INTERVAL):
+        '''
+        start recording game from its current position (usually right after reset):
+        game.step is wrapped on this instance until detach is called
+        '''
+
+        self.game = game
+        self.keyframe_interval = keyframe_interval
+        self.map_seed = game.map_seed
+        self.actions = []
+        self.keyframes = []
+        self.add_keyframe()
+
+        self._step = game.step
+        game.step = self.step
+
+    def step(self, player_actions):
+        game = self.game
+        # steps simulated inside make_move (e.g. by a search) aren't part of the game
+        if game.undo_log is None:
+            if self.keyframe_interval and self.actions and len(self.actions) % self.keyframe_interval == 0:
+                self.add_keyframe()
+            self.actions.append([int(action) for action in player_actions])
+        return self._step(player_actions)
+
+    def add_keyframe(self):
+        game = self.game
+        self.keyframes.append(KEYFRAME_HEADER.pack(len(self.actions), int(game.done))
+            + game.packed_board().tobytes() + game.state.astype(np.int32).tobytes())
+
+    def detach(self):
+        '''
+        stop recording and restore the game's own step method
+        '''
+        if self.game.__dict__.get('step') == self.step:
+            del self.game.step
+
+    def to_bytes(self):
+        game = self.game
+        header = HEADER.pack(MAGIC, VERSION, game.rows, game.cols, game.num_players, game.state.size,
+            -1 if self.map_seed is None else self.map_seed, self.keyframe_interval or 0,
+            len(self.actions), len(self.keyframes))
+        rules = RULES.pack(game.max_bombs, game.blast_radius, int(game.chain_reactions))
+        actions = np.array(self.actions, dtype=np.uint8).reshape(-1, game.num_players)
+        return header + rules + pack_actions(actions) + b''.join(self.keyframes)
+
+    def save(self, path):
+        with open(path, 'wb') as f:
+            f.write(self.to_bytes())
+
+class Replay():
+
+    def __init__(self, data):
+        '''
+        parse a replay written by ReplayRecorder
+        '''
+
+        (magic, version, self.rows, self.cols, self.num_players, state_size, map_seed,
+            self.keyframe_interval, num_turns, num_keyframes) = HEADER.unpack_from(data)
+        if magic != MAGIC:
+            raise ValueError('not a replay file')
+        if version not in (1, VERSION):
+            raise ValueError(f'unsupported replay version {version}')
+        self.map_seed = None if map_seed < 0 else map_seed
+
+        offset = HEADER.size
+        if version >= 2:
+            self.max_bombs, self.blast_radius, chain_reactions = RULES.unpack_from(data, offset)
+            self.chain_reactions = bool(chain_reactions)
+            offset += RULES.size
+        else:
+            self.max_bombs, self.blast_radius, self.chain_reactions = Game.MAX_BOMBS, 1, False
+        num_action_bytes = (num_turns * self.num_players + 1) // 2
+        self.actions = unpack_actions(data[offset:offset+num_action_bytes], num_turns, self.num_players)
+        offset += num_action_bytes
+
+        self.tile_bits = get_tile_bits(self.num_players)
+        num_board_bytes = (self.rows * self.cols * self.tile_bits + 7) // 8
+        keyframe_size = KEYFRAME_HEADER.size + num_board_bytes + 4 * state_size
+        self.keyframes = []
+        self.keyframe_turns = []
+        for _ in range(num_keyframes):
+            turn, done = KEYFRAME_HEADER.unpack_from(data, offset)
+            start = offset + KEYFRAME_HEADER.size
+            board = np.frombuffer(data, dtype=np.uint8, count=num_board_bytes, offset=start)
+            state = np.frombuffer(data, dtype=np.int32, count=state_size, offset=start + num_board_bytes)
+            self.keyframe_turns.append(turn)
+            self.keyframes.append((done, board, state))
+            offset += keyframe_size
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as f:
+            return cls(f.read())
+
+    @property
+    def num_turns(self):
+        return len(self.actions)
+
+    def game_at(self, turn, game=None):
+        '''
+        Game in the position before `turn` is played (turn=num_turns gives the final position),
+        rebuilt from the nearest keyframe. Pass a Game of the same size and rules to reuse it.
+        '''
+
+        if not 0 <= turn <= self.num_turns:
+            raise IndexError(f'turn {turn} out of range (0-{self.num_turns})')
+        if game is None:
+            game = Game(self.rows, self.cols, max_bombs=self.max_bombs,
+                blast_radius=self.blast_radius, chain_reactions=self.chain_reactions)
+
+        index = bisect.bisect_right(self.keyframe_turns, turn) - 1
+        keyframe_turn = self.keyframe_turns[index]
+        done, board, state = self.keyframes[index]
+
+        snapshot = np.empty(2 + self.rows * self.cols + state.size, dtype=np.int64)
+        snapshot[0] = done
+        snapshot[1] = self.num_players
+        snapshot[2:2+self.rows*self.cols] = unpack_board(board, self.rows, self.cols, bits=self.tile_bits).reshape(-1)
+        snapshot[2+self.rows*self.cols:] = state
+        game.restore(snapshot)
+        game.map_seed = self.map_seed
+
+        for player_actions in self.actions[keyframe_turn:turn].tolist():
+            game.step(player_actions)
+
+        return game
+
+    def states(self):
+        '''
+        iterate over (turn, board) for every position of the game, starting with the first
+        '''
+
+        game = self.game_at(0)
+        yield 0, game.board.copy()
+        for turn, player_actions in enumerate(self.actions.tolist()):
+            game.step(player_actions)
+            yield turn + 1, game.board.copy()
@@ -0,0 +1,224 @@
+'''
+ROLLOUT AGENT
+
+Monte Carlo search: for each of our valid actions, plays many short games
+(rollouts) from the current position, starting with that action and
+continuing with a fast policy for both players (random valid moves, or
+flee_agent). It plays the action with the best mean outcome.
+
+A rollout's outcome is our score change under the game's own REWARDS_DICT
+(blocks destroyed, invalid moves, and being hit), plus d_rewards['WIN_GAME']
+if an opponent was hit and we weren't. Every other player on the board is
+an opponent.
+
+Rollouts run on a pool of worker processes that persists across turns and
+games. Every turn, each worker gets a snapshot of the position and
+restores it into a Game it keeps, for every rollout, cycling through our
+actions until the turn's deadline. The number of rollouts per turn, and
+with it the agent's strength, grows with the number of workers. Agents
+release the pool with close() (tournament.run_pairing calls it), and it
+shuts down once no agent uses it. In a daemonic process, such as an
+agent_worker.AgentProcess, no pool can be started, so the rollouts run in
+the agent's own process.
+'''
+
+import atexit
+import math
+import multiprocessing
+import os
+import random
+import time
+import warnings
+from concurrent.futures import ProcessPoolExecutor, wait
+
+from agent_api import Agent, Observation, agent_function, load_agent
+from bm_multi_env import Game, actions, d_rewards
+from search_agent import build_game, get_actions
+
+TIME_BUDGET = 0.1 # seconds per turn
+HORIZON = 10 # turns per rollout
+MAX_ROLLOUTS = 2000 # per turn, over all actions and workers
+ROLLOUT_POLICY = 'random' # or 'flee'
+WORKERS = None # worker processes (default: all cores)
+
+########################
+###  WORKER PROCESS  ###
+########################
+
+# per-process games and policy agents, kept across turns and games
+worker_games = {}
+worker_agents = {}
+
+def get_worker_game(rows, cols, rules):
+	key = (rows, cols, tuple(sorted(rules.items())))
+	if key not in worker_games:
+		worker_games[key] = Game(rows, cols, **rules)
+	return worker_games[key]
+
+def get_worker_agent(policy, rows, cols, number):
+	key = (policy, rows, cols, number)
+	if key not in worker_agents:
+		agent = load_agent(f'{policy}_agent')
+		agent.setup(rows, cols, number)
+		worker_agents[key] = agent
+	return worker_agents[key]
+
+def choose_action(game, number, policy, rng, bomb_list, turn):
+	if policy == 'random':
+		return rng.choice(get_actions(game, number))
+	agent = get_worker_agent(policy, game.rows, game.cols, number)
+	return agent.act(Observation(game.board, game.done, bomb_list, turn, game.players[number], game.get_danger_map()))
+
+def run_rollouts(snapshot, rows, cols, rules, me, first_actions, policy, horizon, max_rollouts, deadline, seed):
+	'''
+	play rollouts from a snapshot, cycling through first_actions, until
+	max_rollouts or the deadline (a time.time() value)
+	rules: the game's bomb rules (Game.get_rules)
+	returns {action: (sum of outcomes, number of rollouts)}
+	'''
+
+	game = get_worker_game(rows, cols, rules)
+	rng = random.Random(seed)
+	saved_random = random.getstate() # put back for the runner when rollouts run in its process
+	random.seed(seed) # for the policy agents
+	results = {action: [0, 0] for action in first_actions}
+
+	for count in range(max_rollouts):
+		if time.time() > deadline:
+			break
+		action = first_actions[count % len(first_actions)]
+		game.restore(snapshot)
+		score = game.player_scores.item(me)
+
+		bomb_list = []
+		for turn in range(horizon):
+			player_actions = [choose_action(game, number, policy, rng, bomb_list, turn) for number in range(game.num_players)]
+			if turn == 0:
+				player_actions[me] = action
+			_, done, _, bomb_list = game.step(player_actions)
+			if done:
+				break
+
+		outcome = game.player_scores.item(me) - score
+		# the game ends when a player is hit, and a player that was hit is no longer on the board
+		if game.done and me in game.player_at.values():
+			outcome += d_rewards['WIN_GAME']
+		results[action][0] += outcome
+		results[action][1] += 1
+
+	random.setstate(saved_random)
+	return {action: tuple(result) for action, result in results.items()}
+
+########################
+###   RUNNER SIDE    ###
+########################
+
+# worker pools shared by the RolloutAgents in this process, by size: [pool, agents using it]
+pools = {}
+
+def get_pool(workers=WORKERS):
+	'''
+	(pool, number of workers) for an agent; release it with release_pool
+	'''
+
+	workers = workers or os.cpu_count()
+	if workers not in pools:
+		pools[workers] = [ProcessPoolExecutor(max_workers=workers), 0]
+	pools[workers][1] += 1
+	return pools[workers][0], workers
+
+def release_pool(workers):
+	'''
+	an agent is done with its pool, shut it down if no other agent uses it
+	'''
+
+	entry = pools[workers]
+	entry[1] -= 1
+	if entry[1] == 0:
+		entry[0].shutdown(cancel_futures=True)
+		del pools[workers]
+
+def shutdown_pools():
+	for pool, _ in pools.values():
+		pool.shutdown(cancel_futures=True)
+	pools.clear()
+
+# for agents that are never closed, e.g. through the agent(...) function
+atexit.register(shutdown_pools)
+
+class RolloutAgent(Agent):
+
+	name = "rollout bot"
+
+	def __init__(self, policy=ROLLOUT_POLICY, horizon=HORIZON, time_budget=TIME_BUDGET, max_rollouts=MAX_ROLLOUTS, workers=WORKERS):
+		self.policy = policy
+		self.horizon = horizon
+		self.time_budget = time_budget
+		self.max_rollouts = max_rollouts
+		self.workers = workers
+		self.rng = random.Random()
+		self.rollouts = 0 # rollouts played on the last turn
+		self.pool = None
+		self.num_workers = 0 # 0: rollouts run in this process
+
+	def setup(self, rows, cols, player_number):
+		super().setup(rows, cols, player_number)
+		if self.pool is not None:
+			return
+		if multiprocessing.current_process().daemon:
+			# shown once per process by the default warnings filter
+			warnings.warn('daemonic processes can\'t start a rollout pool, running rollouts in this process')
+			return
+		self.pool, self.num_workers = get_pool(self.workers)
+
+	def close(self):
+		'''
+		release the worker pool (the agent starts using one again at its next setup)
+		'''
+
+		if self.pool is not None:
+			release_pool(self.num_workers)
+			self.pool = None
+			self.num_workers = 0
+
+	def act(self, observation):
+		game = build_game(observation.state, observation.bombs, observation.player)
+		if game is None:
+			return actions.NONE
+		me = self.player_number
+		valid_actions = get_actions(game, me)
+		if len(valid_actions) == 1:
+			return valid_actions[0]
+
+		snapshot = game.snapshot()
+		deadline = time.time() + self.time_budget
+		if self.pool is None:
+			results = [run_rollouts(snapshot, game.rows, game.cols, game.get_rules(), me, valid_actions, self.policy,
+				self.horizon, self.max_rollouts, deadline, self.rng.getrandbits(32))]
+		else:
+			# every worker cycles through all the actions, so each gets a share of every core
+			rollouts_per_worker = math.ceil(self.max_rollouts / self.num_workers)
+			futures = [self.pool.submit(run_rollouts, snapshot, game.rows, game.cols, game.get_rules(), me, valid_actions, self.policy,
+				self.horizon, rollouts_per_worker, deadline, self.rng.getrandbits(32)) for _ in range(self.num_workers)]
+			finished, late = wait(futures, timeout=self.time_budget * 1.5)
+			for future in late:
+				future.cancel()
+			results = [future.result() for future in finished]
+
+		totals = {action: [0, 0] for action in valid_actions}
+		for result in results:
+			for action, (outcome, count) in result.items():
+				totals[action][0] += outcome
+				totals[action][1] += count
+		self.rollouts = sum(count for _, count in totals.values())
+
+		means = {action: outcome / count for action, (outcome, count) in totals.items() if count}
+		if not means:
+			return actions.NONE
+		best = max(means.values())
+		return self.rng.choice([action for action, mean in means.items() if mean == best])
+
+AGENT_CLASS = RolloutAgent
+
+# the original agent(state, done, bombs, turn, player) interface
+agent = agent_function(RolloutAgent)
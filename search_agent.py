@@ -0,0 +1,369 @@
+'''
+SEARCH AGENT
+
+Looks several turns ahead with a depth-limited alpha-beta search over both
+players' actions, using the real Game as its forward model: every step is
+applied with Game.make_move and reverted with Game.unmake_move.
+We choose our action to maximize, assuming the opponents answer with the
+actions that are worst for us. Only the nearest opponents' replies are searched
+(every combination of their actions, so the search gets shallower with each);
+the others are assumed to stand still.
+
+Positions are identified by a Zobrist hash of the board plus bomb timers,
+updated incrementally from the board writes in each step's undo log. Searched
+positions are kept in a bounded transposition table that persists across
+turns, and the search deepens iteratively until the turn's time budget runs
+out, returning the best move of the deepest completed search.
+'''
+
+import itertools
+import time
+import numpy as np
+
+from agent_api import Agent, agent_function
+from bm_multi_env import MAX_PLAYERS, Game, actions
+
+TIME_BUDGET = 0.1 # seconds per turn
+MAX_DEPTH = 8 # deepest search (in full turns)
+TABLE_SIZE = 2**16 # transposition table entries
+SEARCHED_OPPONENTS = 2 # nearest opponents whose replies are searched (up to 6**2 replies per move)
+
+# leaf evaluation weights
+DANGER_PENALTY = 100 # standing in range of a bomb that is about to explode
+BLOCK_BONUS = 0.5 # soft blocks in range of a live bomb we own
+
+EXACT, LOWER, UPPER = 0, 1, 2
+
+class SearchTimeout(Exception):
+	pass
+
+class ZobristHash():
+	'''
+	random 64-bit keys for every (tile, board value) and every (tile, owner, timer)
+	of a bomb. A position's hash is the XOR of the keys of its contents.
+	'''
+
+	def __init__(self, rows, cols, seed=0):
+		rng = np.random.default_rng(seed)
+		num_tiles = rows * cols
+		self.cols = cols
+		self.tile_keys = rng.integers(1, 2**63, size=(num_tiles, len(Game.BOARD_DICT)), dtype=np.int64).tolist()
+		self.bomb_keys = rng.integers(1, 2**63, size=(num_tiles, MAX_PLAYERS, Game.MAX_TIMER + 1), dtype=np.int64).tolist()
+
+	def hash_bombs(self, game):
+		h = 0
+		timers = game.bomb_timers.tolist()
+		owners = game.bomb_owners.tolist()
+		for slot, tile in enumerate(game.bomb_tiles.tolist()):
+			if game.bomb_active[slot]:
+				h ^= self.bomb_keys[tile][owners[slot]][timers[slot]]
+		return h
+
+	def hash_game(self, game):
+		h = 0
+		for tile, value in enumerate(game.board.reshape(-1).tolist()):
+			h ^= self.tile_keys[tile][value]
+		return h ^ self.hash_bombs(game)
+
+	def update(self, h, board, changed_tiles, old_bomb_hash, new_bomb_hash):
+		'''
+		hash of a position reached in one step, touching only the tiles written
+		changed_tiles: (flat tile, old value) pairs from the step's undo log
+		'''
+
+		old_values = {}
+		for tile, value in changed_tiles:
+			old_values.setdefault(tile, value)
+		flat_board = board.reshape(-1)
+		for tile, value in old_values.items():
+			new_value = flat_board[tile]
+			if new_value != value:
+				h ^= self.tile_keys[tile][value] ^ self.tile_keys[tile][new_value]
+		return h ^ old_bomb_hash ^ new_bomb_hash
+
+class TranspositionTable():
+	'''
+	fixed number of slots indexed by hash. A slot is replaced by a search of equal
+	or greater depth, or by any search once its entry is from an earlier turn.
+	'''
+
+	def __init__(self, size=TABLE_SIZE):
+		self.size = size
+		self.keys = [None] * size
+		self.entries = [None] * size
+		self.generation = 0
+
+	def new_turn(self):
+		self.generation += 1
+
+	def get(self, h):
+		slot = h % self.size
+		if self.keys[slot] == h:
+			return self.entries[slot]
+		return None
+
+	def put(self, h, depth, value, flag, best_action):
+		slot = h % self.size
+		entry = self.entries[slot]
+		if entry is None or entry[4] != self.generation or depth >= entry[0] or self.keys[slot] == h:
+			self.keys[slot] = h
+			self.entries[slot] = (depth, value, flag, best_action, self.generation)
+
+########################
+###  FORWARD MODEL   ###
+########################
+
+def find_player(state, number):
+	player_code = Game.BOARD_DICT[Game.PLAYER_LIST[number]]
+	on_bomb_code = Game.BOARD_DICT[Game.ON_BOMB_LIST[number]]
+	tiles = np.flatnonzero((state == player_code) | (state == on_bomb_code))
+	if tiles.size == 0:
+		return None
+	return divmod(int(tiles[0]), state.shape[1])
+
+def build_game(state, bombs, player):
+	'''
+	rebuild a Game from what the agent can observe, with every player on the board
+	and the bomb rules of the player's game
+	(opponent scores are unknown, so only score changes are used in the search)
+	'''
+
+	game = Game(state.shape[0], state.shape[1], state.dtype, **player.game.get_rules())
+	game.board = state.copy()
+	game.done = False
+	# players are numbered from 0, and a game ends when the first one is hit
+	num_players = max(list(game.player_at.values()) + [player.number, 1]) + 1
+	game.init_arrays(num_players)
+
+	for number in range(game.num_players):
+		if number == player.number:
+			position = player.position
+		else:
+			position = find_player(state, number)
+			if position is None:
+				return None
+		game.players[number].position = position
+	game.player_prev_tiles[:] = game.player_tiles
+	game.player_num_bombs[:] = game.max_bombs
+
+	for bomb in bombs:
+		number = bomb.owned_by
+		slot = next(slot for slot in game.player_slots[number] if not game.bomb_active[slot])
+		game.bomb_tiles[slot] = bomb.position[0] * game.cols + bomb.position[1]
+		game.bomb_timers[slot] = bomb.timer
+		game.bomb_active[slot] = True
+		game.bomb_exploded[slot] = bomb.recently_exploded
+		if not bomb.recently_exploded:
+			game.player_num_bombs[number] -= 1
+	game.index_bombs()
+
+	return game
+
+def get_actions(game, number):
+	'''
+	actions that aren't penalized as invalid moves
+	'''
+
+	tile = game.player_tiles.item(number)
+	valid_actions = [actions.NONE]
+	if game.player_num_bombs[number] > 0:
+		valid_actions.append(actions.BOMB)
+	for action in (actions.LEFT, actions.RIGHT, actions.UP, actions.DOWN):
+		if game.check_if_valid(action, tile, game.move_table[tile][action]):
+			valid_actions.append(action)
+	return valid_actions
+
+########################
+###     SEARCH       ###
+########################
+
+class Search():
+
+	def __init__(self, rows, cols):
+		self.zobrist = ZobristHash(rows, cols)
+		self.table = TranspositionTable()
+		self.deadline = None
+		self.nodes = 0
+
+	def evaluate(self, game):
+		'''
+		static value of a position for us: danger from live bombs and blocks our bombs will destroy
+		'''
+
+		value = 0
+		board = game.board.reshape(-1)
+		my_tile = game.player_tiles.item(self.me)
+		opponent_tiles = [game.player_tiles.item(opponent) for opponent in self.opponents]
+		for slot in range(len(game.bomb_views)):
+			if not game.bomb_active[slot] or game.bomb_exploded[slot]:
+				continue
+			tiles = game.get_tiles_in_range(game.bomb_tiles.item(slot))
+			urgency = (Game.MAX_TIMER + 1 - game.bomb_timers.item(slot)) / Game.MAX_TIMER
+			if my_tile in tiles:
+				value -= DANGER_PENALTY * urgency
+			for opponent_tile in opponent_tiles:
+				if opponent_tile in tiles:
+					value += DANGER_PENALTY * urgency
+			if game.bomb_owners[slot] == self.me:
+				value += BLOCK_BONUS * sum(board[tile] == Game.BOARD_DICT['soft_block'] for tile in tiles)
+		return value
+
+	def get_score_difference(self):
+		scores = self.game.player_scores.tolist()
+		return scores[self.me] - sum(scores[opponent] for opponent in self.opponents)
+
+	def max_node(self, h, bomb_hash, depth, alpha, beta):
+		'''
+		value of a position for us (future score gain, relative to this position)
+		'''
+
+		self.nodes += 1
+		if time.perf_counter() > self.deadline:
+			raise SearchTimeout()
+
+		game = self.game
+		if game.done:
+			return 0
+		if depth == 0:
+			return self.evaluate(game)
+
+		alpha_start = alpha
+		entry = self.table.get(h)
+		tt_action = None
+		if entry is not None:
+			entry_depth, value, flag, tt_action, _ = entry
+			if entry_depth >= depth:
+				if flag == EXACT:
+					return value
+				if flag == LOWER:
+					alpha = max(alpha, value)
+				elif flag == UPPER:
+					beta = min(beta, value)
+				if alpha >= beta:
+					return value
+
+		my_actions = get_actions(game, self.me)
+		if tt_action in my_actions:
+			my_actions.remove(tt_action)
+			my_actions.insert(0, tt_action)
+		opponent_actions = self.get_replies(game)
+
+		best_value = -float('inf')
+		best_action = my_actions[0]
+		for action in my_actions:
+			value = self.min_node(h, bomb_hash, action, opponent_actions, depth, alpha, beta)
+			if value > best_value:
+				best_value = value
+				best_action = action
+			alpha = max(alpha, best_value)
+			if alpha >= beta:
+				break
+
+		if best_value <= alpha_start:
+			flag = UPPER
+		elif best_value >= beta:
+			flag = LOWER
+		else:
+			flag = EXACT
+		self.table.put(h, depth, best_value, flag, best_action)
+
+		return best_value
+
+	def get_replies(self, game):
+		'''
+		every combination of the searched opponents' actions
+		'''
+
+		replies = []
+		for reply in itertools.product(*(get_actions(game, opponent) for opponent in self.searched)):
+			if time.perf_counter() > self.deadline:
+				raise SearchTimeout()
+			replies.append(reply)
+		return replies
+
+	def min_node(self, h, bomb_hash, action, opponent_actions, depth, alpha, beta):
+		'''
+		value of our action against the opponents' best reply
+		(opponent_actions: one action for each searched opponent per reply, the others play NONE)
+		'''
+
+		game = self.game
+		difference = self.get_score_difference()
+
+		worst_value = float('inf')
+		for reply in opponent_actions:
+			player_actions = [actions.NONE] * game.num_players
+			player_actions[self.me] = action
+			for opponent, opponent_action in zip(self.searched, reply):
+				player_actions[opponent] = opponent_action
+
+			game.make_move(player_actions)
+			try:
+				child_bomb_hash = self.zobrist.hash_bombs(game)
+				child_hash = self.zobrist.update(h, game.board, game.last_move_tiles(), bomb_hash, child_bomb_hash)
+				# our score change minus the opponents' over this step
+				gain = self.get_score_difference() - difference
+				value = gain + self.max_node(child_hash, child_bomb_hash, depth - 1, alpha - gain, min(beta, worst_value) - gain)
+			finally:
+				game.unmake_move()
+
+			worst_value = min(worst_value, value)
+			if worst_value <= alpha:
+				break
+
+		return worst_value
+
+	def get_best_action(self, game, me, time_budget=TIME_BUDGET, max_depth=MAX_DEPTH):
+		'''
+		iterative deepening: search one turn deeper each time until the budget runs out
+		'''
+
+		self.game = game
+		self.me = me
+		self.opponents = [number for number in range(game.num_players) if number != me]
+		# the opponents nearest us at the start of the turn (by walking distance, ignoring walls)
+		row, col = divmod(game.player_tiles.item(me), game.cols)
+		def distance(opponent):
+			opponent_row, opponent_col = divmod(game.player_tiles.item(opponent), game.cols)
+			return abs(opponent_row - row) + abs(opponent_col - col)
+		self.searched = sorted(self.opponents, key=distance)[:SEARCHED_OPPONENTS]
+		self.deadline = time.perf_counter() + time_budget
+		self.nodes = 0
+		self.table.new_turn()
+
+		root_hash = self.zobrist.hash_game(game)
+		bomb_hash = self.zobrist.hash_bombs(game)
+
+		best_action = actions.NONE
+		self.depth = 0
+		for depth in range(1, max_depth + 1):
+			try:
+				self.max_node(root_hash, bomb_hash, depth, -float('inf'), float('inf'))
+			except SearchTimeout:
+				break
+			entry = self.table.get(root_hash)
+			if entry is not None:
+				best_action = entry[3]
+			self.depth = depth
+
+		return best_action
+
+class SearchAgent(Agent):
+
+	name = "search bot"
+
+	def setup(self, rows, cols, player_number):
+		super().setup(rows, cols, player_number)
+		# the search (and its transposition table) is kept across turns
+		self.search = Search(rows, cols)
+
+	def act(self, observation):
+		game = build_game(observation.state, observation.bombs, observation.player)
+		if game is None:
+			return actions.NONE
+		return self.search.get_best_action(game, self.player_number)
+
+AGENT_CLASS = SearchAgent
+
+# the original agent(state, done, bombs, turn, player) interface
+agent = agent_function(SearchAgent)
@@ -0,0 +1,413 @@
+'''
+SELF-PLAY DATASETS
+
+Records (state, action, reward, done) transitions from Game episodes between
+any agents, and reads them back in shuffled batches for training.
+
+One record per step: the board before the step (packed at 4 bits per tile,
+or 8 with more than 5 players), the Game's entity state (players and bombs,
+see Game.init_arrays), every player's action and reward (score change) for
+the step, whether the step ended the game, and the episode and turn numbers.
+
+TransitionRecorder wraps a game's step (like ReplayRecorder) and copies each
+step into an in-memory chunk. Full chunks go to a ShardWriter, whose
+background thread packs them and writes them into fixed-size memory-mapped
+.npy shards, so the simulation never waits on the disk. index.json lists
+the shards and how many records each holds, and is rewritten after every
+shard, so a dataset is readable up to its last finished shard even if
+generation is interrupted.
+
+SelfPlayDataset memory-maps the shards and reads only the records it
+returns. batches() shuffles lazily: it visits the shards in random order,
+a few at a time, and draws batches in random order from the records of
+those shards.
+
+usage:
+    python selfplay_dataset.py flee_agent lookahead_agent --episodes 1000 --size 11x13 --out data/selfplay
+
+    dataset = SelfPlayDataset('data/selfplay')
+    for batch in dataset.batches(256, seed=0):
+        batch['board'], batch['actions'], batch['rewards'], batch['done']
+'''
+
+import argparse
+import bisect
+import json
+import os
+import queue
+import random
+import threading
+import numpy as np
+
+from bm_multi_env import BOARD_DTYPE, Game, get_tile_bits, pack_board, unpack_board
+from tournament import MAX_TURNS, play_match
+
+INDEX_FILE = 'index.json'
+SHARD_SIZE = 2**16 # records per shard
+CHUNK_SIZE = 1024 # records handed to the writer thread at once
+MAX_PENDING = 64 # chunks queued for the writer before the simulation waits
+SHARDS_PER_BLOCK = 4 # shards shuffled together by SelfPlayDataset.batches
+
+def get_record_dtype(rows, cols, num_players, state_size):
+    '''
+    structured dtype of one record in a shard
+    '''
+
+    board_bytes = (rows * cols * get_tile_bits(num_players) + 7) // 8
+    return np.dtype([
+        ('board', np.uint8, (board_bytes,)),
+        ('state', np.int32, (state_size,)),
+        ('actions', np.uint8, (num_players,)),
+        ('rewards', np.int32, (num_players,)),
+        ('done', np.bool_),
+        ('episode', np.uint32),
+        ('turn', np.uint32),
+    ])
+
+def write_json(path, data):
+    # write to a temporary file first, so readers never load a partial index
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp_path, path)
+
+########################
+###     WRITING      ###
+########################
+
+class ShardWriter():
+
+    def __init__(self, directory, rows, cols, num_players, state_size, shard_size=SHARD_SIZE,
+                 max_pending=MAX_PENDING, metadata=None):
+        '''
+        write records to directory/shard_00000.npy, ... on a background thread
+        metadata: extra JSON-ready fields for the index (e.g. the agents' names)
+        '''
+
+        self.directory = directory
+        self.rows = rows
+        self.cols = cols
+        self.num_players = num_players
+        self.state_size = state_size
+        self.shard_size = shard_size
+        self.tile_bits = get_tile_bits(num_players)
+        self.dtype = get_record_dtype(rows, cols, num_players, state_size)
+        os.makedirs(directory, exist_ok=True)
+
+        self.index = {
+            'rows': rows,
+            'cols': cols,
+            'num_players': num_players,
+            'state_size': state_size,
+            'tile_bits': self.tile_bits,
+            'shard_size': shard_size,
+            'num_records': 0,
+            'shards': [], # {'file', 'count'}
+            'metadata': metadata or {},
+        }
+
+        self.shard = None # memory-mapped shard being filled
+        self.shard_count = 0
+        self.error = None
+        self.closed = False
+        self.queue = queue.Queue(maxsize=max_pending)
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def put(self, chunk, count):
+        '''
+        queue the first count records of a chunk (see new_chunk); the chunk
+        belongs to the writer from here on
+        '''
+
+        if self.error is not None:
+            raise RuntimeError('dataset writer failed') from self.error
+        if count:
+            self.queue.put((chunk, count))
+
+    def new_chunk(self, size=CHUNK_SIZE):
+        '''
+        unpacked record arrays for the simulation to fill
+        '''
+
+        return {
+            'board': np.empty((size, self.rows, self.cols), dtype=BOARD_DTYPE),
+            'state': np.empty((size, self.state_size), dtype=np.int32),
+            'actions': np.empty((size, self.num_players), dtype=np.uint8),
+            'rewards': np.empty((size, self.num_players), dtype=np.int32),
+            'done': np.empty(size, dtype=np.bool_),
+            'episode': np.empty(size, dtype=np.uint32),
+            'turn': np.empty(size, dtype=np.uint32),
+        }
+
+    def run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                break
+            if self.error is not None:
+                continue # drain the queue so put never blocks
+            try:
+                self.write(*item)
+            except Exception as error:
+                self.error = error
+
+    def write(self, chunk, count):
+        records = np.empty(count, dtype=self.dtype)
+        records['board'] = pack_board(chunk['board'][:count], self.tile_bits)
+        for name in ('state', 'actions', 'rewards', 'done', 'episode', 'turn'):
+            records[name] = chunk[name][:count]
+
+        start = 0
+        while start < count:
+            if self.shard is None:
+                self.open_shard()
+            n = min(count - start, self.shard_size - self.shard_count)
+            self.shard[self.shard_count:self.shard_count+n] = records[start:start+n]
+            self.shard_count += n
+            start += n
+            if self.shard_count == self.shard_size:
+                self.finish_shard()
+
+    def get_shard_path(self, number):
+        return os.path.join(self.directory, f'shard_{number:05d}.npy')
+
+    def open_shard(self):
+        path = self.get_shard_path(len(self.index['shards']))
+        self.shard = np.lib.format.open_memmap(path, mode='w+', dtype=self.dtype, shape=(self.shard_size,))
+        self.shard_count = 0
+
+    def finish_shard(self):
+        '''
+        flush the shard being filled and add it to the index
+        (a partly filled last shard is rewritten at its real size)
+        '''
+
+        path = self.get_shard_path(len(self.index['shards']))
+        count = self.shard_count
+        self.shard.flush()
+        if count < self.shard_size:
+            records = np.array(self.shard[:count])
+            del self.shard
+            tmp_path = f'{path}.{os.getpid()}.tmp'
+            with open(tmp_path, 'wb') as f:
+                np.save(f, records)
+            os.replace(tmp_path, path)
+        self.shard = None
+        self.shard_count = 0
+
+        self.index['shards'].append({'file': os.path.basename(path), 'count': count})
+        self.index['num_records'] += count
+        write_json(os.path.join(self.directory, INDEX_FILE), self.index)
+
+    def close(self):
+        '''
+        write out everything queued, finish the last shard and stop the thread
+        '''
+
+        if self.closed:
+            return
+        self.closed = True
+        self.queue.put(None)
+        self.thread.join()
+        if self.error is None and self.shard is not None and self.shard_count:
+            self.finish_shard()
+        if self.error is not None:
+            raise RuntimeError('dataset writer failed') from self.error
+        if not self.index['shards']:
+            write_json(os.path.join(self.directory, INDEX_FILE), self.index)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class TransitionRecorder():
+
+    def __init__(self, game, writer, chunk_size=CHUNK_SIZE):
+        '''
+        record every step of game into writer from here on: game.step is
+        wrapped on this instance until detach is called
+        '''
+
+        self.game = game
+        self.writer = writer
+        self.chunk_size = chunk_size
+        self.episode = 0 # written into every record, set it when a new episode starts
+        self.chunk = writer.new_chunk(chunk_size)
+        self.count = 0
+
+        self._step = game.step
+        game.step = self.step
+
+    def step(self, player_actions):
+        game = self.game
+        # steps simulated inside make_move (e.g. by a search) aren't part of the game
+        if game.undo_log is not None:
+            return self._step(player_actions)
+
+        chunk = self.chunk
+        i = self.count
+        chunk['board'][i] = game.board
+        chunk['state'][i] = game.state
+        chunk['actions'][i] = player_actions
+        chunk['turn'][i] = game.tick
+        chunk['episode'][i] = self.episode
+        scores = game.player_scores.copy()
+
+        result = self._step(player_actions)
+
+        chunk['rewards'][i] = game.player_scores - scores
+        chunk['done'][i] = game.done
+        self.count = i + 1
+        if self.count == self.chunk_size:
+            self.flush()
+        return result
+
+    def flush(self):
+        '''
+        hand the records so far to the writer
+        '''
+
+        if self.count:
+            self.writer.put(self.chunk, self.count)
+            self.chunk = self.writer.new_chunk(self.chunk_size)
+            self.count = 0
+
+    def detach(self):
+        '''
+        flush and restore the game's own step method
+        '''
+
+        self.flush()
+        if self.game.__dict__.get('step') == self.step:
+            del self.game.step
+
+def generate(directory, agents, episodes, rows=11, cols=13, seed=0, max_turns=MAX_TURNS,
+             shard_size=SHARD_SIZE, **rules):
+    '''
+    play episodes between agents (one per player, anything load_agent accepts)
+    and write every step to a dataset in directory
+    rules: bomb rules passed to Game (max_bombs, blast_radius, chain_reactions)
+    returns the dataset's index
+    '''
+
+    random.seed(seed)
+    np.random.seed(seed % 2**32)
+    env = Game(rows, cols, seed=seed, **rules)
+    env.reset(len(agents))
+    names = [agent if isinstance(agent, str) else getattr(agent, 'name', str(agent)) for agent in agents]
+    metadata = {'agents': names, 'episodes': episodes, 'seed': seed, 'max_turns': max_turns,
+        'rules': env.get_rules()}
+
+    writer = ShardWriter(directory, rows, cols, len(agents), env.state.size, shard_size, metadata=metadata)
+    try:
+        recorder = TransitionRecorder(env, writer)
+        for episode in range(episodes):
+            recorder.episode = episode
+            play_match(env, agents, max_turns)
+        recorder.detach()
+    finally:
+        writer.close()
+    return writer.index
+
+########################
+###     READING      ###
+########################
+
+class SelfPlayDataset():
+
+    def __init__(self, directory):
+        with open(os.path.join(directory, INDEX_FILE)) as f:
+            self.index = json.load(f)
+        self.directory = directory
+        self.rows = self.index['rows']
+        self.cols = self.index['cols']
+        self.num_players = self.index['num_players']
+        self.tile_bits = self.index['tile_bits']
+        self.dtype = get_record_dtype(self.rows, self.cols, self.num_players, self.index['state_size'])
+        self.counts = [shard['count'] for shard in self.index['shards']]
+        self.offsets = np.cumsum([0] + self.counts).tolist() # first record of each shard
+        self._shards = {}
+
+    def __len__(self):
+        return self.offsets[-1]
+
+    def get_shard(self, number):
+        '''
+        memory-mapped records of one shard (opened on first use)
+        '''
+
+        shard = self._shards.get(number)
+        if shard is None:
+            path = os.path.join(self.directory, self.index['shards'][number]['file'])
+            shard = np.load(path, mmap_mode='r')[:self.counts[number]]
+            self._shards[number] = shard
+        return shard
+
+    def decode(self, records):
+        '''
+        dict of arrays from records, with the boards unpacked to (n, rows, cols)
+        '''
+
+        batch = {name: np.array(records[name]) for name in self.dtype.names if name != 'board'}
+        batch['board'] = unpack_board(records['board'], self.rows, self.cols, bits=self.tile_bits)
+        return batch
+
+    def __getitem__(self, i):
+        if not -len(self) <= i < len(self):
+            raise IndexError(f'record {i} out of range (0-{len(self) - 1})')
+        i %= len(self)
+        number = bisect.bisect_right(self.offsets, i) - 1
+        records = self.get_shard(number)[i - self.offsets[number]:i - self.offsets[number] + 1]
+        return {name: values[0] for name, values in self.decode(records).items()}
+
+    def batches(self, batch_size=256, shuffle=True, seed=None, shards_per_block=SHARDS_PER_BLOCK, drop_last=False):
+        '''
+        iterate over the whole dataset in batches (dicts of arrays, see decode)
+        With shuffle, the shards are visited in random order, shards_per_block
+        at a time, and the records of those shards are drawn in random order.
+        Only the records of each batch are read from disk.
+        '''
+
+        rng = np.random.default_rng(seed)
+        shard_order = np.arange(len(self.counts))
+        if shuffle:
+            shard_order = rng.permutation(shard_order)
+
+        for start in range(0, len(shard_order), shards_per_block):
+            block = shard_order[start:start+shards_per_block]
+            shard_ids = np.concatenate([np.full(self.counts[number], number) for number in block])
+            record_ids = np.concatenate([np.arange(self.counts[number]) for number in block])
+            order = rng.permutation(shard_ids.size) if shuffle else np.arange(shard_ids.size)
+
+            for batch_start in range(0, order.size, batch_size):
+                take = order[batch_start:batch_start+batch_size]
+                if drop_last and take.size < batch_size:
+                    break
+                batch_shards = shard_ids[take]
+                batch_records = record_ids[take]
+                records = np.empty(take.size, dtype=self.dtype)
+                for number in np.unique(batch_shards):
+                    mask = batch_shards == number
+                    records[mask] = self.get_shard(number)[batch_records[mask]]
+                yield self.decode(records)
+
+def parse_size(text):
+    rows, cols = text.lower().split('x')
+    return int(rows), int(cols)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Record self-play transitions into memory-mapped shards')
+    parser.add_argument('agents', nargs='+', help='one agent module per player, e.g. flee_agent lookahead_agent')
+    parser.add_argument('--episodes', type=int, default=100)
+    parser.add_argument('--size', type=parse_size, default=(11, 13), help='board size as ROWSxCOLS')
+    parser.add_argument('--max-turns', type=int, default=MAX_TURNS)
+    parser.add_argument('--shard-size', type=int, default=SHARD_SIZE, help='records per shard')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--out', default='data/selfplay', help='dataset directory')
+    args = parser.parse_args()
+
+    index = generate(args.out, args.agents, args.episodes, *args.size, args.seed, args.max_turns, args.shard_size)
+    print(f" {index['num_records']} transitions from {args.episodes} episodes in {len(index['shards'])} shards ({args.out})")
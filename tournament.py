@@ -0,0 +1,266 @@
+'''
+HEADLESS TOURNAMENT RUNNER
+
+Plays round-robin matches between agent modules across a process pool,
+without rendering or waiting for input, and prints win/loss/score tables
+and each agent's decision latency. With --deadline, an agent that takes
+longer than that to decide plays actions.NONE for the turn, and with
+--sandbox every agent runs in its own worker process (see agent_worker.py).
+
+usage:
+    python tournament.py flee_agent lookahead_agent random_agent --sizes 5x7 11x13 --episodes 20
+    python tournament.py search_agent flee_agent --deadline 0.2 --sandbox --json results.json
+'''
+
+import argparse
+import itertools
+import json
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from agent_api import Observation, load_agent
+from agent_worker import AgentProcess
+from bm_multi_env import Game
+from latency import LatencyStats, TimedAgent, print_latency
+
+MAX_TURNS = 200 # a game that reaches this many turns is decided on score
+
+def play_match(env, agents, max_turns=MAX_TURNS, deadline=None, latency=None):
+    '''
+    play one headless game between agents (Agent instances, or anything load_agent accepts)
+    deadline: seconds each agent may take per turn before it plays actions.NONE
+    latency: optional list of LatencyStats, one per seat, to record decision times into
+    returns the final scores, number of turns played and the agents' names
+    '''
+
+    agents = [load_agent(agent) for agent in agents]
+    if deadline is not None or latency is not None:
+        agents = [TimedAgent(agent, deadline, latency[i] if latency is not None else None)
+                  for i, agent in enumerate(agents)]
+    state, players = env.reset(len(agents))
+    for number, agent in enumerate(agents):
+        agent.setup(env.rows, env.cols, number)
+    done = False
+    bomb_list = []
+    turn = 0
+
+    while not done and turn < max_turns:
+        danger = env.get_danger_map()
+        player_actions = []
+        for i, agent in enumerate(agents):
+            action = agent.act(Observation(state, done, bomb_list, turn, players[i], danger))
+            player_actions.append(action)
+
+        state, done, players, bomb_list = env.step(player_actions)
+        turn += 1
+
+    return [player.score for player in players], turn, [agent.name for agent in agents]
+
+def run_pairing(agent_names, rows, cols, episodes, seed, max_turns=MAX_TURNS, deadline=None, sandbox=False):
+    '''
+    play a batch of episodes between two agents (runs inside a worker process)
+    '''
+
+    random.seed(seed)
+    np.random.seed(seed % 2**32)
+
+    if sandbox:
+        agents = [AgentProcess(name) for name in agent_names]
+    else:
+        agents = [load_agent(name) for name in agent_names]
+    env = Game(rows, cols, seed=seed)
+
+    latency = [LatencyStats(name) for name in agent_names]
+    results = []
+    start = time.perf_counter()
+    try:
+        for _ in range(episodes):
+            scores, turns, _ = play_match(env, agents, max_turns, deadline, latency)
+            results.append((scores, turns))
+    finally:
+        for agent in agents:
+            agent.close()
+    elapsed = time.perf_counter() - start
+
+    # lookups of agents that cache their evaluations (e.g. lookahead_agent's heuristic cache)
+    cache = [dict(agent.cache_stats(), name=name) for name, agent in zip(agent_names, agents) if hasattr(agent, 'cache_stats')]
+
+    return {'agents': list(agent_names), 'size': (rows, cols), 'results': results, 'elapsed': elapsed, 'latency': latency, 'cache': cache}
+
+def get_pairings(agent_names, sizes, episodes, chunk_size):
+    '''
+    round-robin schedule: every pair of agents plays from both seats on every
+    board size (an agent listed on its own plays itself)
+    '''
+
+    if len(agent_names) > 1:
+        pairs = list(itertools.combinations(agent_names, 2))
+        pairs += [(b, a) for a, b in pairs]
+    else:
+        pairs = [(agent_names[0], agent_names[0])]
+
+    tasks = []
+    for pair in pairs:
+        for rows, cols in sizes:
+            for start in range(0, episodes, chunk_size):
+                tasks.append((pair, rows, cols, min(chunk_size, episodes - start)))
+
+    return tasks
+
+def summarize(batches):
+    '''
+    tally wins, losses, ties and scores per agent and head to head
+    '''
+
+    table = {}
+    head_to_head = {}
+
+    def row(name):
+        return table.setdefault(name, {'games': 0, 'wins': 0, 'losses': 0, 'ties': 0, 'timeouts': 0, 'total_score': 0})
+
+    for batch in batches:
+        a, b = batch['agents']
+        for scores, turns in batch['results']:
+            for name, score in zip((a, b), scores):
+                row(name)['games'] += 1
+                row(name)['total_score'] += score
+                if turns >= batch['max_turns']:
+                    row(name)['timeouts'] += 1
+
+            if scores[0] > scores[1]:
+                winner, loser = a, b
+            elif scores[0] < scores[1]:
+                winner, loser = b, a
+            else:
+                row(a)['ties'] += 1
+                if b != a:
+                    row(b)['ties'] += 1
+                continue
+
+            row(winner)['wins'] += 1
+            row(loser)['losses'] += 1
+            key = f'{winner} vs {loser}'
+            head_to_head[key] = head_to_head.get(key, 0) + 1
+
+    for stats in table.values():
+        stats['avg_score'] = stats['total_score'] / max(stats['games'], 1)
+        stats['win_rate'] = stats['wins'] / max(stats['games'], 1)
+
+    return table, head_to_head
+
+def merge_latency(batches):
+    '''
+    one LatencyStats per agent, over every seat and batch it played
+    '''
+
+    latency = {}
+    for batch in batches:
+        for stats in batch['latency']:
+            latency.setdefault(stats.name, LatencyStats(stats.name)).merge(stats)
+    return latency
+
+def merge_cache(batches):
+    '''
+    cache hits, misses and hit rate per agent, over every seat and batch it played
+    '''
+
+    cache = {}
+    for batch in batches:
+        for stats in batch['cache']:
+            totals = cache.setdefault(stats['name'], {'hits': 0, 'misses': 0})
+            totals['hits'] += stats['hits']
+            totals['misses'] += stats['misses']
+    for totals in cache.values():
+        lookups = totals['hits'] + totals['misses']
+        totals['hit_rate'] = totals['hits'] / lookups if lookups else 0.0
+    return cache
+
+def print_cache(cache):
+
+    if not cache:
+        return
+    print(f"\n {'cache':<20}{'lookups':>10}{'hits':>10}{'hit %':>8}")
+    print(" " + "-"*48)
+    for name, stats in cache.items():
+        print(f" {name:<20}{stats['hits'] + stats['misses']:>10}{stats['hits']:>10}{100*stats['hit_rate']:>7.1f}%")
+
+def print_table(table, head_to_head, throughput):
+
+    print(f"\n {'agent':<20}{'games':>8}{'wins':>8}{'losses':>8}{'ties':>8}{'win %':>8}{'avg score':>12}{'timeouts':>10}")
+    print(" " + "-"*82)
+    for name, stats in sorted(table.items(), key=lambda item: -item[1]['win_rate']):
+        print(f" {name:<20}{stats['games']:>8}{stats['wins']:>8}{stats['losses']:>8}{stats['ties']:>8}"
+              f"{100*stats['win_rate']:>7.1f}%{stats['avg_score']:>12.1f}{stats['timeouts']:>10}")
+
+    print("\n Head to head wins:")
+    for key, wins in sorted(head_to_head.items()):
+        print(f"  {key}: {wins}")
+
+    print(f"\n {throughput['games']} games, {throughput['turns']} turns in {throughput['wall_time']:.2f}s"
+          f" ({throughput['games_per_sec']:.1f} games/s, {throughput['turns_per_sec']:.0f} turns/s,"
+          f" {throughput['workers']} workers)")
+
+def run_tournament(agent_names, sizes=((11, 13),), episodes=10, max_turns=MAX_TURNS, workers=None, chunk_size=5, seed=0, deadline=None, sandbox=False):
+    '''
+    play the full round robin over a process pool and return the summary
+    '''
+
+    tasks = get_pairings(agent_names, sizes, episodes, chunk_size)
+    workers = workers or os.cpu_count()
+
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(run_pairing, pair, rows, cols, n, seed + i, max_turns, deadline, sandbox)
+                   for i, (pair, rows, cols, n) in enumerate(tasks)]
+        batches = [future.result() for future in futures]
+    wall_time = time.perf_counter() - start
+
+    for batch in batches:
+        batch['max_turns'] = max_turns
+
+    table, head_to_head = summarize(batches)
+    games = sum(len(batch['results']) for batch in batches)
+    turns = sum(turns for batch in batches for _, turns in batch['results'])
+    throughput = {
+        'games': games,
+        'turns': turns,
+        'wall_time': wall_time,
+        'games_per_sec': games / wall_time,
+        'turns_per_sec': turns / wall_time,
+        'workers': workers,
+    }
+
+    latency = {name: stats.summary() for name, stats in merge_latency(batches).items()}
+
+    return {'table': table, 'head_to_head': head_to_head, 'throughput': throughput, 'latency': latency, 'cache': merge_cache(batches)}
+
+def parse_size(text):
+    rows, cols = text.lower().split('x')
+    return int(rows), int(cols)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Headless round-robin tournament between agent modules')
+    parser.add_argument('agents', nargs='+', help='agent modules, e.g. flee_agent lookahead_agent random_agent')
+    parser.add_argument('--sizes', nargs='+', type=parse_size, default=[(11, 13)], help='board sizes as ROWSxCOLS')
+    parser.add_argument('--episodes', type=int, default=10, help='episodes per pairing, seat and board size')
+    parser.add_argument('--max-turns', type=int, default=MAX_TURNS)
+    parser.add_argument('--workers', type=int, default=None, help='worker processes (default: all cores)')
+    parser.add_argument('--chunk-size', type=int, default=5, help='episodes per pool task')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--deadline', type=float, default=None, help='seconds per agent decision before it plays NONE')
+    parser.add_argument('--sandbox', action='store_true', help='run every agent in its own worker process')
+    parser.add_argument('--json', default=None, help='also write the results to this file')
+    args = parser.parse_args()
+
+    summary = run_tournament(args.agents, args.sizes, args.episodes, args.max_turns, args.workers, args.chunk_size, args.seed, args.deadline, args.sandbox)
+    print_table(summary['table'], summary['head_to_head'], summary['throughput'])
+    print_latency(summary['latency'].values())
+    print_cache(summary['cache'])
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(summary, f, indent=2)